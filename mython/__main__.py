@@ -1,15 +1,73 @@
 #! /usr/bin/env python
+"""Compile and run Mython modules, or check their syntax.
+
+Usage: mython [--check] path [path...]
+
+With --check, each path is parsed without building any trees, and
+directories are searched for .my files.  Every syntax error found is
+reported on stderr, and the exit status is 1 if there were any.
+"""
+import getopt
+import os
 import sys
 import types
 
 from . import mybuiltins
+from . import mylexer
+from . import myparser
+from . import trampoline
+
+def iter_source_files(paths):
+    """Yield the given file names, and the .my files found under the
+    given directories, in sorted order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith('.my'):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+def check_file(parser, filename):
+    """Parse a file using a sink that builds nothing, returning an error
+    message, or None if the file parses."""
+    try:
+        parser.parse_file(filename, {'sink' : trampoline.ParseSink()})
+    except SyntaxError as syntax_err:
+        return str(syntax_err)
+    except mylexer.tokenize.TokenError as token_err:
+        message, (lineno, column) = token_err.args
+        return "File '%s', line %d, column %d, %s." % (filename, lineno,
+                                                       column, message)
+    except (OSError, UnicodeError) as io_err:
+        return "File '%s', %s" % (filename, io_err)
+    return None
+
+def check(paths):
+    """Check the syntax of the given files and directories, returning
+    the number of files with errors."""
+    parser = myparser.get_parser()
+    error_count = 0
+    for filename in iter_source_files(paths):
+        message = check_file(parser, filename)
+        if message is not None:
+            print(message, file=sys.stderr)
+            error_count += 1
+    return error_count
 
-def main():
-    for arg in sys.argv[1:]:
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts, args = getopt.getopt(args, '', ['check'])
+    if ('--check', '') in opts:
+        return 1 if check(args) else 0
+    for arg in args:
         co, _ = mybuiltins.mycompile_file(arg)
         mod = types.ModuleType('__main__')
         exec(co, mod.__dict__)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
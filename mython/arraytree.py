@@ -0,0 +1,312 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Defines an array-backed store for concrete syntax trees.
+
+The trees built by trampoline.TreeBuilder use a tuple and a list for
+every node, and a 5-tuple (plus two position tuples) for every token.
+An ArrayTree keeps the same information in parallel arrays of machine
+integers instead: one entry per node giving its kind, first child,
+next sibling and token index, and one entry per token giving its
+string, positions and source line index.
+
+Node kinds below token.NT_OFFSET are token types.  Other kinds are
+token.NT_OFFSET plus an index into the tree's table of nonterminal
+names.  Node zero is the root ('start') node.
+
+ArrayTreeBuilder follows the trampoline tree builder protocol, so any
+parser engine can build an ArrayTree directly.  TreeCursor and
+ArrayTreeVisitor walk the tree, and ArrayTree.from_tuple() and
+ArrayTree.to_tuple() convert to and from the nested tuple format.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import array
+import token
+
+from mython.trampoline import TOKEN_TYPES
+
+# ______________________________________________________________________
+# Module data
+
+# Array type code used for node and token fields.
+INDEX_TYPECODE = 'i'
+
+NO_NODE = -1
+
+# ______________________________________________________________________
+# Class definitions
+
+class ArrayTree (object):
+    """Concrete syntax tree stored in parallel arrays."""
+    def __init__ (self, root_name = 'start'):
+        self.kinds = array.array(INDEX_TYPECODE)
+        self.first_child = array.array(INDEX_TYPECODE)
+        self.next_sibling = array.array(INDEX_TYPECODE)
+        self.token_index = array.array(INDEX_TYPECODE)
+        self.names = []
+        self.name_map = {}
+        self.token_strs = []
+        self.token_start_rows = array.array(INDEX_TYPECODE)
+        self.token_start_cols = array.array(INDEX_TYPECODE)
+        self.token_end_rows = array.array(INDEX_TYPECODE)
+        self.token_end_cols = array.array(INDEX_TYPECODE)
+        self.token_lines = array.array(INDEX_TYPECODE)
+        self.lines = []
+        self._last_line = None
+        self.add_node(self.get_kind(root_name))
+
+    def __len__ (self):
+        return len(self.kinds)
+
+    def get_kind (self, name):
+        """Return the node kind of a nonterminal name, adding the name
+        to the name table if needed."""
+        name_index = self.name_map.get(name)
+        if name_index is None:
+            name_index = len(self.names)
+            self.names.append(name)
+            self.name_map[name] = name_index
+        return token.NT_OFFSET + name_index
+
+    def add_node (self, kind, token_index = NO_NODE):
+        node_index = len(self.kinds)
+        self.kinds.append(kind)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.token_index.append(token_index)
+        return node_index
+
+    def add_token (self, token_tuple):
+        """Store a (type, string, start, end, line) token, and add a leaf
+        node for it.  Returns the new node's index."""
+        tok_type, tok_str, (start_row, start_col), (end_row, end_col), \
+            line = token_tuple
+        token_index = len(self.token_strs)
+        self.token_strs.append(tok_str)
+        self.token_start_rows.append(start_row)
+        self.token_start_cols.append(start_col)
+        self.token_end_rows.append(end_row)
+        self.token_end_cols.append(end_col)
+        # Tokens on the same line share a line object, so only new
+        # lines are stored.
+        if line is not self._last_line or not self.lines:
+            self.lines.append(line)
+            self._last_line = line
+        self.token_lines.append(len(self.lines) - 1)
+        return self.add_node(tok_type, token_index)
+
+    # ____________________________________________________________
+    # Node accessors
+
+    def is_token (self, node_index):
+        return self.kinds[node_index] < token.NT_OFFSET
+
+    def get_name (self, node_index):
+        """Return a nonterminal node's name, or a token node's type."""
+        kind = self.kinds[node_index]
+        if kind < token.NT_OFFSET:
+            return kind
+        return self.names[kind - token.NT_OFFSET]
+
+    def get_token (self, node_index):
+        """Return the token tuple for a token node."""
+        token_index = self.token_index[node_index]
+        return (self.kinds[node_index], self.token_strs[token_index],
+                (self.token_start_rows[token_index],
+                 self.token_start_cols[token_index]),
+                (self.token_end_rows[token_index],
+                 self.token_end_cols[token_index]),
+                self.lines[self.token_lines[token_index]])
+
+    def iter_children (self, node_index):
+        next_sibling = self.next_sibling
+        child_index = self.first_child[node_index]
+        while child_index != NO_NODE:
+            yield child_index
+            child_index = next_sibling[child_index]
+
+    def cursor (self, node_index = 0):
+        return TreeCursor(self, node_index)
+
+    # ____________________________________________________________
+    # Conversions
+
+    @classmethod
+    def from_tuple (cls, tree):
+        """Build an ArrayTree from a nested tuple tree."""
+        ret_val = cls(tree[0])
+        first_child = ret_val.first_child
+        next_sibling = ret_val.next_sibling
+        stack = [(0, tree[1], 0, NO_NODE)]
+        while stack:
+            parent_index, children, child_index, prev_index = stack.pop()
+            if child_index >= len(children):
+                continue
+            elem, grandchildren = children[child_index]
+            if isinstance(elem, TOKEN_TYPES):
+                node_index = ret_val.add_token(elem)
+            else:
+                node_index = ret_val.add_node(ret_val.get_kind(elem))
+            if prev_index == NO_NODE:
+                first_child[parent_index] = node_index
+            else:
+                next_sibling[prev_index] = node_index
+            stack.append((parent_index, children, child_index + 1,
+                          node_index))
+            stack.append((node_index, grandchildren, 0, NO_NODE))
+        return ret_val
+
+    def to_tuple (self, node_index = 0):
+        """Return the nested tuple form of the subtree at node_index."""
+        kinds = self.kinds
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        def make_node (node_index):
+            if kinds[node_index] < token.NT_OFFSET:
+                return (self.get_token(node_index), [])
+            return (self.names[kinds[node_index] - token.NT_OFFSET], [])
+        ret_val = make_node(node_index)
+        stack = [(ret_val[1], first_child[node_index])]
+        while stack:
+            children, child_index = stack.pop()
+            if child_index == NO_NODE:
+                continue
+            stack.append((children, next_sibling[child_index]))
+            child = make_node(child_index)
+            children.append(child)
+            stack.append((child[1], first_child[child_index]))
+        return ret_val
+
+    def get_byte_size (self):
+        """Return the number of bytes used by the tree's arrays."""
+        return sum(field.itemsize * len(field) for field in (
+            self.kinds, self.first_child, self.next_sibling,
+            self.token_index, self.token_start_rows, self.token_start_cols,
+            self.token_end_rows, self.token_end_cols, self.token_lines))
+
+# ______________________________________________________________________
+
+class ArrayTreeBuilder (object):
+    """Tree builder (see trampoline.TreeBuilder) that builds an
+    ArrayTree.  The stack holds node indices."""
+    def __init__ (self):
+        self.tree = ArrayTree()
+        self.stack = [0]
+        self.last_child = [NO_NODE]
+
+    def _link (self, node_index):
+        parent_index = self.stack[-1]
+        prev_index = self.last_child[parent_index]
+        if prev_index == NO_NODE:
+            self.tree.first_child[parent_index] = node_index
+        else:
+            self.tree.next_sibling[prev_index] = node_index
+        self.last_child[parent_index] = node_index
+        self.last_child.append(NO_NODE)
+
+    def push (self, elem):
+        tree = self.tree
+        node_index = tree.add_node(tree.get_kind(elem))
+        self._link(node_index)
+        self.stack.append(node_index)
+        return node_index
+
+    def pop (self):
+        return self.stack.pop()
+
+    def pushpop (self, elem):
+        node_index = self.tree.add_token(elem)
+        self._link(node_index)
+        return node_index
+
+# ______________________________________________________________________
+
+class TreeCursor (object):
+    """A movable reference to a node in an ArrayTree.
+
+    The cursor remembers the path from the node it was created at, so
+    goto_parent() never moves above that node."""
+    __slots__ = ('tree', 'node', 'path')
+
+    def __init__ (self, tree, node_index = 0):
+        self.tree = tree
+        self.node = node_index
+        self.path = []
+
+    def copy (self):
+        ret_val = TreeCursor(self.tree, self.node)
+        ret_val.path = self.path[:]
+        return ret_val
+
+    @property
+    def name (self):
+        return self.tree.get_name(self.node)
+
+    def is_token (self):
+        return self.tree.is_token(self.node)
+
+    @property
+    def token (self):
+        return self.tree.get_token(self.node)
+
+    def goto_first_child (self):
+        child_index = self.tree.first_child[self.node]
+        if child_index == NO_NODE:
+            return False
+        self.path.append(self.node)
+        self.node = child_index
+        return True
+
+    def goto_next_sibling (self):
+        if not self.path:
+            return False
+        sibling_index = self.tree.next_sibling[self.node]
+        if sibling_index == NO_NODE:
+            return False
+        self.node = sibling_index
+        return True
+
+    def goto_parent (self):
+        if not self.path:
+            return False
+        self.node = self.path.pop()
+        return True
+
+    def children (self):
+        return [TreeCursor(self.tree, child_index)
+                for child_index in self.tree.iter_children(self.node)]
+
+# ______________________________________________________________________
+
+class ArrayTreeVisitor (object):
+    """Counterpart of cst.ConcreteNodeVisitor for ArrayTrees.
+
+    Visitor methods are passed a TreeCursor positioned at the node
+    being visited, and are looked up the same way (visit_<name>, or
+    visit_token for tokens).  Visiting starts from a cursor and walks
+    the nodes below it without building any tuples."""
+    def visit (self, cursor):
+        if cursor.is_token():
+            postfix = 'token'
+        else:
+            postfix = cursor.name
+        visitor = getattr(self, 'visit_' + postfix, self.generic_visit)
+        node_index = cursor.node
+        path_len = len(cursor.path)
+        ret_val = visitor(cursor)
+        # Visitor methods may move the cursor; put it back.
+        cursor.node = node_index
+        del cursor.path[path_len:]
+        return ret_val
+
+    def generic_visit (self, cursor):
+        if cursor.goto_first_child():
+            self.visit(cursor)
+            while cursor.goto_next_sibling():
+                self.visit(cursor)
+            cursor.goto_parent()
+
+# ______________________________________________________________________
+# End of arraytree.py
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark parse trees with and without unit chain collapsing.
+
+Parses a corpus of source files into full and compact concrete syntax
+trees, and transforms both into abstract syntax trees.  Reports the
+total node count and the best parse plus transformation time for each
+tree form, and checks both forms give the same abstract syntax.  Files
+the transformer does not support are left out of the corpus.
+
+Usage: python -m mython.benchmarks.bench_compact [-r repeats] [file ...]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import ast
+import getopt
+import sys
+import time
+
+from mython import myast, myparser
+from mython.benchmarks.bench_parse import get_default_corpus, load_corpus
+
+# ______________________________________________________________________
+# Function definitions
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        crnt_node = stack.pop()
+        count += 1
+        stack.extend(crnt_node[1])
+    return count
+
+# ______________________________________________________________________
+
+def astify(tree):
+    return myast.MyConcreteTransformer().handle_node(tree)
+
+# ______________________________________________________________________
+
+def filter_corpus(parser, sources):
+    """Return the sources that the concrete syntax transformer supports."""
+    supported = []
+    for filename, source in sources:
+        try:
+            astify(parser.parse_string(source, {'filename' : filename}))
+        except (NotImplementedError, SyntaxError, AssertionError,
+                TypeError, KeyError, IndexError, AttributeError, ValueError):
+            continue
+        supported.append((filename, source))
+    return supported
+
+# ______________________________________________________________________
+
+def time_tree_form(parser, sources, compact, repeats):
+    """Return the best time to parse and transform all sources, the node
+    count of the concrete trees, and the dumped abstract trees."""
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        trees = [parser.parse_string(source, {'filename' : filename,
+                                              'compact_tree' : compact})
+                 for filename, source in sources]
+        asts = [astify(tree) for tree in trees]
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    node_count = sum(count_nodes(tree) for tree in trees)
+    return best, node_count, [ast.dump(ast_obj) for ast_obj in asts]
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'r:')
+    repeats = 5
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-r':
+            repeats = int(opt_arg)
+    parser = myparser.MyParser()
+    sources = filter_corpus(parser, load_corpus(
+        args if args else get_default_corpus()))
+    line_count = sum(source.count('\n') for _, source in sources)
+    print('%d files, %d lines, best of %d' % (len(sources), line_count,
+                                                repeats))
+    print('%-8s %10s %14s' % ('tree', 'nodes', 'parse+ast (s)'))
+    results = []
+    for label, compact in (('full', False), ('compact', True)):
+        elapsed, node_count, dumps = time_tree_form(parser, sources, compact,
+                                                    repeats)
+        results.append(dumps)
+        print('%-8s %10d %14.4f' % (label, node_count, elapsed))
+    if results[0] != results[1]:
+        print('Abstract syntax trees differ!')
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_compact.py
@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark grammar composition in mython.nfa.
+
+Composes the Python base grammar with a growing number of synthetic
+extension grammars of a growing size, and reports the time taken by
+a pairwise fold of the old two-set composition algorithm (kept here as
+pairwise_compose_nfas()) and by a single call to
+nfa.compose_nfa_sets().
+
+Usage: python -m mython.benchmarks.bench_compose [-r repeats]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import functools
+import getopt
+import sys
+import time
+
+import pgen2.parser
+import pgen2.pgen
+
+import mython.lang.python
+from mython import nfa, myparser
+
+# ______________________________________________________________________
+# Module data
+
+GRAMMAR_COUNTS = (1, 2, 4, 8, 16)
+
+RULE_COUNTS = (4, 16, 64)
+
+# ______________________________________________________________________
+# Function definitions
+
+def make_extension_grammar(grammar_index, rule_count):
+    """Build the text of a synthetic extension grammar.
+
+    Each grammar adds new statements (with their own keywords and
+    operators) and extends the shared atom and small_stmt rules, so
+    composition has to merge both labels and nonterminals."""
+    lines = []
+    stmt_names = []
+    for rule_index in range(rule_count):
+        prefix = 'x%d_%d' % (grammar_index, rule_index)
+        stmt_names.append('%s_stmt' % prefix)
+        lines.append("%s_stmt: '%s' %s_item (',' %s_item)* [';']" %
+                     (prefix, prefix, prefix, prefix))
+        lines.append("%s_item: NAME ['=' test] | '%s_lit' atom" %
+                     (prefix, prefix))
+    lines.append('small_stmt: %s' % ' | '.join(stmt_names))
+    lines.append("atom: '%s' NAME" % ('x%d_atom' % grammar_index))
+    return '\n'.join(lines) + '\n'
+
+# ______________________________________________________________________
+
+def pairwise_compose_nfas(nfas0, nfas1):
+    """A frozen copy of the pairwise nfa.compose_nfas() algorithm used
+    before nfa.compose_nfa_sets() was added (finding shared labels with
+    list.index(), and nesting nfa.nfa_union() for each merged rule).
+    Kept as the baseline here and as a reference by tests/test_nfa.py."""
+    nfas0_nfas, nfas0_labels = nfas0
+    nfas1_nfas, nfas1_labels = nfas1
+    nfas2_labels = nfas0_labels[:]
+    label_map_1_to_2 = {}
+    index = 0
+    for label_tup in nfas1_labels:
+        if label_tup in nfas2_labels:
+            label_map_1_to_2[index] = nfas2_labels.index(label_tup)
+        else:
+            label_map_1_to_2[index] = len(nfas2_labels)
+            nfas2_labels.append(label_tup)
+        index += 1
+    nfas2_nfas = [nfa.rewrite_arcs(label_map_1_to_2, rule_nfa)
+                  for rule_nfa in nfas1_nfas]
+    nfas2_nfa_map = {}
+    index = 0
+    for rule_nfa in nfas2_nfas:
+        nfas2_nfa_map[rule_nfa[1]] = index
+        index += 1
+    new_nfa_type = max((nfa_ty for (nfa_ty, _, _, _, _) in nfas2_nfas)) + 1
+    for rule_nfa in nfas0_nfas:
+        nfa_name = rule_nfa[1]
+        if nfa_name in nfas2_nfa_map:
+            nfas2_nfa_index = nfas2_nfa_map[nfa_name]
+            nfas2_nfas[nfas2_nfa_index] = nfa.nfa_union(
+                nfas2_nfas[nfas2_nfa_index], rule_nfa)
+        else:
+            nfas2_nfas.append((new_nfa_type,) + tuple(rule_nfa[1:]))
+            new_nfa_type += 1
+    return (nfas2_nfas, nfas2_labels)
+
+# ______________________________________________________________________
+
+def best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'r:')
+    repeats = 3
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-r':
+            repeats = int(opt_arg)
+    pgen = pgen2.pgen.PyPgen()
+    base_nfas = pgen.handleStart(pgen2.parser.parse_file(
+        mython.lang.python.get_grammar_path()))
+    my_nfas = pgen.handleStart(pgen2.parser.parse_string(
+        myparser.MY_GRAMMAR_EXT))
+    print('%8s %8s %8s %8s %12s %12s' % (
+        'grammars', 'rules', 'labels', 'nfas', 'old-pairwise', 'one-pass'))
+    for rule_count in RULE_COUNTS:
+        for grammar_count in GRAMMAR_COUNTS:
+            nfa_sets = [base_nfas, my_nfas]
+            nfa_sets.extend(
+                pgen.handleStart(pgen2.parser.parse_string(
+                    make_extension_grammar(grammar_index, rule_count)))
+                for grammar_index in range(grammar_count))
+            composed = nfa.compose_nfa_sets(nfa_sets)
+            pairwise = best_time(
+                lambda: functools.reduce(pairwise_compose_nfas, nfa_sets),
+                repeats)
+            one_pass = best_time(lambda: nfa.compose_nfa_sets(nfa_sets),
+                                 repeats)
+            print('%8d %8d %8d %8d %12.6f %12.6f' % (
+                len(nfa_sets), rule_count, len(composed[1]),
+                len(composed[0]), pairwise, one_pass))
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_compose.py
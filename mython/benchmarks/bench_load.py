@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark loading and parsing a large source file.
+
+Builds a large source file by repeating the corpus sources, then
+compares the text mode, line at a time input path (reading the file
+with open(), and parsing it through readline) with the memory mapped
+path (mylexer.load_source() and MyParser.parse_buffer()).  Reports the
+best time and the tracemalloc peak for loading alone, and for loading
+and parsing.  Parses build array trees, so the size of the tree does
+not hide the memory used by the input path.
+
+Usage: python -m mython.benchmarks.bench_load [-n copies] [-r repeats]
+           [file ...]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import gc
+import getopt
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mython import mylexer, myparser
+from mython.benchmarks.bench_parse import get_default_corpus, load_corpus
+
+# ______________________________________________________________________
+# Function definitions
+
+def load_text(filename):
+    with open(filename) as fileobj:
+        return fileobj.read()
+
+def parse_lines(parser, filename):
+    with open(filename) as fileobj:
+        return parser.parse_lineiter(fileobj.readline,
+                                     {'filename' : filename,
+                                      'array_tree' : True})
+
+def parse_mapped(parser, filename):
+    return parser.parse_buffer(mylexer.load_source(filename),
+                               {'filename' : filename, 'array_tree' : True})
+
+# ______________________________________________________________________
+
+def measure(fn, repeats):
+    """Return the best time and the peak traced memory for fn()."""
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak_size
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'n:r:')
+    copies = 4
+    repeats = 3
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-n':
+            copies = int(opt_arg)
+        elif opt_flag == '-r':
+            repeats = int(opt_arg)
+    parser = myparser.MyParser()
+    # Only keep sources that parse on their own, so the repeated source
+    # parses too.
+    sources = []
+    for filename, source in load_corpus(args if args else
+                                        get_default_corpus()):
+        try:
+            parser.parse_string(source)
+        except SyntaxError:
+            continue
+        sources.append(source)
+    fd, filename = tempfile.mkstemp(suffix='.py')
+    try:
+        with os.fdopen(fd, 'w') as fileobj:
+            for _ in range(copies):
+                for source in sources:
+                    fileobj.write(source)
+                    if not source.endswith('\n'):
+                        fileobj.write('\n')
+        print('%d bytes, best of %d' % (os.path.getsize(filename), repeats))
+        print('%-14s %10s %10s' % ('path', 'time (s)', 'peak (KiB)'))
+        for label, fn in (
+                ('load text', lambda: load_text(filename)),
+                ('load mapped', lambda: mylexer.load_source(filename)),
+                ('parse lines', lambda: parse_lines(parser, filename)),
+                ('parse mapped', lambda: parse_mapped(parser, filename))):
+            elapsed, peak_size = measure(fn, repeats)
+            print('%-14s %10.4f %10d' % (label, elapsed, peak_size // 1024))
+    finally:
+        os.unlink(filename)
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_load.py
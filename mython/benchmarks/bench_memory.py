@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark the memory used by concrete syntax tree representations.
+
+Parses a corpus of source files, keeping every tree, once for each tree
+representation MyParser can build.  Reports the peak memory allocated
+while parsing (as measured by tracemalloc), the memory still held once
+parsing is done, and the parse time.  The default corpus is the Python
+and Mython sources of the mython package itself.
+
+Usage: python -m mython.benchmarks.bench_memory [-n copies] [file ...]
+
+The -n flag concatenates each source with itself the given number of
+times, to simulate large generated sources.  The 'tokens' and 'both'
+forms put compact trampoline.Token records in the tuple and compact
+trees.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import gc
+import getopt
+import sys
+import time
+import tracemalloc
+
+from mython import myparser
+from mython.benchmarks.bench_parse import get_default_corpus, load_corpus
+
+# ______________________________________________________________________
+# Module data
+
+TREE_FORMS = (
+    ('tuple', {}),
+    ('compact', {'compact_tree' : True}),
+    ('array', {'array_tree' : True}),
+    ('tokens', {'compact_tokens' : True}),
+    ('both', {'compact_tree' : True, 'compact_tokens' : True}),
+)
+
+# ______________________________________________________________________
+# Function definitions
+
+def measure_tree_form(parser, sources, options):
+    """Return the peak and retained memory, in bytes, and the time taken
+    to parse all sources into trees built with the given options."""
+    gc.collect()
+    tracemalloc.start()
+    base_size, _ = tracemalloc.get_traced_memory()
+    start = time.time()
+    trees = []
+    for filename, source in sources:
+        env = dict(options)
+        env['filename'] = filename
+        trees.append(parser.parse_string(source, env))
+    elapsed = time.time() - start
+    gc.collect()
+    retained_size, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del trees
+    return peak_size - base_size, retained_size - base_size, elapsed
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'n:')
+    copies = 1
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-n':
+            copies = int(opt_arg)
+    sources = [(filename, source * copies) for filename, source in
+               load_corpus(args if args else get_default_corpus())]
+    source_size = sum(len(source) for _, source in sources)
+    parser = myparser.MyParser()
+    print('%d files, %d characters' % (len(sources), source_size))
+    print('%-8s %12s %14s %10s' % ('tree', 'peak (KiB)', 'retained (KiB)',
+                                   'time (s)'))
+    for label, options in TREE_FORMS:
+        peak_size, retained_size, elapsed = measure_tree_form(
+            parser, sources, options)
+        print('%-8s %12d %14d %10.3f' % (label, peak_size // 1024,
+                                         retained_size // 1024, elapsed))
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_memory.py
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark parsing a large module in parallel worker processes.
+
+Builds a large generated module (tables of constants, functions and a
+Mython quotation, as code generators emit), or reads the given file,
+then parses it serially and using MyParser.parse_parallel() with each
+number of worker processes, checking the trees match.  Reports the
+best time and the speedup over the serial parse for each.  The worker
+pools are started (and their parsers built) before timing.
+
+Usage: python -m mython.benchmarks.bench_parallel [-r repeats]
+           [-n lines] [-w workers[,workers...]] [file]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import getopt
+import os
+import sys
+import time
+
+from mython import myparser
+
+# ______________________________________________________________________
+# Function definitions
+
+def make_module(lines):
+    """Return a generated module of about the given number of lines."""
+    chunks = []
+    line_count = 0
+    index = 0
+    while line_count < lines:
+        chunks.append('TABLE_%d = {\n' % index)
+        chunks.extend('    %d : (%d, %r),\n' % (entry, entry * index,
+                                                'entry%d' % entry)
+                      for entry in range(20))
+        chunks.append('}\n\n')
+        chunks.append('def lookup_%d(key, default=None):\n'
+                      '    if key in TABLE_%d:\n'
+                      '        return TABLE_%d[key][1]\n'
+                      '    return default\n\n' % (index, index, index))
+        if index % 10 == 0:
+            chunks.append('my[quote] block_%d:\n    anything %d\n\n' %
+                          (index, index))
+            line_count += 3
+        line_count += 27
+        index += 1
+    return ''.join(chunks)
+
+def best_time(fn, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.time()
+        result = fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'r:n:w:')
+    repeats = 3
+    lines = 100000
+    cpu_count = os.cpu_count() or 1
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= cpu_count:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != cpu_count:
+        worker_counts.append(cpu_count)
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-r':
+            repeats = int(opt_arg)
+        elif opt_flag == '-n':
+            lines = int(opt_arg)
+        elif opt_flag == '-w':
+            worker_counts = [int(workers) for workers in opt_arg.split(',')]
+    if args:
+        with open(args[0]) as fileobj:
+            source = fileobj.read()
+    else:
+        source = make_module(lines)
+    parser = myparser.MyParser()
+    print('%d lines, %d characters, %d CPUs, best of %d' % (
+        source.count('\n'), len(source), cpu_count, repeats))
+    print('%-8s %10s %8s' % ('workers', 'parse (s)', 'speedup'))
+    serial_time, serial_tree = best_time(
+        lambda: parser.parse_string(source), repeats)
+    print('%-8s %10.4f %8.2f' % ('serial', serial_time, 1.0))
+    for workers in worker_counts:
+        env = {'parallel' : workers, 'parallel_threshold' : 0}
+        # Start the workers, and build their parsers.
+        parallel_tree = parser.parse_string(source, env)
+        assert parallel_tree == serial_tree
+        parallel_time, _ = best_time(
+            lambda: parser.parse_string(source, env), repeats)
+        print('%-8d %10.4f %8.2f' % (workers, parallel_time,
+                                     serial_time / parallel_time))
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_parallel.py
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark the MyParser engines head to head.
+
+Parses a corpus of source files with each parser engine, checks the
+engines build the same trees, and reports the best total parse time
+for each.  The default corpus is the Python and Mython sources of the
+mython package itself.  With -s, the corpus is also parsed using the
+instrumented trampoline handlers (see trampoline.ParserStats), their
+time is reported, and their counters are written to the given file as
+JSON.
+
+Usage: python -m mython.benchmarks.bench_parse [-r repeats]
+           [-e engine[,engine...]] [-s stats.json] [file ...]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import getopt
+import os
+import sys
+import time
+
+from mython import myparser
+from mython import trampoline
+
+# ______________________________________________________________________
+# Function definitions
+
+def get_default_corpus():
+    package_dir = os.path.dirname(os.path.dirname(
+        os.path.abspath(myparser.__file__)))
+    corpus = []
+    for dirpath, dirnames, filenames in os.walk(
+            os.path.join(package_dir, 'mython')):
+        dirnames.sort()
+        corpus.extend(os.path.join(dirpath, filename)
+                      for filename in sorted(filenames)
+                      if os.path.splitext(filename)[1] in ('.py', '.my'))
+    return corpus
+
+# ______________________________________________________________________
+
+def load_corpus(filenames):
+    sources = []
+    for filename in filenames:
+        with open(filename) as fileobj:
+            sources.append((filename, fileobj.read()))
+    return sources
+
+# ______________________________________________________________________
+
+def time_engine(parser, sources, repeats):
+    """Return the best time to parse all sources, and the trees."""
+    best = None
+    trees = None
+    for _ in range(repeats):
+        start = time.time()
+        crnt_trees = [parser.parse_string(source, {'filename' : filename})
+                      for filename, source in sources]
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        trees = crnt_trees
+    return best, trees
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'r:e:s:')
+    repeats = 5
+    engines = sorted(myparser.ENGINES.keys())
+    stats_file = None
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-r':
+            repeats = int(opt_arg)
+        elif opt_flag == '-e':
+            engines = opt_arg.split(',')
+        elif opt_flag == '-s':
+            stats_file = opt_arg
+    sources = load_corpus(args if args else get_default_corpus())
+    line_count = sum(source.count('\n') for _, source in sources)
+    print('%d files, %d lines, best of %d' % (len(sources), line_count,
+                                                repeats))
+    print('%-12s %10s %12s %8s' % ('engine', 'build (s)', 'parse (s)',
+                                   'lines/s'))
+    reference_trees = None
+    for engine in engines:
+        start = time.time()
+        parser = myparser.MyParser(engine=engine)
+        build_time = time.time() - start
+        parse_time, trees = time_engine(parser, sources, repeats)
+        if reference_trees is None:
+            reference_trees = trees
+        elif trees != reference_trees:
+            print('%s: trees differ from %s!' % (engine, engines[0]))
+        print('%-12s %10.4f %12.4f %8d' % (engine, build_time, parse_time,
+                                           line_count / parse_time))
+    if stats_file is not None:
+        stats = trampoline.ParserStats()
+        start = time.time()
+        parser = myparser.MyParser(stats=stats)
+        build_time = time.time() - start
+        parse_time, trees = time_engine(parser, sources, repeats)
+        if (reference_trees is not None) and (trees != reference_trees):
+            print('instrumented: trees differ from %s!' % (engines[0],))
+        print('%-12s %10.4f %12.4f %8d' % ('instrumented', build_time,
+                                           parse_time,
+                                           line_count / parse_time))
+        with open(stats_file, 'w') as fileobj:
+            fileobj.write(stats.to_json())
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_parse.py
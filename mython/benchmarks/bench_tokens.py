@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""Benchmark the delivery of tokens from the lexer to the parser.
+
+Reads every token of a corpus through the get_lookahead() and
+get_token() methods the parser engines use, once reading a token at a
+time (a chunk size of 0) and once for each of the given chunk sizes,
+using both the line at a time and the whole-buffer scanners.  Reports
+the best time and the number of tokens per second for each, and the
+best time to parse the corpus.  The default corpus is the Python and
+Mython sources of the mython package itself.
+
+Usage: python -m mython.benchmarks.bench_tokens [-r repeats]
+           [-c chunk_size[,chunk_size...]] [file ...]
+"""
+# ______________________________________________________________________
+# Module imports
+
+import getopt
+import io
+import sys
+import time
+
+from mython import mylexer, myparser
+from mython.benchmarks.bench_parse import get_default_corpus, load_corpus
+
+# ______________________________________________________________________
+# Module data
+
+SCANNERS = ('lines', 'buffer')
+
+# ______________________________________________________________________
+# Function definitions
+
+def make_token_stream(source, scanner, chunk_size):
+    if scanner == 'lines':
+        return mylexer.MythonTokenStream(
+            mylexer.MythonReadliner(io.StringIO(source).readline),
+            chunk_size=chunk_size)
+    return mylexer.MythonTokenStream(None, source=source,
+                                     chunk_size=chunk_size)
+
+def drain(token_stream):
+    """Read a token stream the way a parser does, returning the number
+    of tokens read."""
+    get_lookahead = token_stream.get_lookahead
+    get_token = token_stream.get_token
+    count = 0
+    while get_lookahead()[0] != mylexer.tokenize.ENDMARKER:
+        get_token()
+        count += 1
+    return count + 1
+
+def best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# ______________________________________________________________________
+
+def main(*args):
+    opts, args = getopt.getopt(args, 'r:c:')
+    repeats = 5
+    chunk_sizes = [mylexer.CHUNK_SIZE]
+    for opt_flag, opt_arg in opts:
+        if opt_flag == '-r':
+            repeats = int(opt_arg)
+        elif opt_flag == '-c':
+            chunk_sizes = [int(chunk_size)
+                           for chunk_size in opt_arg.split(',')]
+    parser = myparser.MyParser()
+    # Only keep sources that parse, and that lex without the parser
+    # switching the lexer state for Mython quotations.
+    sources = []
+    for filename, source in load_corpus(args if args else
+                                        get_default_corpus()):
+        try:
+            parser.parse_string(source)
+            drain(make_token_stream(source, 'buffer', 0))
+        except (SyntaxError, mylexer.tokenize.TokenError):
+            continue
+        sources.append(source)
+    print('%d files, best of %d' % (len(sources), repeats))
+    print('%-8s %6s %10s %12s %10s' % ('scanner', 'chunk', 'lex (s)',
+                                       'tokens/s', 'parse (s)'))
+    for scanner in SCANNERS:
+        for chunk_size in [0] + chunk_sizes:
+            counts = []
+            def lex_corpus():
+                del counts[:]
+                for source in sources:
+                    counts.append(drain(make_token_stream(source, scanner,
+                                                          chunk_size)))
+            def parse_corpus():
+                for source in sources:
+                    parser.parse_string(source, {'scanner' : scanner,
+                                                 'chunk_size' : chunk_size})
+            lex_time = best_time(lex_corpus, repeats)
+            parse_time = best_time(parse_corpus, repeats)
+            print('%-8s %6d %10.4f %12d %10.4f' % (
+                scanner, chunk_size, lex_time, sum(counts) / lex_time,
+                parse_time))
+
+# ______________________________________________________________________
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
+
+# ______________________________________________________________________
+# End of bench_tokens.py
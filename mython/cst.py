@@ -9,29 +9,83 @@ Python's ast utility module.
 import ast
 import token
 
+from mython.trampoline import TOKEN_TYPES
+
 # ______________________________________________________________________
 # Module data
 
 __DEBUG__ = False
 
+# Nonterminals of the Python grammar that only pass their value through
+# when they have a single child.  Trees built by
+# trampoline.CompactTreeBuilder(UNIT_CHAIN_SYMBOLS) omit these nodes
+# in that case.
+UNIT_CHAIN_SYMBOLS = frozenset((
+    'namedexpr_test', 'test', 'or_test', 'and_test', 'not_test',
+    'comparison', 'expr', 'xor_expr', 'and_expr', 'shift_expr',
+    'arith_expr', 'term', 'factor', 'power', 'atom_expr',
+    'testlist', 'testlist_star_expr', 'exprlist',
+))
+
 # ______________________________________________________________________
 # Class definitions
 
 class ConcreteNodeVisitor(object):
-    def __init__(self, symbol_names=None):
+    """Base class for concrete syntax tree visitors.
+
+    Trees may be in the compact form built by
+    trampoline.CompactTreeBuilder, where a unit chain node only appears
+    if it has more than one child.  Passing a collection of nonterminal
+    names as collapse_unit_chains makes the visitor skip single child
+    nodes with those names in full trees as well, so a visitor sees the
+    same nodes whichever form of tree it is given.
+
+    Visitor methods are found once for each nonterminal (by number or
+    name) and kept in the node_visitors table, which maps the node data
+    (None for tokens) to the nonterminal name and the visit_<name>
+    function of the visitor's class, or generic_visit.
+    """
+    def __init__(self, symbol_names=None, collapse_unit_chains=None):
         self.symbol_names = {} if symbol_names is None else symbol_names
+        self.collapse_unit_chains = collapse_unit_chains
+        self.node_visitors = {}
+
+    def get_node_visitor(self, data):
+        """Return the name and visitor function for nodes with the given
+        data (None for tokens), adding them to the node_visitors
+        table."""
+        if data is None:
+            postfix = 'token'
+        else:
+            postfix = self.symbol_names.get(data, str(data))
+        cls = type(self)
+        ret_val = postfix, getattr(cls, 'visit_' + postfix, cls.generic_visit)
+        self.node_visitors[data] = ret_val
+        return ret_val
 
     def visit(self, node):
         if __DEBUG__:
             print("Visiting: %s\n" % str(node))
         data = node[0]
-        if isinstance(data, tuple):
-            postfix = 'token'
+        if isinstance(data, TOKEN_TYPES):
+            data = None
+        node_visitors = self.node_visitors
+        if data in node_visitors:
+            postfix, visitor = node_visitors[data]
         else:
-            postfix = self.symbol_names.get(data, str(data))
-        method = 'visit_' + postfix
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node)
+            postfix, visitor = self.get_node_visitor(data)
+        collapse_unit_chains = self.collapse_unit_chains
+        if collapse_unit_chains is not None:
+            while ((postfix in collapse_unit_chains) and
+                   (len(node[1]) == 1) and
+                   (not isinstance(node[1][0][0], TOKEN_TYPES))):
+                node = node[1][0]
+                data = node[0]
+                if data in node_visitors:
+                    postfix, visitor = node_visitors[data]
+                else:
+                    postfix, visitor = self.get_node_visitor(data)
+        return visitor(self, node)
 
     def generic_visit(self, node):
         data, children = node
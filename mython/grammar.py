@@ -0,0 +1,287 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Utilities for working with the grammar tuples generated by pgen2
+(see pgen2.dfa for the tuple schema), once accelerators have been
+added.
+
+These functions support extending a grammar without regenerating it:
+only the nonterminals reached by new rules get new DFA's, FIRST sets
+and accelerators.  This module also compiles the accelerated states of
+a grammar into flat transition tables (see TransitionTables), which
+the parser engines run on.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import array
+import token
+
+# ______________________________________________________________________
+# Module data
+
+# pgen2.dfa.addAccelerators() packs state and nonterminal numbers into
+# seven bits of each accelerator entry.
+MAX_ACCEL_INDEX = 1 << 7
+
+# ______________________________________________________________________
+# Function definitions
+
+def calc_first_sets (grammar, first_sets = None, dfa_indices = None):
+    """Compute the FIRST sets of a grammar's nonterminals as integer
+    bitsets, indexed by DFA index.
+
+    Mirrors PyPgen.calcFirstSet(), but also works for grammars that
+    already have accelerators (addAccelerators() drops the FIRST set
+    strings).  When FIRST_SETS and DFA_INDICES are given, only the
+    listed DFA's are recomputed and the rest are copied from FIRST_SETS.
+    """
+    dfas, labels = grammar[0], grammar[1]
+    if first_sets is None or dfa_indices is None:
+        first_sets = [None] * len(dfas)
+    else:
+        first_sets = list(first_sets)
+        first_sets.extend([None] * (len(dfas) - len(first_sets)))
+        for dfa_index in dfa_indices:
+            first_sets[dfa_index] = None
+    def calc_first_set (dfa_index):
+        # -1 marks a FIRST set under construction, catching left
+        # recursion the same way pgen does.
+        first_sets[dfa_index] = -1
+        dfa = dfas[dfa_index]
+        result = 0
+        for label_index, _ in dfa[3][dfa[2]][0]:
+            label_type = labels[label_index][0]
+            if label_type >= token.NT_OFFSET:
+                sub_index = label_type - token.NT_OFFSET
+                sub_first_set = first_sets[sub_index]
+                if sub_first_set is None:
+                    sub_first_set = calc_first_set(sub_index)
+                if sub_first_set == -1:
+                    raise ValueError("Left recursion below '%s'." % dfa[1])
+                result |= sub_first_set
+            else:
+                result |= 1 << label_index
+        first_sets[dfa_index] = result
+        return result
+    for dfa_index in range(len(dfas)):
+        if first_sets[dfa_index] is None:
+            calc_first_set(dfa_index)
+    return first_sets
+
+# ______________________________________________________________________
+
+def first_set_dependents (grammar):
+    """Map each DFA index to the DFA indices whose FIRST sets include
+    its FIRST set."""
+    dfas, labels = grammar[0], grammar[1]
+    dependents = [set() for _ in dfas]
+    for dfa_index, dfa in enumerate(dfas):
+        for label_index, _ in dfa[3][dfa[2]][0]:
+            label_type = labels[label_index][0]
+            if label_type >= token.NT_OFFSET:
+                dependents[label_type - token.NT_OFFSET].add(dfa_index)
+    return dependents
+
+# ______________________________________________________________________
+
+def accelerate_state (arcs, labels, first_sets):
+    """Build an accelerated state tuple from a list of arcs.
+
+    Mirrors the handleState() closure in pgen2.dfa.addAccelerators(),
+    taking FIRST sets as computed by calc_first_sets()."""
+    label_count = len(labels)
+    accel_array = [-1] * label_count
+    accept = 0
+    for label_index, arrow in arcs:
+        label_type = labels[label_index][0]
+        if arrow >= MAX_ACCEL_INDEX:
+            continue
+        if label_type >= token.NT_OFFSET:
+            nt_index = label_type - token.NT_OFFSET
+            if nt_index >= MAX_ACCEL_INDEX:
+                continue
+            accel_value = arrow | (1 << 7) | (nt_index << 8)
+            first_set = first_sets[nt_index]
+            for ibit in range(label_count):
+                if (first_set >> ibit) & 1:
+                    accel_array[ibit] = accel_value
+        elif 0 == label_index:
+            accept = 1
+        elif label_index < label_count:
+            accel_array[label_index] = arrow
+    accel_upper = label_count
+    while (accel_upper > 0) and (-1 == accel_array[accel_upper - 1]):
+        accel_upper -= 1
+    accel_lower = 0
+    while (accel_lower < accel_upper) and (-1 == accel_array[accel_lower]):
+        accel_lower += 1
+    return (arcs, (accel_upper, accel_lower,
+                   accel_array[accel_lower:accel_upper]), accept)
+
+# ______________________________________________________________________
+
+def pack_accelerators (grammar):
+    """Return a grammar tuple with its accelerator lists stored as
+    arrays of 16 bit integers.
+
+    Accelerator entries pack a state number and a nonterminal index of
+    seven bits each (see MAX_ACCEL_INDEX) with a PUSH flag, so they
+    always fit in a signed 16 bit integer.  The arrays take a quarter
+    of the memory of lists, and work anywhere the lists do, but the
+    result can not be stored using marshal (see mython.grammarcache).
+    """
+    dfas = []
+    for dfa in grammar[0]:
+        states = []
+        for arcs, (accel_upper, accel_lower, accel_table), accept in dfa[3]:
+            if type(accel_table) is not array.array:
+                accel_table = array.array('h', accel_table)
+            states.append((arcs, (accel_upper, accel_lower, accel_table),
+                           accept))
+        dfas.append((dfa[0], dfa[1], dfa[2], states))
+    return (tuple(dfas),) + tuple(grammar[1:])
+
+# ______________________________________________________________________
+
+def extend_grammar (pgen, grammar, nfa_grammar, changed, label_count,
+                    first_sets, additional_tokens = None):
+    """Update an accelerated grammar tuple after its NFA's were extended.
+
+    Accepts a PyPgen instance, the grammar tuple to update, the extended
+    NFA set tuple, and the list of changed NFA indices and the old label
+    count, as returned by mython.nfa.extend_nfas().  FIRST_SETS are the
+    grammar's current FIRST sets (see calc_first_sets()).
+
+    Builds new DFA's for the changed nonterminals, translates the new
+    labels, then recomputes FIRST sets and accelerators only where they
+    may differ.  Returns a triple of the new grammar tuple, a sorted
+    list of the indices of the DFA's that were rebuilt, and the new
+    FIRST sets.
+    """
+    nfas, nfa_labels = nfa_grammar
+    if len(nfas) > MAX_ACCEL_INDEX:
+        raise ValueError("Too many nonterminals to accelerate (%d > %d)." %
+                         (len(nfas), MAX_ACCEL_INDEX))
+    dfas = list(grammar[0])
+    dfas.extend([None] * (len(nfas) - len(dfas)))
+    for dfa_index in changed:
+        dfa = pgen.nfaToDfa(nfas[dfa_index])
+        dfas[dfa_index] = tuple(dfa[:4])
+    new_labels = list(nfa_labels[label_count:])
+    pgen.translateLabels([dfas, new_labels], additional_tokens)
+    labels = list(grammar[1]) + new_labels
+    new_grammar = (dfas, labels, grammar[2], grammar[3])
+    # ____________________________________________________________
+    # Recompute FIRST sets for the changed nonterminals and everything
+    # whose FIRST set is built from them.
+    dependents = first_set_dependents(new_grammar)
+    stale = set()
+    pending = list(changed)
+    while pending:
+        dfa_index = pending.pop()
+        if dfa_index not in stale:
+            stale.add(dfa_index)
+            pending.extend(dependents[dfa_index])
+    new_first_sets = calc_first_sets(new_grammar, first_sets, stale)
+    moved = set(dfa_index for dfa_index in stale
+                if (dfa_index >= len(first_sets) or
+                    first_sets[dfa_index] != new_first_sets[dfa_index]))
+    moved_types = set(dfa_index + token.NT_OFFSET for dfa_index in moved)
+    # ____________________________________________________________
+    # Rebuild accelerators for the new DFA's, and for DFA's with an arc
+    # to a nonterminal whose FIRST set changed.
+    rebuilt = set(changed)
+    for dfa_index, dfa in enumerate(dfas):
+        if dfa_index in rebuilt:
+            continue
+        states = dfa[3]
+        if any(labels[label_index][0] in moved_types
+               for state in states for label_index, _ in state[0]):
+            rebuilt.add(dfa_index)
+    for dfa_index in rebuilt:
+        dfa = dfas[dfa_index]
+        dfas[dfa_index] = (dfa[0], dfa[1], dfa[2],
+                           [accelerate_state(state[0], labels,
+                                             new_first_sets)
+                            for state in dfa[3]])
+    return new_grammar, sorted(rebuilt), new_first_sets
+
+# ______________________________________________________________________
+# Class definitions
+
+class TransitionTables (object):
+    """The accelerated states of a set of DFA's, compiled into flat
+    integer tables.
+
+    States are numbered consecutively across the DFA's, starting from
+    the DFA's initial states listed in the initials dictionary (keyed
+    by DFA number).  Each state has an entry in the lowers and uppers
+    arrays (the range of label indices it accepts), the offsets array
+    (the index of its first transition), and the accepts and finals
+    byte strings.  A final state is an accepting state with no other
+    arcs, so the parser can pop its nonterminal as soon as it shifts
+    into it.
+
+    Transitions are stored in the targets and nonterminals arrays,
+    indexed by a state's offset plus the label index minus the state's
+    lower bound.  The target is the number of the state to go to (or -1
+    for a syntax error), and the nonterminal is the nonterminal number
+    to PUSH before going there (or 0 to SHIFT the token).  These fields
+    are decoded from the accelerator entries built by pgen once, when
+    the tables are compiled.
+    """
+    __slots__ = ('initials', 'lowers', 'uppers', 'offsets', 'accepts',
+                 'finals', 'targets', 'nonterminals')
+
+    def __init__ (self, dfas):
+        self.initials = {}
+        lowers = array.array('h')
+        uppers = array.array('h')
+        offsets = array.array('i')
+        accepts = bytearray()
+        finals = bytearray()
+        targets = array.array('h')
+        nonterminals = array.array('h')
+        for dfa_number, dfa_name, dfa_initial, states in dfas:
+            base = len(lowers)
+            self.initials[dfa_number] = base + dfa_initial
+            for state in states:
+                arcs, (accel_upper, accel_lower, accel_table), accept = state
+                lowers.append(accel_lower)
+                uppers.append(accel_upper)
+                offsets.append(len(targets))
+                accepts.append(1 if accept else 0)
+                finals.append(1 if accept and len(arcs) == 1 else 0)
+                for accel_result in accel_table:
+                    if accel_result == -1:
+                        targets.append(-1)
+                        nonterminals.append(0)
+                    elif accel_result & (1 << 7):
+                        # PUSH
+                        targets.append(base + (accel_result &
+                                               (MAX_ACCEL_INDEX - 1)))
+                        nonterminals.append((accel_result >> 8) +
+                                            token.NT_OFFSET)
+                    else:
+                        # SHIFT
+                        targets.append(base + accel_result)
+                        nonterminals.append(0)
+        self.lowers = lowers
+        self.uppers = uppers
+        self.offsets = offsets
+        self.accepts = bytes(accepts)
+        self.finals = bytes(finals)
+        self.targets = targets
+        self.nonterminals = nonterminals
+
+    def expected_labels (self, state):
+        """Return the label indices with a transition from a state."""
+        accel_lower = self.lowers[state]
+        offset = self.offsets[state] - accel_lower
+        return [label_index
+                for label_index in range(accel_lower, self.uppers[state])
+                if self.targets[offset + label_index] != -1]
+
+# ______________________________________________________________________
+# End of grammar.py
@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Persistent on-disk cache of composed pgen grammar tables.
+
+Building a Mython parser requires parsing the Python Grammar file,
+composing it with the Mython extension grammar, and then running the
+pgen DFA, first set and accelerator passes.  The result is a plain
+tuple of lists, tuples, strings and integers, so this module stores it
+using marshal, under a key derived from everything that determines it.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import token
+
+import pgen2.dfa
+import pgen2.parser
+import pgen2.pgen
+
+from mython import nfa
+
+# ______________________________________________________________________
+# Module data
+
+CACHE_MAGIC = b'MYGC'
+
+# Bump this when the layout of the cached grammar tuple changes.
+CACHE_FORMAT_VERSION = 1
+
+CACHE_HEADER = CACHE_MAGIC + str(CACHE_FORMAT_VERSION).encode('ascii') + b'\n'
+
+_generator_digest = None
+
+# ______________________________________________________________________
+# Function definitions
+
+def get_cache_dir():
+    """Return the directory used for cached grammars, or None if the
+    cache is disabled.
+
+    The MYTHON_CACHE_DIR environment variable overrides the default
+    location (a mython folder in the user's cache directory).  Setting
+    MYTHON_NO_GRAMMAR_CACHE to a non-empty value disables the cache."""
+    if os.environ.get('MYTHON_NO_GRAMMAR_CACHE'):
+        return None
+    cache_dir = os.environ.get('MYTHON_CACHE_DIR')
+    if not cache_dir:
+        cache_root = (os.environ.get('XDG_CACHE_HOME') or
+                      os.path.join(os.path.expanduser('~'), '.cache'))
+        cache_dir = os.path.join(cache_root, 'mython')
+    return cache_dir
+
+# ______________________________________________________________________
+
+def get_generator_digest():
+    """Return a digest identifying the code that generates grammar tables.
+
+    pgen2 does not expose a version number, so its version is taken to
+    be the contents of the modules that build the tables (together with
+    the Mython NFA composition code)."""
+    global _generator_digest
+    if _generator_digest is None:
+        hasher = hashlib.sha256()
+        for module in (pgen2.parser, pgen2.pgen, pgen2.dfa, nfa):
+            source_path = os.path.splitext(module.__file__)[0] + '.py'
+            try:
+                with open(source_path, 'rb') as source_file:
+                    hasher.update(source_file.read())
+            except (IOError, OSError):
+                hasher.update(module.__name__.encode('utf-8'))
+        _generator_digest = hasher.hexdigest()
+    return _generator_digest
+
+# ______________________________________________________________________
+
+def grammar_cache_key(grammar_bytes, grammar_ext, start_symbol,
+                      additional_tokens=None):
+    """Compute the cache key for a composed grammar.
+
+    The key covers the contents of the base Grammar file, the extension
+    grammar text, the start symbol, any additional token numbers, the
+    generator code and the interpreter version (token numbering and the
+    marshal format both vary between Python versions)."""
+    hasher = hashlib.sha256()
+    key_parts = [
+        CACHE_HEADER,
+        get_generator_digest().encode('ascii'),
+        repr(sys.version_info[:2]).encode('ascii'),
+        repr(sorted(token.tok_name.items())).encode('utf-8'),
+        repr(sorted((additional_tokens or {}).items())).encode('utf-8'),
+        start_symbol.encode('utf-8'),
+        grammar_ext.encode('utf-8'),
+        grammar_bytes,
+    ]
+    for key_part in key_parts:
+        hasher.update(repr(len(key_part)).encode('ascii'))
+        hasher.update(key_part)
+    return hasher.hexdigest()
+
+# ______________________________________________________________________
+
+def get_cache_path(key, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'grammar-%s.marshal' % key)
+
+# ______________________________________________________________________
+
+def load_grammar(key, cache_dir=None):
+    """Return the cached grammar tuple for the given key, or None if
+    there is no valid cache entry."""
+    cache_path = get_cache_path(key, cache_dir)
+    if cache_path is None:
+        return None
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            if cache_file.read(len(CACHE_HEADER)) != CACHE_HEADER:
+                return None
+            grammar = marshal.load(cache_file)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if not (isinstance(grammar, tuple) and len(grammar) == 4):
+        return None
+    return grammar
+
+# ______________________________________________________________________
+
+def store_grammar(key, grammar, cache_dir=None):
+    """Write a grammar tuple to the cache.  Returns True on success.
+
+    Failures (such as a read-only cache directory) are not errors;
+    the grammar is simply rebuilt the next time it is needed."""
+    cache_path = get_cache_path(key, cache_dir)
+    if cache_path is None:
+        return False
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        temp_fd, temp_path = tempfile.mkstemp(dir=cache_dir,
+                                              suffix='.tmp')
+        try:
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                temp_file.write(CACHE_HEADER)
+                marshal.dump(grammar, temp_file)
+            # Readers either see the old entry or the complete new one.
+            os.replace(temp_path, cache_path)
+        except:
+            os.unlink(temp_path)
+            raise
+    except (IOError, OSError, ValueError):
+        return False
+    return True
+
+# ______________________________________________________________________
+# End of grammarcache.py
@@ -0,0 +1,423 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Defines an incremental lexer and an incremental parser for Mython
+source buffers.
+
+An IncrementalLexer keeps the tokens of a source string, and a
+checkpoint at the start of each line the whole-buffer scanner reaches
+(see mylexer.MythonTokenStream.generate_buffer_tokens()).  Checkpoints
+record the scanner's state there (line number, parenthesis level,
+continuation flag, indentation stack and mysuite flag), the state of
+the lexer's Mython driver (see below), and the number of tokens before
+the line.
+
+When the source is edited, the lexer restarts the scanner from the
+last checkpoint before the edit, and stops at the first line after the
+edit whose state matches the checkpoint for the same text in the old
+source.  The old tokens from that line on are kept, moved by the
+number of lines the edit added or removed, so the scanning done is
+proportional to the size of the edit and the tokens it affects.
+
+There is no parser to switch the scanner's state for Mython syntax, so
+the lexer drives the switches itself: a mysuite is started by a
+statement starting with 'my' followed by '[', a name or ':', and a
+myexpr by a BANG followed by an opening delimiter (after an optional
+language expression in square brackets).
+
+An IncrementalParser does the same for the parse tree of a source
+string, with checkpoints at the top level statements of a file_input.
+Between top level statements the lexer and the parser are always in
+the same state, so an edit is parsed from the start of the statement
+before it, one statement at a time, until the next statement starts
+at the start of an old statement after the edit.  The old subtrees
+from there on are kept.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import bisect
+import tokenize
+
+from mython import mylexer, trampoline
+
+# ______________________________________________________________________
+# Module data
+
+# States of the driver for 'my' statements.
+MY_NONE = 0
+MY_PENDING = 1
+MY_HEADER = 2
+
+# States of the driver for Mython expressions.  Positive states count
+# the square brackets open in a language expression.
+BANG_NONE = -2
+BANG_START = -1
+BANG_LANG_DONE = 0
+
+# State at the start of a source string.
+INITIAL_STATE = (0, 0, 0, (0,), False, True, MY_NONE, BANG_NONE)
+
+__DEBUG__ = False
+
+# ______________________________________________________________________
+# Function definitions
+
+def shift_tokens (tokens, line_delta):
+    """Return a list of the given tokens moved down by line_delta lines."""
+    if not line_delta:
+        return list(tokens)
+    return [(tok[0], tok[1], (tok[2][0] + line_delta, tok[2][1]),
+             (tok[3][0] + line_delta, tok[3][1]), tok[4])
+            for tok in tokens]
+
+def shift_tree (node, line_delta):
+    """Return a copy of a parse tree (with tuple tokens) moved down by
+    line_delta lines."""
+    elem, children = node
+    if isinstance(elem, tuple):
+        return ((elem[0], elem[1], (elem[2][0] + line_delta, elem[2][1]),
+                 (elem[3][0] + line_delta, elem[3][1]), elem[4]), [])
+    return (elem, [shift_tree(child, line_delta) for child in children])
+
+def first_token (node):
+    """Return the first token in a parse tree."""
+    while not isinstance(node[0], trampoline.TOKEN_TYPES):
+        node = node[1][0]
+    return node[0]
+
+# ______________________________________________________________________
+# Class definitions
+
+class Converged (Exception):
+    """Raised by IncrementalLexer.add_checkpoint() to stop the scanner
+    once the new tokens rejoin the old ones."""
+
+# ______________________________________________________________________
+
+class OldScan (object):
+    """The checkpoints and tokens of a source before an edit."""
+    def __init__ (self, lexer, delta, edit_end):
+        self.offsets = lexer.offsets
+        self.states = lexer.states
+        self.token_counts = lexer.token_counts
+        self.tokens = lexer.tokens
+        self.error = lexer.error
+        # Change in length of the source, and the (new) offset of the
+        # end of the edit.
+        self.delta = delta
+        self.edit_end = edit_end
+
+    def find_checkpoint (self, offset):
+        """Return the index of the checkpoint at the given (new) offset,
+        or -1."""
+        old_offset = offset - self.delta
+        index = bisect.bisect_left(self.offsets, old_offset)
+        if (index < len(self.offsets)) and (self.offsets[index] == old_offset):
+            return index
+        return -1
+
+# ______________________________________________________________________
+
+class IncrementalLexer (object):
+    def __init__ (self, source):
+        self.source = source
+        self.tokens = []
+        self.offsets = []
+        self.states = []
+        self.token_counts = []
+        self.error = None
+        self.relexed_lines = 0
+        self.old = None
+        self.token_stream = None
+        self.scan(0, INITIAL_STATE)
+
+    def scan (self, offset, state, old = None):
+        """Scan the source from the line starting at offset, given the
+        state at that line, adding tokens and checkpoints."""
+        (lnum, parenlev, continued, indents, in_mysuite, self.stmt_start,
+         self.my_state, self.bang_state) = state
+        self.token_stream = mylexer.MythonTokenStream(
+            None, source = self.source, start = offset, lnum = lnum,
+            parenlev = parenlev, continued = continued,
+            indents = list(indents), in_mysuite = in_mysuite,
+            checkpoint = self.add_checkpoint, chunk_size = 0)
+        self.old = old
+        self.error = None
+        self.relexed_lines = 0
+        tokens = self.tokens
+        try:
+            for crnt_token in self.token_stream.tokenizer:
+                tokens.append(crnt_token)
+                self.drive(crnt_token)
+        except Converged:
+            pass
+        except (tokenize.TokenError, SyntaxError) as error:
+            self.error = error
+        finally:
+            self.old = None
+            self.token_stream = None
+
+    def add_checkpoint (self, offset):
+        token_stream = self.token_stream
+        state = (token_stream.lnum, token_stream.parenlev,
+                 token_stream.continued, tuple(token_stream.indents),
+                 token_stream.in_mysuite, self.stmt_start, self.my_state,
+                 self.bang_state)
+        old = self.old
+        if (old is not None) and (offset >= old.edit_end):
+            old_index = old.find_checkpoint(offset)
+            if (old_index >= 0) and (old.states[old_index][1:] == state[1:]):
+                line_delta = state[0] - old.states[old_index][0]
+                # Lexer errors give their line in the message, so keep
+                # scanning to get it right instead of moving the old one.
+                if (old.error is None) or (line_delta == 0):
+                    self.join(old, old_index, line_delta)
+                    raise Converged()
+        self.offsets.append(offset)
+        self.states.append(state)
+        self.token_counts.append(len(self.tokens))
+        self.relexed_lines += 1
+
+    def join (self, old, old_index, line_delta):
+        """Append the old checkpoints and tokens from the given old
+        checkpoint on."""
+        if __DEBUG__:
+            print("Converged at line %d after %d lines." %
+                  (old.states[old_index][0] + line_delta + 1,
+                   self.relexed_lines))
+        token_delta = len(self.tokens) - old.token_counts[old_index]
+        delta = old.delta
+        self.offsets.extend(offset + delta
+                            for offset in old.offsets[old_index:])
+        if line_delta:
+            self.states.extend((state[0] + line_delta,) + state[1:]
+                               for state in old.states[old_index:])
+        else:
+            self.states.extend(old.states[old_index:])
+        self.token_counts.extend(count + token_delta
+                                 for count in old.token_counts[old_index:])
+        self.tokens.extend(shift_tokens(
+            old.tokens[old.token_counts[old_index]:], line_delta))
+        self.error = old.error
+
+    def drive (self, crnt_token):
+        """Switch the scanner's state for Mython syntax, given the token
+        it just produced."""
+        tok_type = crnt_token[0]
+        if (tok_type == tokenize.NL) or (tok_type == tokenize.COMMENT):
+            return
+        tok_str = crnt_token[1]
+        token_stream = self.token_stream
+        bang_state = self.bang_state
+        if bang_state != BANG_NONE:
+            if bang_state <= BANG_LANG_DONE:
+                if (tok_str == '[') and (bang_state == BANG_START):
+                    self.bang_state = 1
+                else:
+                    self.bang_state = BANG_NONE
+                    if (tok_type == tokenize.OP) and (tok_str in
+                                                      mylexer.CLOSERS):
+                        token_stream.start_myexpr(crnt_token)
+            elif tok_str == '[':
+                self.bang_state += 1
+            elif tok_str == ']':
+                self.bang_state -= 1
+        elif tok_type == mylexer.BANG:
+            self.bang_state = BANG_START
+        if self.my_state == MY_PENDING:
+            self.my_state = MY_NONE
+            if (tok_type == tokenize.NAME) or (tok_str in ('[', ':')):
+                token_stream.start_mysuite()
+                self.my_state = MY_HEADER
+        if self.my_state == MY_HEADER:
+            if (tok_str == ':') and (token_stream.parenlev == 0):
+                self.my_state = MY_NONE
+            elif tok_type == tokenize.NEWLINE:
+                # Not a 'my' statement after all.
+                token_stream.in_mysuite = False
+                self.my_state = MY_NONE
+        elif (self.stmt_start and (tok_type == tokenize.NAME) and
+              (tok_str == 'my')):
+            self.my_state = MY_PENDING
+        self.stmt_start = tok_type in (tokenize.NEWLINE, tokenize.INDENT,
+                                       tokenize.DEDENT)
+
+    def edit (self, start, end, text):
+        """Replace source[start:end] with text, updating the tokens.
+        Returns the number of lines scanned."""
+        old = OldScan(self, len(text) - (end - start), start + len(text))
+        self.source = self.source[:start] + text + self.source[end:]
+        # The scanner also checkpoints the end of a source that does not
+        # end in a newline, so restart from a line before the edit.
+        index = max(bisect.bisect_left(old.offsets, start) - 1, 0)
+        self.offsets = old.offsets[:index]
+        self.states = old.states[:index]
+        self.token_counts = old.token_counts[:index]
+        self.tokens = old.tokens[:old.token_counts[index]]
+        self.scan(old.offsets[index], old.states[index], old)
+        return self.relexed_lines
+
+# ______________________________________________________________________
+
+class IncrementalParser (object):
+    """Keeps the parse tree of a source string up to date as it is
+    edited.
+
+    Accepts a MyParser with the file_input start symbol, the source
+    string and a parse environment (as for MyParser.parse_buffer();
+    array trees and compact tokens are not supported).  The tree
+    property returns the current tree, and the offsets and rows
+    attributes hold the offset and line number of each top level
+    statement (and top level NEWLINE token) in it.
+
+    Moving the old subtrees after an edit that adds or removes lines
+    costs time proportional to the rest of the tree, so it is put off
+    until the tree is asked for: the children attribute holds the top
+    level subtrees, and the shifts attribute the number of lines each
+    one has yet to be moved down by.
+    """
+    def __init__ (self, parser, source, env = None):
+        if env is None:
+            env = {}
+        if (env.get("array_tree") or env.get("compact_tokens") or
+            env.get("sink") is not None):
+            raise ValueError("Incremental parsing requires nested tuple "
+                             "trees of tuple tokens.")
+        if parser.start_symbol != 'file_input':
+            raise ValueError("Incremental parsing requires the "
+                             "file_input start symbol.")
+        if "filename" not in env:
+            env = env.copy()
+            env["filename"] = "<string>"
+        self.parser = parser
+        self.env = env
+        self.source = source
+        self.children = None
+        self.shifts = None
+        self.offsets = []
+        self.rows = []
+        self.reparsed = 0
+        self.parse()
+
+    @property
+    def tree (self):
+        children = self.children
+        if children is None:
+            return None
+        shifts = self.shifts
+        for index, line_delta in enumerate(shifts):
+            if line_delta:
+                children[index] = shift_tree(children[index], line_delta)
+                shifts[index] = 0
+        return ('start', [('file_input', list(children))])
+
+    def parse (self):
+        """Parse the whole source."""
+        self.children = None
+        children = self.parser.parse_buffer(self.source, self.env)[1][0][1]
+        first_row = self.env.get("lineno", 1)
+        line_starts = mylexer.SourceLines(self.source,
+                                          first_row).get_line_starts()
+        self.rows = [first_token(child)[2][0] for child in children[:-1]]
+        self.offsets = [line_starts[row - first_row] for row in self.rows]
+        self.children = children
+        self.shifts = [0] * len(children)
+        self.reparsed = len(self.rows)
+
+    def edit (self, start, end, text):
+        """Replace source[start:end] with text, updating the tree.
+        Returns the number of top level statements parsed.
+
+        If the new source has a syntax error, the exception is raised
+        and the tree is None until an edit fixes it (which parses the
+        whole source again)."""
+        old_source = self.source
+        self.source = source = old_source[:start] + text + old_source[end:]
+        if self.children is None:
+            self.parse()
+            return self.reparsed
+        env = self.env
+        parser = self.parser
+        offsets = self.offsets
+        rows = self.rows
+        delta = len(text) - (end - start)
+        edit_end = start + len(text)
+        # An edit can join the statement it starts in to the one before
+        # it (such as with an 'else' or an indented line), so parsing
+        # restarts at the statement before that.
+        index = bisect.bisect_right(offsets, start) - 2
+        if index < 0:
+            index = 0
+            restart_offset = 0
+            restart_row = env.get("lineno", 1)
+        else:
+            restart_offset = offsets[index]
+            restart_row = rows[index]
+        new_offsets = []
+        new_rows = []
+        join = []
+        def parse_statements (instream, outtree):
+            offset = restart_offset
+            row = restart_row
+            while 1:
+                crnt_token = instream.get_lookahead()
+                if crnt_token[0] == tokenize.ENDMARKER:
+                    outtree.pushpop(instream.get_token())
+                    return
+                tok_row = crnt_token[2][0]
+                while row < tok_row:
+                    offset = source.index('\n', offset) + 1
+                    row += 1
+                if offset >= edit_end:
+                    old_offset = offset - delta
+                    old_index = bisect.bisect_left(offsets, old_offset)
+                    if ((old_index < len(offsets)) and
+                        (offsets[old_index] == old_offset)):
+                        join.append((old_index, row - rows[old_index]))
+                        return
+                new_offsets.append(offset)
+                new_rows.append(row)
+                if crnt_token[0] == tokenize.NEWLINE:
+                    outtree.pushpop(instream.get_token())
+                else:
+                    yield 'stmt'
+        handlers = parser.handlers.copy()
+        handlers['start'] = parse_statements
+        token_stream = mylexer.MythonTokenStream(
+            None, source = source, start = restart_offset,
+            lnum = restart_row - 1,
+            column_offset = env.get("column_offset", 0),
+            chunk_size = env.get("chunk_size", mylexer.CHUNK_SIZE),
+            label_tables = parser.label_tables)
+        try:
+            new_children = parser.parse_token_stream(token_stream, env,
+                                                     handlers)[1]
+        except:
+            self.children = None
+            raise
+        children = self.children
+        shifts = self.shifts
+        self.reparsed = len(new_rows)
+        new_shifts = [0] * len(new_children)
+        if join:
+            old_index, line_delta = join[0]
+            new_children.extend(children[old_index:])
+            if line_delta:
+                new_shifts.extend(shift + line_delta
+                                  for shift in shifts[old_index:])
+                new_rows.extend(row + line_delta
+                                for row in rows[old_index:])
+            else:
+                new_shifts.extend(shifts[old_index:])
+                new_rows.extend(rows[old_index:])
+            new_offsets.extend(offset + delta
+                               for offset in offsets[old_index:])
+        self.children = children[:index] + new_children
+        self.shifts = shifts[:index] + new_shifts
+        self.offsets = offsets[:index] + new_offsets
+        self.rows = rows[:index] + new_rows
+        return self.reparsed
+
+# ______________________________________________________________________
+# End of incremental.py
@@ -15,23 +15,163 @@ TODO: Port to using cst.ConcreteNodeTransformer().
 import ast
 import token
 
+from mython.trampoline import TOKEN_TYPES
+
 # ______________________________________________________________________
 # Class definition
 
 class MyHandler(object):
-    def __init__ (self, *args, **kws):
+    # Number of nested nonterminals handle_node() recurses through before
+    # it handles the rest of a subtree using handle_deep_node().  Each
+    # level takes a few Python stack frames.
+    max_depth = 64
+
+    # Nonterminals whose handlers only work from their parent's handler
+    # (which may read the node's tokens directly, or skip the node), so
+    # handle_deep_node() does not handle them on their own.
+    parent_read_symbols = frozenset(('comp_for', 'dotted_name',
+                                     'sync_comp_for'))
+
+    # The handle_* methods that dispatch nodes, rather than handling a
+    # kind of node, and so are left out of the dispatch tables.
+    dispatch_methods = frozenset(('handle_children', 'handle_deep_node',
+                                  'handle_default', 'handle_node'))
+
+    def __init__ (self, symbol_names = None, *args, **kws):
         self.expr_context = ast.Load
+        # A copy, so names added by handle_node() stay with the instance.
+        self.node_handlers = dict(self.get_node_handlers())
+        self.handler_vector = self.get_handler_vector(symbol_names)
+        self.depth_left = self.max_depth
+        self.prebuilt = {}
+
+    @classmethod
+    def get_node_handlers (cls):
+        """Return the dispatch table of a handler class, mapping the
+        name of each nonterminal the class has a handle_<name> method
+        for (including inherited and overridden ones) to the method's
+        function.  The table is built once per class, and is not
+        modified afterwards."""
+        node_handlers = cls.__dict__.get('_node_handlers')
+        if node_handlers is None:
+            node_handlers = {}
+            for attr_name in dir(cls):
+                if (attr_name.startswith('handle_') and
+                        attr_name not in cls.dispatch_methods):
+                    node_handlers[attr_name[7:]] = getattr(cls, attr_name)
+            cls._node_handlers = node_handlers
+        return node_handlers
+
+    @classmethod
+    def get_handler_vector (cls, symbol_names = None):
+        """Return a list holding the handler function for each numbered
+        nonterminal, at its number minus token.NT_OFFSET.  The optional
+        symbol_names maps nonterminal numbers to names (as given by a
+        pgen grammar, or the symbol module); handle_default is used for
+        names without a handler, and for unnamed numbers."""
+        if not symbol_names:
+            return []
+        node_handlers = cls.get_node_handlers()
+        handler_vector = [cls.handle_default] * (
+            max(symbol_names) - token.NT_OFFSET + 1)
+        for number, name in symbol_names.items():
+            if number >= token.NT_OFFSET:
+                handler_vector[number - token.NT_OFFSET] = node_handlers.get(
+                    name, cls.handle_default)
+        return handler_vector
 
     def handle_node (self, node):
-        handler_name = "handle_%s" % (str(node[0]),)
-        handler = getattr(self, handler_name, self.handle_default)
-        return handler(node)
+        data = node[0]
+        if isinstance(data, TOKEN_TYPES):
+            return self.handle_default(node)
+        if self.prebuilt:
+            key = (id(node), self.expr_context)
+            if key in self.prebuilt:
+                return self.prebuilt.pop(key)
+        depth_left = self.depth_left
+        if not depth_left:
+            return self.handle_deep_node(node)
+        if data.__class__ is int:
+            try:
+                handler = self.handler_vector[data - token.NT_OFFSET]
+            except IndexError:
+                handler = type(self).handle_default
+        else:
+            try:
+                handler = self.node_handlers[data]
+            except KeyError:
+                handler = getattr(type(self), "handle_%s" % (data,),
+                                  type(self).handle_default)
+                self.node_handlers[data] = handler
+        # Restoring the saved depth (rather than incrementing it) also
+        # recovers from errors caught by an enclosing handler.
+        self.depth_left = depth_left - 1
+        ret_val = handler(self, node)
+        self.depth_left = depth_left
+        return ret_val
+
+    def handle_deep_node (self, node):
+        """Handle a subtree without recursing more than max_depth levels.
+
+        Walks the subtree using an explicit stack, finding the nodes
+        with max_depth levels of unhandled nonterminals below them, and
+        handles each of them (deepest first) in the current expression
+        context, keeping their results in the prebuilt table.  While
+        the subtree is handled, handle_node() returns a prebuilt result
+        instead of handling the node again when it reaches the node in
+        the same context, so each of these handlers recurses through at
+        most max_depth levels.  Nodes reached in another context (such
+        as the value in a subscripted assignment target) are handled
+        again, the same way.  Nonterminals in parent_read_symbols are
+        left to their parent's handler.
+        """
+        is_token = self.is_token
+        max_depth = self.max_depth
+        parent_read_symbols = self.parent_read_symbols
+        prebuilt = self.prebuilt
+        expr_context = self.expr_context
+        # The prebuilt table is keyed by node identity, so the walk
+        # keeps every node of the subtree alive until its keys are
+        # removed, below.
+        nodes = []
+        stack = [node]
+        while stack:
+            crnt_node = stack.pop()
+            nodes.append(crnt_node)
+            stack.extend(child for child in crnt_node[1]
+                         if not is_token(child))
+        saved_depth_left = self.depth_left
+        keys = []
+        try:
+            # Reversing the preorder list puts each node after its
+            # children.
+            heights = {}
+            for crnt_node in reversed(nodes[1:]):
+                height = 1 + max([heights[id(child)]
+                                  for child in crnt_node[1]
+                                  if not is_token(child)] or [0])
+                if (height >= max_depth and
+                        crnt_node[0] not in parent_read_symbols):
+                    self.depth_left = max_depth
+                    result = self.handle_node(crnt_node)
+                    self.expr_context = expr_context
+                    key = (id(crnt_node), expr_context)
+                    prebuilt[key] = result
+                    keys.append(key)
+                    height = 0
+                heights[id(crnt_node)] = height
+            self.depth_left = max_depth
+            return self.handle_node(node)
+        finally:
+            self.depth_left = saved_depth_left
+            for key in keys:
+                prebuilt.pop(key, None)
 
     def handle_children (self, node):
         return [self.handle_node(child) for child in node[1]]
 
     def is_token (self, node):
-        return type(node[0]) == tuple
+        return isinstance(node[0], TOKEN_TYPES)
 
     def handle_default (self, node):
         if self.is_token(node):
@@ -1029,10 +1169,10 @@ class MyHandler(object):
             assert (self.is_token(children[child_index]) and
                     children[child_index][0][1] == ":")
             child_index += 1
-            # XXX Would like better way of determining what kind of
-            # nonterminal a node is...
+            # The upper bound may be any expression node (unit chains
+            # may be collapsed), so test for the slice step instead.
             if ((child_index < len(children)) and
-                (children[child_index][0] == "test")):
+                (children[child_index][0] != "sliceop")):
                 upper = self.handle_node(children[child_index])
                 child_index += 1
             if child_index < len(children):
@@ -1386,7 +1526,7 @@ class MyHandler(object):
     def handle_with_stmt (self, node):
         children = node[1]
         location = children[0][0][2]
-        if children[1][0] == 'test':
+        if children[1][0] != 'with_item':
             context_expr = self.handle_node(children[1])
             optional_vars = None
             if not self.is_token(children[2]):
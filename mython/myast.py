@@ -6,6 +6,8 @@ import token
 import ast
 import sys
 
+from mython.cst import UNIT_CHAIN_SYMBOLS
+from mython.trampoline import TOKEN_TYPES, CompactTreeBuilder
 from mython.lang.python.astify import MyHandler
 from mython.lang.python.python36.astify36 import My36Handler
 from mython.lang.python.python37.astify37 import My37Handler
@@ -51,7 +53,7 @@ class MyConcreteTransformer(get_base_class()):
         child_count = len(children)
         assert child_count > 0
         first_child = children[0][0]
-        if isinstance(first_child, tuple) and (first_child[1] == '!'):
+        if isinstance(first_child, TOKEN_TYPES) and (first_child[1] == '!'):
             location = first_child[2]
             elang = None
             if child_count == 2:
@@ -71,19 +73,21 @@ class MyConcreteTransformer(get_base_class()):
         child_count = len(children)
         assert child_count > 0
         first_child = children[0][0]
-        if isinstance(first_child, tuple) and (first_child[1] == 'my'):
+        if isinstance(first_child, TOKEN_TYPES) and (first_child[1] == 'my'):
             location = first_child[2]
             lang = None
             name = None
             params = None
             index = 1
             crnt_child = children[index][0]
-            if isinstance(crnt_child, tuple) and (crnt_child[0] == token.LSQB):
+            if (isinstance(crnt_child, TOKEN_TYPES) and
+                (crnt_child[0] == token.LSQB)):
                 lang = self.handle_node(children[index + 1])
                 assert children[index + 2][0][0] == token.RSQB
                 index += 3
                 crnt_child = children[index][0]
-            if isinstance(crnt_child, tuple) and (crnt_child[0] == token.NAME):
+            if (isinstance(crnt_child, TOKEN_TYPES) and
+                (crnt_child[0] == token.NAME)):
                 name = crnt_child[1]
                 index += 1
                 crnt_child = children[index][0]
@@ -115,6 +119,49 @@ class MyConcreteTransformer(get_base_class()):
 
     handle_myexpr1 = handle_myexpr
 
+    def handle_built_stmt(self, node):
+        # Statements already transformed by an ASTBuilder.
+        return node[2]
+
+# ______________________________________________________________________
+
+class ASTBuilder(CompactTreeBuilder):
+    """Parse sink (see trampoline.ParseSink) that builds a Mython
+    abstract syntax tree as it parses, instead of a concrete syntax
+    tree that is transformed afterwards.
+
+    Each statement is transformed (using a MyConcreteTransformer, or the
+    given transformer) as soon as it is parsed, and its concrete syntax
+    replaced in its parent by a 'built_stmt' node holding its first
+    token and its abstract syntax, so only the statement being parsed
+    and its enclosing statements are ever held as concrete syntax.  When
+    the start symbol is popped, the tree attribute is set to the
+    abstract syntax of the whole input.  Unit chains with the given
+    names are collapsed as by CompactTreeBuilder (pass an empty
+    collection to keep them).
+
+    Errors transforming a statement are raised while parsing, so they
+    are reported before any syntax errors later in the input.
+    """
+    def __init__(self, collapsible=UNIT_CHAIN_SYMBOLS, transformer=None):
+        super(ASTBuilder, self).__init__(collapsible)
+        if transformer is None:
+            transformer = MyConcreteTransformer()
+        self.transformer = transformer
+
+    def pop(self):
+        node = super(ASTBuilder, self).pop()
+        stack = self.stack
+        if node[0] == 'stmt':
+            first_child = node
+            while not isinstance(first_child[0], TOKEN_TYPES):
+                first_child = first_child[1][0]
+            stack[-1][1][-1] = ('built_stmt', [first_child],
+                                self.transformer.handle_node(node))
+        elif len(stack) == 1:
+            self.tree = self.transformer.handle_node(stack[0])
+        return node
+
 # ______________________________________________________________________
 
 class MyAbstractTransformer(ast.NodeTransformer):
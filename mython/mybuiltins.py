@@ -17,7 +17,9 @@ import tokenize as _tokenize
 import pprint as _pprint
 
 from . import myparser as _myparser
+from . import mylexer as _mylexer
 from . import myast as _myast
+from . import cst as _cst
 
 # ______________________________________________________________________
 # Function definitions
@@ -30,12 +32,65 @@ def myfrontend(text, env):
 # ______________________________________________________________________
 
 def myparse(text, env):
-    """Given a source string, return a Mython abstract syntax tree."""
+    """Given a source string, return a Mython abstract syntax tree.
+
+    Modules are parsed a run of top level statements at a time (see
+    mylexer.split_mython_statements()), using ast.parse() for the runs
+    without Mython syntax, unless "hybrid_parse" is set to False in the
+    environment.  The statements parsed by MyParser are transformed
+    into abstract syntax as they are parsed (see myast.ASTBuilder),
+    unless "direct_ast" is set to False in the environment."""
     # FIXME: Reintroduce better syntax error handling based on environment.
-    parser = _myparser.MyParser(start_symbol=env.get('start_symbol', 'file_input'))
-    concrete_tree = parser.parse_string(text)
-    transformer = _myast.MyConcreteTransformer()
-    return transformer.handle_node(concrete_tree), env
+    start_symbol = env.get('start_symbol', 'file_input')
+    parser = _myparser.get_parser(start_symbol)
+    parse_env = {'compact_tree' : env.get('compact_tree', True),
+                 'direct_ast' : env.get('direct_ast', True)}
+    if (start_symbol == 'file_input') and env.get('hybrid_parse', True):
+        segments = _mylexer.split_mython_statements(text)
+        if (segments is not None) and (len(segments) > 1 or
+                                       not segments[0][3]):
+            try:
+                return _hybrid_parse(parser, text, segments, parse_env), env
+            except (SyntaxError, _tokenize.TokenError):
+                # Parse the whole module, to report the error properly.
+                pass
+    return _parse_ast(parser, text, parse_env), env
+
+def _parse_ast(parser, text, parse_env):
+    """Parse a source string using MyParser, returning its abstract
+    syntax."""
+    if parse_env['direct_ast']:
+        collapsible = ()
+        if parse_env['compact_tree']:
+            collapsible = _cst.UNIT_CHAIN_SYMBOLS
+        return parser.parse_string(text, dict(
+            parse_env, sink=_myast.ASTBuilder(collapsible)))
+    # MyConcreteTransformer accepts trees with collapsed unit chains.
+    concrete_tree = parser.parse_string(text, parse_env)
+    return _myast.MyConcreteTransformer().handle_node(concrete_tree)
+
+def _hybrid_parse(parser, text, segments, parse_env):
+    """Parse the runs of statements found by
+    mylexer.split_mython_statements(), and splice the results into a
+    single module."""
+    body = []
+    for start, end, lineno, has_mython in segments:
+        module = None
+        if not has_mython:
+            # Padding with newlines gives the nodes their line numbers.
+            try:
+                module = _pyast.parse('\n' * (lineno - 1) + text[start:end])
+            except (MemoryError, RecursionError):
+                # Python's parser gives up on deeply nested code, which
+                # MyParser and MyConcreteTransformer can handle.
+                pass
+        if module is None:
+            module = _parse_ast(parser, text[start:end],
+                                dict(parse_env, lineno=lineno))
+        body.extend(module.body)
+    if len(_pyast.Module._fields) > 1:
+        return _pyast.Module(body, [])
+    return _pyast.Module(body)
 
 # ______________________________________________________________________
 
@@ -217,20 +272,53 @@ def _load_file (filename, env):
     Given a file name, and an environment, load the file, and
     extend/modify the environment with information about the current
     file to be processed."""
-    with (open(filename)) as fileobj:
-        text = fileobj.read()
+    text = _mylexer.load_source(filename)
     env["filename"] = filename
     env["output_file"] = "%s.pyc" % (_os.path.splitext(filename)[0])
     return text, env
 
 # ______________________________________________________________________
 
+def _can_bypass_frontend (text, env):
+    """_can_bypass_frontend(text, env) -> bool
+
+    Return True if the given source can be compiled as plain Python,
+    because it has no Mython syntax and the environment uses the
+    default front end."""
+    return (env.get("bypass_frontend", True) and
+            env.get("myfrontend", myfrontend) is myfrontend and
+            env.get("myparse", myparse) is myparse and
+            env.get("mydesugar", mydesugar) is mydesugar and
+            not _mylexer.has_mython_syntax(text))
+
+# ______________________________________________________________________
+
+def _count_compile (env, key):
+    compile_stats = env.get("compile_stats")
+    if compile_stats is not None:
+        compile_stats[key] = compile_stats.get(key, 0) + 1
+
+# ______________________________________________________________________
+
 def mycompile_file (filename, env = None):
     """mycompile_file(filename, env) -> co, env
-    """
+
+    Files without Mython syntax skip the Mython front end, and are
+    compiled using the built-in compile() (or ast.parse(), if the
+    environment has its own back end).  Set "bypass_frontend" to False
+    in the environment to always use the front end.  The "bypassed"
+    and "full" counts in the environment's "compile_stats" dictionary
+    count the files compiled each way."""
     if env is None:
         env = initial_environment()
     text, env = _load_file(filename, env)
+    if _can_bypass_frontend(text, env):
+        _count_compile(env, "bypassed")
+        backend = env.get("mybackend", mybackend)
+        if backend is mybackend:
+            return compile(text, filename, "exec"), env.copy()
+        return backend(_pyast.parse(text, filename), env.copy())
+    _count_compile(env, "full")
     frontend = env.get("myfrontend", myfrontend)
     ast, env = frontend(text, env)
     backend = env.get("mybackend", mybackend)
@@ -362,6 +450,9 @@ def initial_environment ():
     for key, value in globals().items():
         if (key[0] != "_") or (key in ("__myimport__",)):
             ret_val[key] = value
+    # Copies of the environment share the counts of the files
+    # compiled by mycompile_file().
+    ret_val["compile_stats"] = {"bypassed" : 0, "full" : 0}
     return ret_val
 
 # ______________________________________________________________________
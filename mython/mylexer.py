@@ -12,6 +12,8 @@ Jonathan Riehl
 from __future__ import print_function
 
 import sys
+import io
+import mmap
 import re
 import tokenize
 import string
@@ -19,7 +21,7 @@ import pprint
 
 import pgen2.tokenizer
 
-from mython.trampoline import TokenStream
+from mython.trampoline import TokenStream, Token
 
 # ______________________________________________________________________
 # Module data
@@ -46,6 +48,51 @@ CLOSERS = {
     '[' : ']',
 }
 
+# The whole-buffer scanner (see MythonTokenStream.generate_buffer_tokens())
+# uses a single pattern with a named group for each of the alternatives
+# in pseudoprog, in the same order, so both match the same text.
+master_prog = re.compile(
+    tokenize.Whitespace + '(?:' + '|'.join((
+        r'(?P<contline>\\\r?\n)',
+        r'(?P<eof>\Z)',
+        '(?P<comment>%s)' % tokenize.Comment,
+        '(?P<triple>%s)' % tokenize.Triple,
+        '(?P<number>%s)' % tokenize.Number,
+        '(?P<funny>%s)' % tokenize.Funny,
+        '(?P<contstr>%s)' % tokenize.ContStr,
+        '(?P<name>%s)' % tokenize.Name,
+        r'(?P<bang>[!])',
+    )) + ')')
+
+indent_prog = re.compile(tokenize.Whitespace)
+
+# Triple quoted strings are matched across lines in the buffer, so a
+# backslash may escape a newline.
+buffer_endprogs = {k : re.compile(v.pattern, re.DOTALL)
+                   for k, v in endprogs.items() if v is not None}
+
+myexpr_delim_progs = {
+    open_delim : re.compile('[%s%s]' % (re.escape(open_delim),
+                                        re.escape(close_delim)))
+    for open_delim, close_delim in CLOSERS.items()
+}
+
+# Matches anything that might start Mython syntax: a BANG, or a line
+# starting with the word 'my' (see has_mython_syntax()).
+mython_syntax_prog = re.compile(r'!(?!=)|^[ \t\f]*my\b', re.MULTILINE)
+
+# The characters split_mython_statements() has to look at, and lines
+# starting with the word 'my'.
+split_prog = re.compile(r'[\'"#()\[\]{}\\\n!]|^[ \t\f]*my\b', re.MULTILINE)
+
+# Matches the start of a line that starts a top level statement, unless
+# the line is inside brackets, a string, or a continued line.
+top_level_prog = re.compile(
+    r'^(?![ \t\f\r\n#)\]}]|(?:else|elif|except|finally)\b)', re.MULTILINE)
+
+# Default number of tokens MythonTokenStream reads ahead at a time.
+CHUNK_SIZE = 64
+
 COERCE_TOKEN_TYPES = {
     attr.lower() : getattr(tokenize, attr)
     for attr in ('ASYNC', 'AWAIT')
@@ -109,6 +156,49 @@ class MythonReadliner (object):
 
 # ______________________________________________________________________
 
+class SourceLines (object):
+    """Line table for a source buffer, shared by the compact tokens
+    (see trampoline.Token) scanned from it.
+
+    The offsets of the lines are only found the first time a token asks
+    for its line."""
+    def __init__ (self, source, first_row = 1, column_offset = 0):
+        self.source = source
+        self.first_row = first_row
+        self.column_offset = column_offset
+        self.line_starts = None
+
+    def get_line_starts (self):
+        if self.line_starts is None:
+            source = self.source
+            line_starts = [0]
+            line_end = source.find('\n')
+            while line_end >= 0:
+                line_starts.append(line_end + 1)
+                line_end = source.find('\n', line_end + 1)
+            if line_starts[-1] != len(source):
+                line_starts.append(len(source))
+            self.line_starts = line_starts
+        return self.line_starts
+
+    def get_text (self, start_row, end_row, end_col):
+        """Return the text of the lines spanned by a token, matching the
+        line text given to MythonTokenStream.make_token()."""
+        line_starts = self.get_line_starts()
+        first_index = start_row - self.first_row
+        last_index = end_row - self.first_row
+        # Tokens that run to the start of a line (MYSUITE) end on the
+        # line before.
+        if (end_col == self.column_offset) and (last_index > first_index):
+            last_index -= 1
+        if (first_index < 0) or (first_index + 1 >= len(line_starts)):
+            return ''
+        last_index = min(last_index, len(line_starts) - 2)
+        return self.source[line_starts[first_index]:
+                           line_starts[last_index + 1]]
+
+# ______________________________________________________________________
+
 class MythonTokenStream (TokenStream):
     def __init__ (self, readliner, **kws):
         """Constructor for the Mython token stream.
@@ -132,6 +222,27 @@ class MythonTokenStream (TokenStream):
 
         These state variables may be initialized using keywork arguments.
 
+        If the source keyword argument is given, the stream scans that
+        string as a whole using generate_buffer_tokens(), and the
+        readliner is not used (and may be None).  When scanning a
+        source string, setting the compact_tokens keyword argument makes
+        the default make_token() build compact trampoline.Token records
+        that look up their line in a shared SourceLines table.  The
+        start keyword argument gives the offset of the line to start
+        scanning at (with lnum and the other state variables set to
+        their values at that line), and the checkpoint keyword argument
+        gives a function that is called with the offset of each line
+        as the scanner reaches it (see mython.incremental).
+
+        Tokens are read from the generator in chunks of up to
+        chunk_size (CHUNK_SIZE by default) tokens, which are filtered
+        and remapped once (see fill_chunk()).  Setting chunk_size to 0
+        reads a token at a time using tokenize().  Given a
+        trampoline.LabelTables instance as the label_tables keyword
+        argument, the stream classifies the tokens of each chunk as it
+        is read, and get_label() returns the grammar label index of the
+        lookahead token.
+
         This lexical stream also defines a function or method for
         creating tokens:
 
@@ -149,14 +260,42 @@ class MythonTokenStream (TokenStream):
         self.contline = kws.get("contline", 0)
         self.indents = kws.get("indents", [0])
         self.tabsize = kws.get("tabsize", 8)
-        self.make_token = kws.get("make_token", self.make_token)
+        self.source = kws.get("source")
+        self.start = kws.get("start", 0)
+        self.checkpoint = kws.get("checkpoint")
+        self.source_lines = None
+        if kws.get("compact_tokens"):
+            if self.source is None:
+                raise ValueError("Compact tokens require a source string.")
+            self.source_lines = SourceLines(self.source, self.lnum + 1,
+                                            self.column_offset)
+            self.make_token = kws.get("make_token", self.make_compact_token)
+        else:
+            self.make_token = kws.get("make_token", self.make_token)
         self.endprog = kws.get("endprog")
         self.in_mysuite = kws.get("in_mysuite", False)
         self.in_myexpr = kws.get("in_myexpr", False)
         self.strstart = kws.get("strstart", (-1, -1))
         self.empty_line_pattern = re.compile("\\A\\s*\\Z")
         self.ws_pattern = re.compile("\\A(\\s+)")
-        TokenStream.__init__(self, self.generate_tokens())
+        if self.source is None:
+            TokenStream.__init__(self, self.generate_tokens())
+        else:
+            TokenStream.__init__(self, self.generate_buffer_tokens())
+        self.chunk_size = kws.get("chunk_size", CHUNK_SIZE)
+        self.chunk = []
+        self.chunk_index = 0
+        self.chunk_error = None
+        self.myexpr_pending = False
+        self.label_tables = kws.get("label_tables")
+        self.chunk_labels = []
+        if self.label_tables is not None:
+            self.classify = self.label_tables.classify
+        if self.chunk_size:
+            self.get_token = self.get_chunk_token
+            self.get_lookahead = self.get_chunk_lookahead
+            if self.label_tables is not None:
+                self.get_label = self.get_chunk_label
 
     def make_token (self, tok_sym, tok_str, start_pos, end_pos, tok_ln):
         start_line, start_col = start_pos
@@ -166,6 +305,14 @@ class MythonTokenStream (TokenStream):
                    (end_line, end_col + self.column_offset), tok_ln)
         return ret_val
 
+    def make_compact_token (self, tok_sym, tok_str, start_pos, end_pos,
+                            tok_ln):
+        if tok_sym == tokenize.NAME:
+            tok_str = sys.intern(tok_str)
+        return Token(tok_sym, tok_str, start_pos[0],
+                     start_pos[1] + self.column_offset, end_pos[0],
+                     end_pos[1] + self.column_offset, self.source_lines)
+
     def start_mysuite (self):
         "Change the lexical state to reflect entry of a mysuite block."
         self.in_mysuite = True
@@ -215,6 +362,10 @@ class MythonTokenStream (TokenStream):
                 if line != '':
                     indent_lnum = self.lnum
                     match_obj = self.ws_pattern.match(line)
+                    if match_obj is None:
+                        raise SyntaxError("Improper indentation level at "
+                                          "line %d; expected %d, got 0." %
+                                          (indent_lnum, self.indents[-1]))
                     indent_ws = match_obj.groups(1)[0]
                     while line.startswith(indent_ws):
                         mysuite_lns.append(line)
@@ -439,7 +590,7 @@ class MythonTokenStream (TokenStream):
                                 token = line[spos[1]:pos]
                             else:
                                 token = "".join((myexpr_lns[0][spos[1]:],
-                                                 "".join(myexpr_lns[1:-2]),
+                                                 "".join(myexpr_lns[1:-1]),
                                                  myexpr_lns[-1][:pos]))
                             lines = "".join(myexpr_lns)
                             yield self.make_token(MYEXPR, token, spos, epos,
@@ -458,6 +609,310 @@ class MythonTokenStream (TokenStream):
         yield self.make_token(tokenize.ENDMARKER, '', (self.lnum, 0),
                               (self.lnum, 0), '')
 
+    def generate_buffer_tokens (self):
+        """Creates a generator object that yields the same tokens as
+        generate_tokens(), scanning the source string given to the
+        constructor instead of reading lines.
+
+        Tokens are recognized using a single pattern (master_prog),
+        dispatching on the name of the matched group, and positions are
+        tracked as offsets into the source.  Line and column numbers
+        are only computed when a token is made, and multi-line tokens
+        (strings, Mython quotations) are matched in place instead of
+        being accumulated line by line.
+        """
+        source = self.source
+        source_len = len(source)
+        make_token = self.make_token
+        match = master_prog.match
+        namechars = string.ascii_letters + '_'
+        checkpoint = self.checkpoint
+        def get_line_end (line_start):
+            return source.find('\n', line_start) + 1 or source_len
+        next_start = self.start
+        while 1:
+            line_start = next_start
+            if checkpoint is not None:
+                checkpoint(line_start)
+            line_end = next_start = get_line_end(line_start)
+            line = source[line_start:line_end]
+            self.lnum += 1
+            pos = line_start
+            if self.parenlev == 0 and self.in_mysuite:
+                # See generate_tokens() for why this goes here.
+                mysuite_lnum = self.lnum
+                mysuite_lns = []
+                while ((line != '') and
+                       (self.empty_line_pattern.match(line) != None)):
+                    mysuite_lns.append(line)
+                    line_start = next_start
+                    line_end = next_start = get_line_end(line_start)
+                    line = source[line_start:line_end]
+                    self.lnum += 1
+                indent_ws = ''
+                indent_lnum = -1
+                if line != '':
+                    indent_lnum = self.lnum
+                    match_obj = self.ws_pattern.match(line)
+                    if match_obj is None:
+                        raise SyntaxError("Improper indentation level at "
+                                          "line %d; expected %d, got 0." %
+                                          (indent_lnum, self.indents[-1]))
+                    indent_ws = match_obj.groups(1)[0]
+                    while line.startswith(indent_ws):
+                        mysuite_lns.append(line)
+                        line_start = next_start
+                        line_end = next_start = get_line_end(line_start)
+                        line = source[line_start:line_end]
+                        self.lnum += 1
+                        while ((line != '') and
+                               (self.empty_line_pattern.match(line) != None)):
+                            mysuite_lns.append(line)
+                            line_start = next_start
+                            line_end = next_start = get_line_end(line_start)
+                            line = source[line_start:line_end]
+                            self.lnum += 1
+                else:
+                    raise SyntaxError("Empty mysuite block, starting on "
+                                      "line %d, runs to end of file." %
+                                      mysuite_lnum)
+                indent_ws_len = len(indent_ws)
+                if indent_ws_len <= self.indents[-1]:
+                    raise SyntaxError("Improper indentation level at "
+                                      "line %d; expected %d, got %d." %
+                                      (indent_lnum, self.indents[-1],
+                                       indent_ws_len))
+                normalized_lns = [mysuite_ln[indent_ws_len:]
+                                  if len(mysuite_ln) > indent_ws_len
+                                  else (mysuite_ln[-2:]
+                                        if mysuite_ln.endswith('\r\n')
+                                        else mysuite_ln[-1:])
+                                  for mysuite_ln in mysuite_lns]
+                spos = (mysuite_lnum, indent_ws_len)
+                epos = (spos[0] + len(mysuite_lns), 0)
+                yield make_token(MYSUITE, "".join(normalized_lns), spos,
+                                 epos, "".join(mysuite_lns))
+                self.in_mysuite = False
+                pos = line_start
+            if self.parenlev == 0 and not self.continued:
+                if not line: break
+                pos = indent_prog.match(source, pos).end()
+                if pos == line_end:
+                    break
+                column = pos - line_start
+                indent_ws = line[:column]
+                if ('\t' in indent_ws) or ('\f' in indent_ws):
+                    column = 0
+                    for indent_char in indent_ws:
+                        if indent_char == ' ':
+                            column += 1
+                        elif indent_char == '\t':
+                            column = ((column/self.tabsize + 1) *
+                                      self.tabsize)
+                        else:
+                            column = 0
+                initial = source[pos]
+                if initial in '#\r\n':
+                    col = pos - line_start
+                    if initial == "#":
+                        comment_token = line[col:].rstrip('\r\n')
+                        nl_col = col + len(comment_token)
+                        yield make_token(
+                            tokenize.COMMENT, comment_token,
+                            (self.lnum, col), (self.lnum, nl_col), line)
+                        yield make_token(
+                            tokenize.NL, line[nl_col:], (self.lnum, nl_col),
+                            (self.lnum, len(line)), line)
+                    else:
+                        yield make_token(
+                            tokenize.NL, line[col:], (self.lnum, col),
+                            (self.lnum, len(line)), line)
+                    continue
+                if column > self.indents[-1]:
+                    self.indents.append(column)
+                    yield make_token(
+                        tokenize.INDENT, indent_ws, (self.lnum, 0),
+                        (self.lnum, len(indent_ws)), line)
+                while column < self.indents[-1]:
+                    if column not in self.indents:
+                        raise IndentationError(
+                            "unindent does not match any outer indentation "
+                            "level", ("<tokenize>", self.lnum,
+                                      len(indent_ws), line))
+                    self.indents.pop()
+                    yield make_token(
+                        tokenize.DEDENT, '', (self.lnum, len(indent_ws)),
+                        (self.lnum, len(indent_ws)), line)
+            else:
+                if not line:
+                    raise tokenize.TokenError("EOF in multi-line statement",
+                                              (self.lnum, 0))
+                self.continued = 0
+            while pos < line_end:
+                pseudomatch = match(source, pos)
+                if pseudomatch is None:
+                    col = pos - line_start
+                    yield make_token(tokenize.ERRORTOKEN, source[pos],
+                                     (self.lnum, col), (self.lnum, col + 1),
+                                     line)
+                    pos += 1
+                    continue
+                kind = pseudomatch.lastgroup
+                start = pseudomatch.start(kind)
+                pos = pseudomatch.end()
+                token = source[start:pos]
+                if kind == 'name':
+                    initial = token[0]
+                    if initial.isidentifier() or initial in namechars:
+                        yield make_token(
+                            COERCE_TOKEN_TYPES.get(token, tokenize.NAME),
+                            token, (self.lnum, start - line_start),
+                            (self.lnum, pos - line_start), line)
+                        continue
+                    kind = 'funny'
+                if kind == 'funny':
+                    initial = token[0]
+                    if initial in '\r\n':
+                        yield make_token(
+                            tokenize.NL if self.parenlev > 0 else
+                            tokenize.NEWLINE, token,
+                            (self.lnum, start - line_start),
+                            (self.lnum, pos - line_start), line)
+                        continue
+                    elif initial == '.' and token != '.':
+                        # generate_tokens() also classifies '...' this way.
+                        kind = 'number'
+                    else:
+                        if initial in '([{':
+                            self.parenlev += 1
+                        elif initial in '}])':
+                            self.parenlev -= 1
+                        epos = (self.lnum, pos - line_start)
+                        yield make_token(tokenize.OP, token,
+                                         (self.lnum, start - line_start),
+                                         epos, line)
+                        if (token == ':' and self.in_mysuite and
+                            self.parenlev == 0):
+                            rest = source[pos:line_end]
+                            cand_token = rest.strip()
+                            if cand_token:
+                                token_with_ws_len = len(rest.rstrip('\r\n'))
+                                while source[pos].isspace():
+                                    pos += 1
+                                yield make_token(
+                                    MYSUITE, cand_token,
+                                    (self.lnum, pos - line_start),
+                                    (self.lnum, epos[1] + token_with_ws_len),
+                                    line)
+                                pos += len(cand_token)
+                                self.in_mysuite = False
+                        elif self.in_myexpr:
+                            open_delim = self.open_delim
+                            close_delim = CLOSERS[open_delim]
+                            delim_search = myexpr_delim_progs[
+                                open_delim].search
+                            myexpr_depth = 1
+                            first_line_start = line_start
+                            while myexpr_depth > 0:
+                                delim_match = delim_search(source, pos)
+                                if delim_match is None:
+                                    raise tokenize.TokenError(
+                                        "EOF in Mython expression", epos)
+                                pos = delim_match.end()
+                                if delim_match.group() == close_delim:
+                                    myexpr_depth -= 1
+                                else:
+                                    myexpr_depth += 1
+                            if close_delim in '}])':
+                                self.parenlev -= 1
+                            line_count = source.count('\n', start, pos)
+                            if line_count:
+                                self.lnum += line_count
+                                line_start = source.rfind('\n', 0, pos) + 1
+                                line_end = next_start = get_line_end(
+                                    line_start)
+                                line = source[line_start:line_end]
+                            yield make_token(
+                                MYEXPR, source[start + len(token):pos], epos,
+                                (self.lnum, pos - line_start),
+                                source[first_line_start:line_end])
+                            self.in_myexpr = False
+                            del self.open_delim
+                        continue
+                if kind == 'number':
+                    yield make_token(tokenize.NUMBER, token,
+                                     (self.lnum, start - line_start),
+                                     (self.lnum, pos - line_start), line)
+                elif kind == 'comment':
+                    yield make_token(tokenize.COMMENT, token,
+                                     (self.lnum, start - line_start),
+                                     (self.lnum, pos - line_start), line)
+                elif kind == 'triple':
+                    self.endprog = endprogs[token]
+                    spos = (self.lnum, start - line_start)
+                    endmatch = buffer_endprogs[token].match(source, pos)
+                    if endmatch is None:
+                        raise tokenize.TokenError("EOF in multi-line string",
+                                                  spos)
+                    pos = endmatch.end(0)
+                    first_line_start = line_start
+                    line_count = source.count('\n', start, pos)
+                    if line_count:
+                        self.lnum += line_count
+                        line_start = source.rfind('\n', 0, pos) + 1
+                        line_end = next_start = get_line_end(line_start)
+                        line = source[line_start:line_end]
+                    yield make_token(tokenize.STRING, source[start:pos], spos,
+                                     (self.lnum, pos - line_start),
+                                     source[first_line_start:line_end])
+                elif kind == 'contstr':
+                    if token[-1] != '\n':
+                        yield make_token(tokenize.STRING, token,
+                                         (self.lnum, start - line_start),
+                                         (self.lnum, pos - line_start), line)
+                        continue
+                    # Continued single quoted strings are rare, so they
+                    # are matched a line at a time, as generate_tokens()
+                    # does.
+                    self.strstart = spos = (self.lnum, start - line_start)
+                    self.endprog = endprog = endprogs[
+                        token.lstrip(string.ascii_letters)[0]]
+                    first_line_start = line_start
+                    while 1:
+                        line_start = next_start
+                        line_end = next_start = get_line_end(line_start)
+                        line = source[line_start:line_end]
+                        self.lnum += 1
+                        if not line:
+                            raise tokenize.TokenError(
+                                "EOF in multi-line string", spos)
+                        endmatch = endprog.match(line)
+                        if endmatch:
+                            pos = line_start + endmatch.end(0)
+                            yield make_token(
+                                tokenize.STRING, source[start:pos], spos,
+                                (self.lnum, pos - line_start),
+                                source[first_line_start:line_end])
+                            break
+                        elif line[-2:] != '\\\n' and line[-3:] != '\\\r\n':
+                            yield make_token(
+                                tokenize.ERRORTOKEN, source[start:line_end],
+                                spos, (self.lnum, len(line)),
+                                source[first_line_start:line_end])
+                            pos = line_end
+                            break
+                elif kind == 'contline':
+                    self.continued = 1
+                elif kind == 'bang':
+                    yield make_token(BANG, token,
+                                     (self.lnum, start - line_start),
+                                     (self.lnum, pos - line_start), line)
+        for indent in self.indents[1:]:
+            yield make_token(tokenize.DEDENT, '', (self.lnum, 0),
+                             (self.lnum, 0), '')
+        yield make_token(tokenize.ENDMARKER, '', (self.lnum, 0),
+                         (self.lnum, 0), '')
+
     def tokenize (self):
         """Return the next token in the lexical stream."""
         ret_val = next(self.tokenizer)
@@ -466,14 +921,294 @@ class MythonTokenStream (TokenStream):
         if ((ret_val[0] == tokenize.OP) and
             (ret_val[1] in pgen2.tokenizer.Tokenizer.operatorMap)):
             # This is a workaround for using the Python tokenize module.
-            _, tok_str, tok_start, tok_end, tok_ln = ret_val
-            tok_type = pgen2.tokenizer.Tokenizer.operatorMap[tok_str]
-            ret_val = (tok_type, tok_str, tok_start, tok_end, tok_ln)
+            tok_type = pgen2.tokenizer.Tokenizer.operatorMap[ret_val[1]]
+            if type(ret_val) is Token:
+                ret_val.type = tok_type
+            else:
+                _, tok_str, tok_start, tok_end, tok_ln = ret_val
+                ret_val = (tok_type, tok_str, tok_start, tok_end, tok_ln)
         return ret_val
 
+    def fill_chunk (self):
+        """Replace the token chunk with the next tokens in the lexical
+        stream.
+
+        Filtering and operator remapping are done here, as tokenize()
+        does for single tokens.  The parser switches the lexical state
+        (see start_mysuite() and start_myexpr()) after seeing a ':' or
+        an opening delimiter, and the generator only checks the state
+        when it is resumed past that token, so a chunk ends at a ':',
+        and holds a single token from a BANG up to its MYEXPR.  Errors
+        are raised once the tokens before them have been read.  If the
+        stream has label tables, the chunk's tokens are classified here
+        too.
+        """
+        if self.chunk_error is not None:
+            chunk_error = self.chunk_error
+            self.chunk_error = None
+            raise chunk_error
+        tokenizer = self.tokenizer
+        operator_map = pgen2.tokenizer.Tokenizer.operatorMap
+        OP, NL, COMMENT = tokenize.OP, tokenize.NL, tokenize.COMMENT
+        chunk = []
+        append = chunk.append
+        count = 1 if self.myexpr_pending else self.chunk_size
+        try:
+            while count:
+                ret_val = next(tokenizer)
+                tok_type = ret_val[0]
+                if tok_type == OP:
+                    tok_str = ret_val[1]
+                    if tok_str in operator_map:
+                        if type(ret_val) is Token:
+                            ret_val.type = operator_map[tok_str]
+                        else:
+                            ret_val = ((operator_map[tok_str],) +
+                                       ret_val[1:])
+                    append(ret_val)
+                    if tok_str == ':':
+                        break
+                    count -= 1
+                elif tok_type == NL or tok_type == COMMENT:
+                    continue
+                else:
+                    append(ret_val)
+                    count -= 1
+                    if tok_type == BANG:
+                        self.myexpr_pending = True
+                        break
+                    elif tok_type == MYEXPR:
+                        self.myexpr_pending = False
+                    elif tok_type == tokenize.ENDMARKER:
+                        break
+        except Exception as chunk_error:
+            if not chunk:
+                raise
+            self.chunk_error = chunk_error
+        self.chunk = chunk
+        self.chunk_index = 0
+        if self.label_tables is not None:
+            self.chunk_labels = self.label_tables.classify_tokens(chunk)
+
+    def get_chunk_token (self):
+        index = self.chunk_index
+        if index >= len(self.chunk):
+            self.fill_chunk()
+            index = 0
+        self.chunk_index = index + 1
+        return self.chunk[index]
+
+    def get_chunk_lookahead (self):
+        if self.chunk_index >= len(self.chunk):
+            self.fill_chunk()
+        return self.chunk[self.chunk_index]
+
+    def get_chunk_label (self):
+        if self.chunk_index >= len(self.chunk):
+            self.fill_chunk()
+        return self.chunk_labels[self.chunk_index]
+
 # ______________________________________________________________________
 # Utility function(s).
 
+def decode_source (data):
+    """Decode the contents of a source file, given as bytes or another
+    buffer (such as an mmap).
+
+    The encoding is detected from a byte order mark or PEP 263 coding
+    declaration, and newlines are translated the same way as reading
+    a file opened in text mode."""
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        readline = data.readline
+    else:
+        readline = io.BytesIO(data).readline
+    encoding, _ = tokenize.detect_encoding(readline)
+    text = str(data, encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+# ______________________________________________________________________
+
+def has_mython_syntax (source):
+    """Return False if the given source string certainly has no Mython
+    quotations or statements, so it can be handled as plain Python.
+
+    This is a conservative test: a True result only means a '!' that
+    does not start a '!=', or a line starting with the word 'my', was
+    found (possibly in a string or comment)."""
+    return mython_syntax_prog.search(source) is not None
+
+# ______________________________________________________________________
+
+def skip_myexpr (source, pos):
+    """Given the offset just after a BANG, return the offset just after
+    the Mython expression it starts, or -1 if it is not closed.
+
+    The language expression in square brackets is matched by counting
+    brackets only; if no quotation delimiter follows the BANG, pos is
+    returned."""
+    pos = indent_prog.match(source, pos).end()
+    if source.startswith('[', pos):
+        depth = 0
+        for match_obj in myexpr_delim_progs['['].finditer(source, pos):
+            if match_obj.group() == '[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    pos = indent_prog.match(source, match_obj.end()).end()
+                    break
+        else:
+            return -1
+    open_delim = source[pos:pos + 1]
+    if open_delim not in CLOSERS:
+        return pos
+    depth = 0
+    for match_obj in myexpr_delim_progs[open_delim].finditer(source, pos):
+        if match_obj.group() == open_delim:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match_obj.end()
+    return -1
+
+# ______________________________________________________________________
+
+def find_top_level_statements (source):
+    """Find the top level statements in a source string.
+
+    Returns a list of (start, has_mython) pairs, giving the offset of
+    each top level statement (including its decorators), and whether
+    the statement may use Mython syntax (as has_mython_syntax() does,
+    but ignoring strings and comments).  Returns None if the source has
+    an unterminated string.
+
+    Mython expressions are skipped (see skip_myexpr()), and the rest of
+    a top level statement is not scanned once a line starting with 'my'
+    is found, since quotations need not be Python.  The statements are
+    only as good as this scan, so a statement that fails to parse on
+    its own means the source should be parsed as a whole.
+    """
+    source_len = len(source)
+    search = split_prog.search
+    statements = []
+    stmt_start = line_start = 0
+    stmt_mython = False
+    depth = 0
+    pos = 0
+    while 1:
+        match_obj = search(source, pos)
+        if match_obj is None:
+            break
+        pos = match_obj.end()
+        char = source[pos - 1]
+        if char == '\n':
+            if depth > 0:
+                continue
+        elif char in '\'"':
+            quote_start = match_obj.start()
+            if source.startswith(char * 3, quote_start):
+                pos = quote_start + 3
+                end_match = buffer_endprogs[char * 3].match(source, pos)
+            else:
+                end_match = endprogs[char].match(source, pos)
+            if end_match is None:
+                return None
+            pos = end_match.end()
+            continue
+        elif char == '#':
+            pos = source.find('\n', pos)
+            if pos < 0:
+                break
+            continue
+        elif char in '([{':
+            depth += 1
+            continue
+        elif char in ')]}':
+            depth -= 1
+            continue
+        elif char == '\\':
+            if source.startswith('\r\n', pos):
+                pos += 2
+            elif source.startswith('\n', pos):
+                pos += 1
+            continue
+        elif char == '!':
+            if source.startswith('=', pos):
+                continue
+            stmt_mython = True
+            pos = skip_myexpr(source, pos)
+            if pos < 0:
+                return None
+            continue
+        else:
+            stmt_mython = True
+            match_obj = top_level_prog.search(source, pos)
+            if match_obj is None:
+                break
+            pos = match_obj.start()
+            depth = 0
+        # Here pos is the start of a line outside of any brackets.
+        if (pos >= source_len) or (top_level_prog.match(source, pos) is None):
+            continue
+        if source.startswith('@', line_start):
+            # Decorators are part of the statement they decorate.
+            line_start = pos
+            continue
+        statements.append((stmt_start, stmt_mython))
+        stmt_start = line_start = pos
+        stmt_mython = False
+    statements.append((stmt_start, stmt_mython))
+    return statements
+
+def split_mython_statements (source):
+    """Split a source string into runs of top level statements.
+
+    Returns a list of (start, end, lineno, has_mython) tuples, giving
+    the offsets and first line number of each run of statements (found
+    by find_top_level_statements()), and whether the run may use Mython
+    syntax.  Returns None if the source has an unterminated string.
+    """
+    statements = find_top_level_statements(source)
+    if statements is None:
+        return None
+    source_len = len(source)
+    ret_val = []
+    lineno = 1
+    last_start = 0
+    for start, has_mython in statements:
+        if ret_val and (ret_val[-1][3] == has_mython):
+            continue
+        lineno += source.count('\n', last_start, start)
+        last_start = start
+        if ret_val:
+            ret_val[-1] = ret_val[-1][:1] + (start,) + ret_val[-1][2:]
+        ret_val.append((start, source_len, lineno, has_mython))
+    return ret_val
+
+# ______________________________________________________________________
+
+def load_source (filename):
+    """Return the decoded text of a source file.
+
+    The file is memory mapped, so its contents are only copied once,
+    when they are decoded."""
+    with open(filename, 'rb') as fileobj:
+        try:
+            data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files (and some special files) cannot be mapped.
+            return decode_source(fileobj.read())
+    try:
+        return decode_source(data)
+    finally:
+        data.close()
+
+# ______________________________________________________________________
+
 def scan_mython_file (file_obj):
     """Simple Mython scanner, returns a list of tokens, given a file object."""
     ret_val = []
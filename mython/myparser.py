@@ -2,7 +2,12 @@
 # ______________________________________________________________________
 # Module imports
 
+import atexit
+import concurrent.futures
+import gc
 import os
+import pickle
+import threading
 try:
     import StringIO as io
 except ImportError:
@@ -13,7 +18,8 @@ import pgen2.parser
 import pgen2.pgen
 import pgen2.dfa
 
-from mython import nfa, trampoline, mylexer
+from mython import nfa, trampoline, mylexer, grammarcache, grammar
+from mython import parsergen, tableparse, cst, arraytree
 import mython.lang.python
 
 # ______________________________________________________________________
@@ -27,8 +33,36 @@ myexpr: ('('|'{'|'<') MYEXPR
 myexpr1: ('('|'['|'{'|'<') MYEXPR
 """
 
+MY_ADDITIONAL_TOKENS = {
+    'BANG' : mylexer.BANG,
+    'MYEXPR' : mylexer.MYEXPR,
+    'MYSUITE' : mylexer.MYSUITE,
+}
+
+# Parser engines, by name.  Each engine is a pair of a function that
+# builds nonterminal handlers (with the signature of
+# trampoline.pgen_grammar_to_handlers()) and a function that runs
+# them (with the signature of trampoline.trampoline_parse()).
+ENGINES = {
+    'trampoline' : (trampoline.pgen_grammar_to_handlers,
+                    trampoline.trampoline_parse),
+    'generated' : (parsergen.pgen_grammar_to_handlers,
+                   trampoline.trampoline_parse),
+    'table' : (tableparse.pgen_grammar_to_handlers,
+               tableparse.table_parse),
+}
+
 py_grammar_path = os.path.split(mython.lang.python.__file__)[0]
 
+# Sources shorter than this many characters are not parsed in parallel
+# (see MyParser.parse_parallel()), since starting the worker processes
+# and moving the subtrees back costs more than it saves.
+PARALLEL_THRESHOLD = 1 << 20
+
+# Number of chunks a source parsed in parallel is split into for each
+# worker process, so workers that finish early can take more chunks.
+CHUNKS_PER_WORKER = 4
+
 TEST_STRINGS=[
 """
 my[namedtupledef] Point(x, y): pass
@@ -55,19 +89,78 @@ def pgen_compose (pgen, pgen_st1, pgen_st2, start_symbol,
 # Class definition(s)
 
 class MyParser(object):
-    def __init__(self, start_symbol=None, base_grammar_file=None):
+    def __init__(self, start_symbol=None, base_grammar_file=None,
+                 grammar_ext=None, engine=None, stats=None,
+                 handler_module=None):
         self.pgen = pgen2.pgen.PyPgen()
+        if engine is None:
+            engine = ('trampoline' if handler_module is None
+                      else 'generated')
+        if engine not in ENGINES:
+            raise ValueError("Unknown parser engine '%s'." % engine)
+        if (stats is not None) and (engine != 'trampoline'):
+            raise ValueError("Parser statistics are only gathered by the "
+                             "trampoline engine.")
+        if (handler_module is not None) and (engine != 'generated'):
+            raise ValueError("Handler modules are only used by the "
+                             "generated engine.")
+        if isinstance(handler_module, str):
+            handler_module = parsergen.load_handler_file(handler_module)
+        self.engine = engine
+        self.stats = stats
+        self.handler_module = handler_module
+        self.build_fn, self.parse_fn = ENGINES[engine]
         if base_grammar_file is None:
             base_grammar_file = mython.lang.python.get_grammar_path()
-        py_pgen_st = pgen2.parser.parse_file(base_grammar_file)
-        my_ext_pgen_st = pgen2.parser.parse_string(MY_GRAMMAR_EXT)
-        self.my_grammar = pgen_compose(
-            self.pgen, py_pgen_st, my_ext_pgen_st, 'file_input',
-            { 'BANG' : mylexer.BANG,
-              'MYEXPR' : mylexer.MYEXPR,
-              'MYSUITE' : mylexer.MYSUITE })
-        self.handlers = trampoline.pgen_grammar_to_handlers(
-            self.my_grammar, {})
+        if grammar_ext is None:
+            grammar_ext = MY_GRAMMAR_EXT
+        self.base_grammar_file = base_grammar_file
+        self.grammar_ext = grammar_ext
+        with open(base_grammar_file, 'rb') as grammar_file:
+            grammar_bytes = grammar_file.read()
+        cache_key = grammarcache.grammar_cache_key(
+            grammar_bytes, grammar_ext, 'file_input', MY_ADDITIONAL_TOKENS)
+        self.grammar_key = cache_key
+        if handler_module is not None:
+            parsergen.check_handler_module(handler_module, cache_key)
+        self.my_grammar = grammarcache.load_grammar(cache_key)
+        if self.my_grammar is None:
+            py_pgen_st = pgen2.parser.parse_file(base_grammar_file)
+            my_ext_pgen_st = pgen2.parser.parse_string(grammar_ext)
+            self.my_grammar = pgen_compose(
+                self.pgen, py_pgen_st, my_ext_pgen_st, 'file_input',
+                MY_ADDITIONAL_TOKENS)
+            grammarcache.store_grammar(cache_key, self.my_grammar)
+        self.my_grammar = grammar.pack_accelerators(self.my_grammar)
+        self.nfa_grammar = None
+        self.first_sets = None
+        self.extensions = []
+        self.label_tables = trampoline.LabelTables()
+        self.handlers = {}
+        self.build_handlers()
+        self.start_symbol = (start_symbol if start_symbol is not None
+                             else 'file_input')
+        self.handlers['start'] = self.parse_start
+
+    def build_handlers(self, dfa_indices=None):
+        """(Re)build the handlers for the given DFA indices (all of them
+        by default) using this parser's engine.  Parsers given a
+        trampoline.ParserStats instance build instrumented handlers that
+        record their activity in it.  Parsers given a handler module
+        (see parsergen.main()) take all of their handlers from it, and
+        only generate handlers for the DFA's rebuilt by extend()."""
+        if self.stats is not None:
+            self.build_fn(self.my_grammar, self.handlers, self.label_tables,
+                          dfa_indices, stats=self.stats)
+        elif (self.handler_module is not None) and (dfa_indices is None):
+            self.build_fn(self.my_grammar, self.handlers, self.label_tables,
+                          module=self.handler_module)
+        else:
+            self.build_fn(self.my_grammar, self.handlers, self.label_tables,
+                          dfa_indices)
+        self.install_overrides()
+
+    def install_overrides(self):
         nonterminal_override_names = 'mysuite', 'myexpr', 'myexpr1'
         nonterminal_overrides = ((dfa[1], dfa[0])
                                  for dfa in self.my_grammar[0]
@@ -76,9 +169,44 @@ class MyParser(object):
             handler = getattr(self, 'parse_%s' % nonterminal_name)
             self.handlers[nonterminal_name] = handler
             self.handlers[nonterminal_index] = handler
-        self.start_symbol = (start_symbol if start_symbol is not None
-                             else 'file_input')
-        self.handlers['start'] = self.parse_start
+
+    def get_nfa_grammar(self):
+        """Return the composed (but untranslated) NFA set tuple for this
+        parser, composing it if the grammar tables came from the cache."""
+        if self.nfa_grammar is None:
+            py_pgen_st = pgen2.parser.parse_file(self.base_grammar_file)
+            my_ext_pgen_st = pgen2.parser.parse_string(self.grammar_ext)
+            self.nfa_grammar = nfa.compose_nfa_sets(
+                (self.pgen.handleStart(py_pgen_st),
+                 self.pgen.handleStart(my_ext_pgen_st)))
+        return self.nfa_grammar
+
+    def extend(self, grammar_text):
+        """Add the rules in a pgen grammar string to this parser.
+
+        Rules for existing nonterminals add alternatives to them.  Only
+        the nonterminals reached by the new rules have their DFA's,
+        FIRST sets, accelerators and handlers rebuilt.  Returns the
+        names of the rebuilt nonterminals.
+
+        This modifies the parser in place; parsers returned by
+        get_parser() are shared, so extend a private MyParser instead.
+        """
+        ext_nfas = self.pgen.handleStart(
+            pgen2.parser.parse_string(grammar_text))
+        nfa_grammar, changed, label_count = nfa.extend_nfas(
+            self.get_nfa_grammar(), ext_nfas)
+        if self.first_sets is None:
+            self.first_sets = grammar.calc_first_sets(self.my_grammar)
+        my_grammar, rebuilt, first_sets = grammar.extend_grammar(
+            self.pgen, self.my_grammar, nfa_grammar, changed, label_count,
+            self.first_sets, MY_ADDITIONAL_TOKENS)
+        self.nfa_grammar = nfa_grammar
+        self.my_grammar = grammar.pack_accelerators(my_grammar)
+        self.first_sets = first_sets
+        self.extensions.append(grammar_text)
+        self.build_handlers(rebuilt)
+        return [self.my_grammar[0][dfa_index][1] for dfa_index in rebuilt]
 
     def parse_start(self, instream, outtree):
         yield self.start_symbol
@@ -107,41 +235,208 @@ class MyParser(object):
 
     parse_myexpr1 = parse_myexpr
 
+    def make_tree_builder(self, env):
+        """Return a tree builder for the options in a parse environment.
+
+        Setting 'sink' to a trampoline.ParseSink sends the parse events to
+        it, and the parse returns the sink's tree (None for sinks such as
+        trampoline.CountingSink and trampoline.ValidatingSink, which
+        build nothing).  Setting 'array_tree' builds an
+        arraytree.ArrayTree, and setting 'compact_tree' builds nested
+        tuples without unit chains (see trampoline.CompactTreeBuilder);
+        otherwise full nested tuple trees are built."""
+        if env.get("sink") is not None:
+            return env["sink"]
+        elif env.get("array_tree"):
+            return arraytree.ArrayTreeBuilder()
+        elif env.get("compact_tree"):
+            return trampoline.CompactTreeBuilder(cst.UNIT_CHAIN_SYMBOLS)
+        return trampoline.TreeBuilder()
+
     def parse_lineiter(self, lineiter, env = None):
         if env is None:
             env = {}
-        line_offset = env.get("lineno", 1) - 1
-        column_offset = env.get("column_offset", 0)
-        filename = env.get("filename", "<unknown>")
         readliner = mylexer.MythonReadliner(lineiter)
         token_stream = mylexer.MythonTokenStream(
-            readliner, lnum = line_offset, column_offset = column_offset)
-        tree_builder = trampoline.TreeBuilder()
+            readliner, lnum = env.get("lineno", 1) - 1,
+            column_offset = env.get("column_offset", 0),
+            chunk_size = env.get("chunk_size", mylexer.CHUNK_SIZE),
+            label_tables = self.label_tables)
+        return self.parse_token_stream(token_stream, env)
+
+    def parse_buffer(self, source, env = None):
+        """Parse a source string using the whole-buffer scanner (see
+        mylexer.MythonTokenStream.generate_buffer_tokens()).
+
+        Setting 'compact_tokens' in the environment puts compact
+        trampoline.Token records in the tree instead of tuples, and
+        'chunk_size' sets how many tokens the lexer reads ahead (see
+        mylexer.MythonTokenStream.fill_chunk()).  Setting 'parallel'
+        to a number of worker processes (or True for one per CPU)
+        parses sources of at least 'parallel_threshold' characters
+        (PARALLEL_THRESHOLD by default) in parallel (see
+        parse_parallel()), using the concurrent.futures executor given
+        as 'executor', or a shared pool of worker processes."""
+        if env is None:
+            env = {}
+        if (env.get("parallel") and
+            len(source) >= env.get("parallel_threshold", PARALLEL_THRESHOLD)):
+            tree = self.parse_parallel(source, env)
+            if tree is not None:
+                return tree
+        token_stream = mylexer.MythonTokenStream(
+            None, source = source, lnum = env.get("lineno", 1) - 1,
+            column_offset = env.get("column_offset", 0),
+            compact_tokens = env.get("compact_tokens", False),
+            chunk_size = env.get("chunk_size", mylexer.CHUNK_SIZE),
+            label_tables = self.label_tables)
+        return self.parse_token_stream(token_stream, env)
+
+    def parse_token_stream(self, token_stream, env, handlers=None):
+        """Parse a token stream, returning the tree built for the options
+        in env.  A handler map other than the parser's own may be given,
+        such as one with a different 'start' handler (see
+        mython.incremental.IncrementalParser)."""
+        filename = env.get("filename", "<unknown>")
+        if handlers is None:
+            handlers = self.handlers
+        tree_builder = self.make_tree_builder(env)
+        if self.stats is not None:
+            self.stats.start_parse()
         try:
-            tree_builder = trampoline.trampoline_parse(
-                self.handlers, token_stream, tree_builder)
+            tree_builder = self.parse_fn(
+                handlers, token_stream, tree_builder)
         except SyntaxError as syntax_err:
             if __DEBUG__:
                 pprint.pprint(tree_builder.tree)
-                pprint.pprint([node[0] for node in tree_builder.stack])
+                pprint.pprint([node[0] for node in
+                               getattr(tree_builder, "stack", ())])
                 # If debugging, don't mask the syntax error, just re-raise it.
                 raise
             if syntax_err.args[0].startswith("Line"):
                 err_str = "File '%s', l%s" % (filename, syntax_err.args[0][1:])
+            elif syntax_err.lineno is not None:
+                # Lexer errors, such as bad unindents, carry their location
+                # separately.
+                err_str = "File '%s', line %d, %s" % (
+                    filename, syntax_err.lineno, syntax_err.args[0])
             else:
                 err_str = "File '%s', %s" % (filename, syntax_err.args[0])
             raise SyntaxError(err_str)
         return tree_builder.tree
 
+    def get_config(self):
+        """Return the arguments needed to build a copy of this parser
+        (see get_worker_parser())."""
+        return (self.start_symbol, self.base_grammar_file, self.grammar_ext,
+                self.engine, tuple(self.extensions))
+
+    def parse_parallel(self, source, env):
+        """Parse a source string by splitting it into chunks of top level
+        statements, and parsing the chunks in worker processes.
+
+        Top level statements start at the start of a line outside any
+        brackets or strings, so the chunks are found using a quick scan
+        (see mylexer.find_top_level_statements()), and each chunk is
+        parsed on its own with its first line number passed in the
+        'lineno' option.  Workers send their trees back pickled, and
+        they are loaded here with the garbage collector paused.  The
+        subtrees are joined in order, with the DEDENT tokens ending each
+        chunk moved to the line they would have been read from.
+
+        Returns None if the source can not be split (or is not a
+        file_input, or the options ask for array trees, compact tokens
+        or a parse sink, or the parser gathers statistics), and on
+        errors, so the caller can parse the source as a whole instead,
+        which also reports the error the same way."""
+        if ((self.start_symbol != 'file_input') or env.get("array_tree") or
+            env.get("compact_tokens") or env.get("sink") is not None or
+            self.stats is not None):
+            return None
+        statements = mylexer.find_top_level_statements(source)
+        if statements is None or len(statements) < 2:
+            return None
+        workers = env.get("parallel")
+        if workers is True:
+            workers = os.cpu_count() or 1
+        chunk_size = len(source) // min(workers * CHUNKS_PER_WORKER,
+                                        len(statements)) + 1
+        chunk_starts = [0]
+        for stmt_start, _ in statements:
+            if stmt_start - chunk_starts[-1] >= chunk_size:
+                chunk_starts.append(stmt_start)
+        if len(chunk_starts) < 2:
+            return None
+        chunk_starts.append(len(source))
+        chunk_env = env.copy()
+        del chunk_env["parallel"]
+        executor = chunk_env.pop("executor", None)
+        if executor is None:
+            executor = get_process_pool(workers)
+        lineno = env.get("lineno", 1)
+        column_offset = env.get("column_offset", 0)
+        config = self.get_config()
+        jobs = []
+        linenos = []
+        for chunk_index in range(len(chunk_starts) - 1):
+            chunk_start = chunk_starts[chunk_index]
+            if chunk_index:
+                lineno += source.count('\n', chunk_starts[chunk_index - 1],
+                                       chunk_start)
+            linenos.append(lineno)
+            jobs.append((config, source[chunk_start:
+                                        chunk_starts[chunk_index + 1]],
+                         dict(chunk_env, lineno=lineno)))
+        try:
+            results = list(executor.map(_parse_chunk, jobs))
+        except (SyntaxError, mylexer.tokenize.TokenError):
+            return None
+        # Loading and joining millions of nodes with the cyclic garbage
+        # collector running takes several times longer than without it.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.join_chunk_trees(
+                source, [pickle.loads(result) for result in results],
+                chunk_starts, linenos, column_offset)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def join_chunk_trees(self, source, trees, chunk_starts, linenos,
+                         column_offset):
+        """Join the trees of the chunks of a source parsed by
+        parse_parallel()."""
+        children = []
+        for chunk_index, tree in enumerate(trees):
+            chunk_children = tree[1][0][1]
+            if chunk_index + 1 < len(trees):
+                # Drop the ENDMARKER (the first chunk may have nothing
+                # else, when the source starts with comments).
+                chunk_children = chunk_children[:-1]
+                if not chunk_children:
+                    continue
+                next_start = chunk_starts[chunk_index + 1]
+                line = source[next_start:
+                              source.find('\n', next_start) + 1 or None]
+                row = linenos[chunk_index + 1]
+                dedent = (mylexer.tokenize.DEDENT, '', (row, column_offset),
+                          (row, column_offset), line)
+                chunk_children[-1] = _move_dedents(chunk_children[-1],
+                                                   dedent)
+            children.extend(chunk_children)
+        return ('start', [('file_input', children)])
+
     def parse_file(self, filename, env=None):
         if env is None:
             env = {}
         if "filename" not in env:
             env = env.copy()
             env["filename"] = filename
-        with open(filename) as fileobj:
-            ret_val = self.parse_lineiter(fileobj.readline, env)
-        return ret_val
+        if env.get("scanner") == "lines":
+            with open(filename) as fileobj:
+                return self.parse_lineiter(fileobj.readline, env)
+        return self.parse_buffer(mylexer.load_source(filename), env)
 
     def parse_string(self, src_str, env = None):
         if env is None:
@@ -149,7 +444,135 @@ class MyParser(object):
         if "filename" not in env:
             env = env.copy()
             env["filename"] = "<string>"
-        return self.parse_lineiter(io.StringIO(src_str).readline, env)
+        if env.get("scanner") == "lines":
+            return self.parse_lineiter(io.StringIO(src_str).readline, env)
+        return self.parse_buffer(src_str, env)
+
+# ______________________________________________________________________
+
+class MyParserCache(object):
+    """Thread-safe registry of constructed MyParser instances.
+
+    Building a MyParser reads and composes the base and extension
+    grammars, which costs far more than parsing a typical quotation.
+    Parsing does not mutate the parser, so a single instance is shared
+    by every caller asking for the same base grammar path, grammar
+    extension text and start symbol.  The hits and misses attributes
+    count how often get_parser() was able to reuse a parser.
+    """
+    def __init__(self, parser_class=None):
+        self.parser_class = (parser_class if parser_class is not None
+                             else MyParser)
+        self.lock = threading.Lock()
+        self.parsers = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_parser(self, start_symbol=None, base_grammar_file=None,
+                   grammar_ext=None):
+        if start_symbol is None:
+            start_symbol = 'file_input'
+        if base_grammar_file is None:
+            base_grammar_file = mython.lang.python.get_grammar_path()
+        if grammar_ext is None:
+            grammar_ext = MY_GRAMMAR_EXT
+        key = (os.path.abspath(base_grammar_file), grammar_ext, start_symbol)
+        # The lock is held while building so concurrent requests for
+        # the same key only build the parser once.
+        with self.lock:
+            parser = self.parsers.get(key)
+            if parser is None:
+                self.misses += 1
+                parser = self.parser_class(start_symbol, base_grammar_file,
+                                           grammar_ext)
+                self.parsers[key] = parser
+            else:
+                self.hits += 1
+        return parser
+
+    def stats(self):
+        with self.lock:
+            return {'hits' : self.hits, 'misses' : self.misses,
+                    'parsers' : len(self.parsers)}
+
+    def clear(self):
+        with self.lock:
+            self.parsers.clear()
+            self.hits = 0
+            self.misses = 0
+
+# ______________________________________________________________________
+
+parser_cache = MyParserCache()
+
+worker_parsers = {}
+
+process_pools = {}
+
+process_pools_lock = threading.Lock()
+
+def get_parser(start_symbol=None, base_grammar_file=None, grammar_ext=None):
+    """Return a shared MyParser from the process-wide parser cache."""
+    return parser_cache.get_parser(start_symbol, base_grammar_file,
+                                   grammar_ext)
+
+def get_worker_parser(config):
+    """Return a parser built from the arguments given by
+    MyParser.get_config(), reusing one built earlier in this process."""
+    parser = worker_parsers.get(config)
+    if parser is None:
+        start_symbol, base_grammar_file, grammar_ext, engine, extensions = (
+            config)
+        parser = MyParser(start_symbol, base_grammar_file, grammar_ext,
+                          engine)
+        for grammar_text in extensions:
+            parser.extend(grammar_text)
+        worker_parsers[config] = parser
+    return parser
+
+def get_process_pool(workers):
+    """Return a shared pool of the given number of worker processes.
+
+    Pools are kept by process ID as well, so a process forked from one
+    that made a pool makes its own instead of using the copied one."""
+    key = os.getpid(), workers
+    with process_pools_lock:
+        pool = process_pools.get(key)
+        if pool is None:
+            pool = concurrent.futures.ProcessPoolExecutor(workers)
+            process_pools[key] = pool
+    return pool
+
+def shutdown_process_pools(wait=True):
+    """Shut down the pools made by get_process_pool() in this process,
+    and forget the pools copied from a parent process.  Called at
+    exit; later calls to get_process_pool() make new pools."""
+    pid = os.getpid()
+    with process_pools_lock:
+        pools = [pool for (pool_pid, _), pool in process_pools.items()
+                 if pool_pid == pid]
+        process_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait)
+
+atexit.register(shutdown_process_pools)
+
+def _parse_chunk(job):
+    """Parse a chunk of source in a worker process, returning the
+    pickled tree (see MyParser.parse_parallel())."""
+    config, source, env = job
+    return pickle.dumps(get_worker_parser(config).parse_buffer(source, env),
+                        pickle.HIGHEST_PROTOCOL)
+
+def _move_dedents(node, dedent):
+    """Return a copy of a parse tree with the DEDENT tokens made at the
+    end of its source replaced by the given token."""
+    elem, children = node
+    if not children:
+        if (elem[0] == mylexer.tokenize.DEDENT) and (elem[4] == ''):
+            return (dedent, [])
+        return node
+    return (elem, [_move_dedents(child, dedent) for child in children])
 
 # ______________________________________________________________________
 # Main (self-test) routine
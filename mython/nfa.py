@@ -7,6 +7,8 @@ data structures generated by pgen and/or pgen2.
 # ______________________________________________________________________
 # Module imports
 
+import token
+
 # ______________________________________________________________________
 # Function definitions
 
@@ -45,44 +47,136 @@ def compose_nfas (nfas0, nfas1):
     2. Reconstructs NFAS1 by mapping each arc to the new label table.
     3. Merges NFA's on a name by name basis.
     4. Returns a new NFA set.
+
+    This is the two argument case of compose_nfa_sets().
     """
-    nfas0_nfas, nfas0_labels = nfas0
-    nfas1_nfas, nfas1_labels = nfas1
+    return compose_nfa_sets((nfas0, nfas1))
+
+# ______________________________________________________________________
+
+def compose_nfa_sets (nfa_sets):
+    """Compose any number of NFA set tuples generated by pgen in one pass.
+
+    The result is equivalent to folding compose_nfas() over the
+    sequence, but each label and each NFA state is only visited once:
+
+    1. Builds the composed label table, using a dictionary to find
+       labels shared with earlier sets, and records a list mapping
+       each set's label indices into the composed table.
+    2. Collects the NFA's for each nonterminal name.  Later sets come
+       first, matching the order compose_nfas() gives its second
+       argument, and each nonterminal's type is its position.
+    3. Copies each NFA's states exactly once, rewriting labels and
+       offsetting state indices.  Nonterminals defined by more than
+       one set get a new start state with empty arcs to each
+       alternative, and a new finish state.
+    4. Returns a new NFA set.
+    """
+    nfa_sets = list(nfa_sets)
     # ____________________________________________________________
     # Part 1.
-    nfas2_labels = nfas0_labels[:]
-    label_map_1_to_2 = {}
-    index = 0
-    for label_tup in nfas1_labels:
-        if label_tup in nfas2_labels:
-            label_map_1_to_2[index] = nfas2_labels.index(label_tup)
-        else:
-            label_map_1_to_2[index] = len(nfas2_labels)
-            nfas2_labels.append(label_tup)
-        index += 1
+    labels = []
+    label_indices = {}
+    label_maps = []
+    for _, set_labels in nfa_sets:
+        label_map = []
+        for label_tup in set_labels:
+            label_index = label_indices.get(label_tup)
+            if label_index is None:
+                label_index = len(labels)
+                label_indices[label_tup] = label_index
+                labels.append(label_tup)
+            label_map.append(label_index)
+        label_maps.append(label_map)
     # ____________________________________________________________
     # Part 2.
-    nfas2_nfas = [rewrite_arcs(label_map_1_to_2, nfa) for nfa in nfas1_nfas]
-    nfas2_nfa_map = {}
-    index = 0
-    for nfa in nfas2_nfas:
-        nfas2_nfa_map[nfa[1]] = index
-        index += 1
+    names = []
+    alternatives = {}
+    for set_index in range(len(nfa_sets) - 1, -1, -1):
+        for nfa in nfa_sets[set_index][0]:
+            nfa_name = nfa[1]
+            if nfa_name not in alternatives:
+                names.append(nfa_name)
+                alternatives[nfa_name] = []
+            alternatives[nfa_name].append((nfa, label_maps[set_index]))
     # ____________________________________________________________
     # Part 3.
-    new_nfa_type = max((nfa_ty for (nfa_ty, _, _, _, _) in nfas2_nfas)) + 1
-    for nfa in nfas0_nfas:
-        nfa_name = nfa[1]
-        if nfa_name in nfas2_nfa_map:
-            nfas2_nfa_index = nfas2_nfa_map[nfa_name]
-            nfas2_nfas[nfas2_nfa_index] = nfa_union(
-                nfas2_nfas[nfas2_nfa_index], nfa)
+    nfas = []
+    nfa_type = token.NT_OFFSET
+    for nfa_name in names:
+        nfa_alternatives = alternatives[nfa_name]
+        if len(nfa_alternatives) == 1:
+            nfa, label_map = nfa_alternatives[0]
+            states = [[(label_map[label], tostate)
+                       for (label, tostate) in arcs]
+                      for arcs in nfa[2]]
+            nfas.append((nfa_type, nfa_name, states, nfa[3], nfa[4]))
         else:
-            nfas2_nfas.append((new_nfa_type, nfa[1], nfa[2], nfa[3], nfa[4]))
-            new_nfa_type += 1
+            states = []
+            start_arcs = []
+            finish_states = []
+            for nfa, label_map in nfa_alternatives:
+                offset = len(states)
+                states.extend([(label_map[label], tostate + offset)
+                               for (label, tostate) in arcs]
+                              for arcs in nfa[2])
+                start_arcs.append((0, nfa[3] + offset))
+                finish_states.append(nfa[4] + offset)
+            states.append(start_arcs)
+            states.append([])
+            end_state_arc = (0, len(states) - 1)
+            for finish_state in finish_states:
+                states[finish_state].append(end_state_arc)
+            nfas.append((nfa_type, nfa_name, states, len(states) - 2,
+                         len(states) - 1))
+        nfa_type += 1
     # ____________________________________________________________
     # Part 4.
-    return (nfas2_nfas, nfas2_labels)
+    return (nfas, labels)
+
+# ______________________________________________________________________
+
+def extend_nfas (nfas0, nfas1):
+    """Extend an NFA set tuple in place of recomposing it.
+
+    Unlike compose_nfas(), every nonterminal in NFAS0 keeps its
+    position (and therefore its type), and every label in NFAS0 keeps
+    its index; new labels and nonterminals from NFAS1 are appended.
+    Returns a triple of the new NFA set tuple, a list of the indices
+    of the nonterminals that were added or changed, and the number of
+    labels in NFAS0.
+    """
+    nfas0_nfas, nfas0_labels = nfas0
+    nfas1_nfas, nfas1_labels = nfas1
+    labels = nfas0_labels[:]
+    label_indices = {}
+    for label_index, label_tup in enumerate(labels):
+        label_indices.setdefault(label_tup, label_index)
+    label_map = {}
+    for label_index, label_tup in enumerate(nfas1_labels):
+        if label_tup not in label_indices:
+            label_indices[label_tup] = len(labels)
+            labels.append(label_tup)
+        label_map[label_index] = label_indices[label_tup]
+    nfas = list(nfas0_nfas)
+    nfa_indices = dict((nfa[1], nfa_index)
+                       for nfa_index, nfa in enumerate(nfas))
+    changed = []
+    for nfa in nfas1_nfas:
+        nfa = rewrite_arcs(label_map, nfa)
+        nfa_index = nfa_indices.get(nfa[1])
+        if nfa_index is None:
+            nfa_index = len(nfas)
+            nfa_indices[nfa[1]] = nfa_index
+            nfas.append((token.NT_OFFSET + nfa_index,) + nfa[1:])
+        else:
+            # nfa_union() appends to the finish state of its first
+            # argument, so pass the freshly rewritten NFA first.
+            base_nfa = nfas[nfa_index]
+            nfas[nfa_index] = (base_nfa[0],) + nfa_union(nfa, base_nfa)[1:]
+        if nfa_index not in changed:
+            changed.append(nfa_index)
+    return (nfas, labels), changed, len(nfas0_labels)
 
 # ______________________________________________________________________
 
@@ -166,16 +260,12 @@ def main (*args):
     if len(args) < 1:
         print("Usage: nfa.py [flags] <pgenfile1> [<pgenfile2> ...]")
         return
-    index = 0
     nfas_tups = []
-    out_nfas = [[],[]]
     pgen = pgen2.pgen.PyPgen()
-    for arg in args:
+    for index, arg in enumerate(args):
         grammar_st = pgen2.parser.parse_file(arg)
-        crnt_nfas = pgen.handleStart(grammar_st)
-        nfas_tups.append((crnt_nfas, "g%d_" % index))
-        out_nfas = compose_nfas(out_nfas, crnt_nfas)
-        index += 1
+        nfas_tups.append((pgen.handleStart(grammar_st), "g%d_" % index))
+    out_nfas = compose_nfa_sets(nfas for nfas, _ in nfas_tups)
     nfas_tups.append((out_nfas, "res"))
     if not quiet:
         out_nfas_str = pprint.pformat(out_nfas)
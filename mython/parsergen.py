@@ -0,0 +1,223 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Generates specialized trampoline parser handlers from a pgen grammar.
+
+Where trampoline.make_dfa_handler() interprets the accelerator tables of
+a DFA for every token, the code generated here has one function per
+nonterminal, with each state's transitions written out as a chain of
+comparisons against literal label indices (and literal sets, where a
+nonterminal's FIRST set is involved).
+
+The generated module defines make_handlers(), which returns a
+dictionary of handlers following the same protocol (and keyed the
+same way) as trampoline.pgen_grammar_to_handlers().  Like those
+handlers, the generated ones read label indices from their token
+stream's get_label() method.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import token
+import types
+
+# ______________________________________________________________________
+# Module data
+
+MODULE_HEADER = '''# ______________________________________________________________________
+"""Parser handlers generated by mython.parsergen.  Do not edit."""
+# ______________________________________________________________________
+'''
+
+HANDLERS_HEADER = '''def make_handlers ():
+    def syntax_error (crnt_token):
+        line_no, column_no = crnt_token[2]
+        return SyntaxError("Line %d, column %d, unexpected '%s'." %
+                           (line_no, column_no, crnt_token[1]))
+'''
+
+MODULE_FOOTER = '''# ______________________________________________________________________
+# End of generated parser handlers.
+'''
+
+# ______________________________________________________________________
+# Function definitions
+
+def _label_test (label_indices):
+    if len(label_indices) == 1:
+        return 'ilabel == %d' % label_indices[0]
+    return 'ilabel in {%s}' % ', '.join(str(label_index)
+                                         for label_index in label_indices)
+
+# ______________________________________________________________________
+
+def _get_state_actions (state):
+    """Group the labels accepted by an accelerated state by action."""
+    arcs, (accel_upper, accel_lower, accel_table), accept = state
+    actions = {}
+    for accel_index, accel_result in enumerate(accel_table):
+        if accel_result != -1:
+            actions.setdefault(accel_result, []).append(
+                accel_lower + accel_index)
+    return sorted(actions.items(), key = lambda action: action[1][0])
+
+# ______________________________________________________________________
+
+def generate_dfa_source (dfa, indent = '    '):
+    """Return the source of a handler function for an accelerated DFA."""
+    dfa_num, dfa_name, dfa_initial, states = dfa
+    fn_name = 'parse_%s' % dfa_name
+    ind1, ind2, ind3, ind4, ind5 = (indent * count for count in range(1, 6))
+    lines = [
+        '%sdef %s (instream, outtree):' % (ind1, fn_name),
+        '%soutpush = outtree.pushpop' % (ind2,),
+        '%sget_label = instream.get_label' % (ind2,),
+        '%sget_token = instream.get_token' % (ind2,),
+        '%souttree.push(%r)' % (ind2, dfa_name),
+        '%sstate = %d' % (ind2, dfa_initial),
+        '%swhile 1:' % (ind2,),
+        '%silabel = get_label()' % (ind3,),
+    ]
+    keyword = 'if'
+    for state_index, state in enumerate(states):
+        lines.append('%s%s state == %d:' % (ind3, keyword, state_index))
+        keyword = 'elif'
+        body_len = len(lines)
+        for accel_result, label_indices in _get_state_actions(state):
+            lines.append('%sif %s:' % (ind4, _label_test(label_indices)))
+            if accel_result & (1 << 7):
+                # PUSH
+                nt = (accel_result >> 8) + token.NT_OFFSET
+                lines.append('%syield %d' % (ind5, nt))
+                lines.append('%sstate = %d' % (ind5,
+                                               accel_result & ((1<<7) - 1)))
+                lines.append('%scontinue' % (ind5,))
+            else:
+                # SHIFT
+                lines.append('%soutpush(get_token())' % (ind5,))
+                next_state = states[accel_result]
+                if next_state[2] and len(next_state[0]) == 1:
+                    lines.append('%sbreak' % (ind5,))
+                else:
+                    lines.append('%sstate = %d' % (ind5, accel_result))
+                    lines.append('%scontinue' % (ind5,))
+        if state[2]:
+            lines.append('%sbreak' % (ind4,))
+        elif len(lines) == body_len:
+            lines.append('%spass' % (ind4,))
+    lines.extend([
+        '%sraise syntax_error(instream.get_lookahead())' % (ind3,),
+        '%souttree.pop()' % (ind2,),
+        "%sif False: yield 'dummy'" % (ind2,),
+        '%shandlers[%d] = handlers[%r] = %s' % (ind1, dfa_num, dfa_name,
+                                                fn_name),
+        '',
+    ])
+    return '\n'.join(lines)
+
+# ______________________________________________________________________
+
+def generate_handler_source (grammar, dfa_indices = None, grammar_key = None):
+    """Return the source of a module of handlers for a pgen grammar tuple.
+
+    If dfa_indices is given, only handlers for those DFA's are generated.
+    The grammar_key (see grammarcache.grammar_cache_key()) is saved in
+    the module as GRAMMAR_KEY, so check_handler_module() can tell when
+    the module is stale.
+    """
+    dfas = grammar[0]
+    if dfa_indices is not None:
+        dfas = [dfas[dfa_index] for dfa_index in dfa_indices]
+    chunks = [MODULE_HEADER, 'GRAMMAR_KEY = %r\n' % (grammar_key,),
+              HANDLERS_HEADER, '    handlers = {}\n']
+    chunks.extend(generate_dfa_source(dfa) for dfa in dfas)
+    chunks.append('    return handlers\n\n')
+    chunks.append(MODULE_FOOTER)
+    return '\n'.join(chunks)
+
+# ______________________________________________________________________
+
+def load_handler_module (source, module_name = None, filename = None):
+    """Compile generated handler source into a new module object."""
+    if module_name is None:
+        module_name = 'mython_generated_handlers'
+    if filename is None:
+        filename = '<%s>' % module_name
+    module = types.ModuleType(module_name)
+    module.__file__ = filename
+    exec(compile(source, filename, 'exec'), module.__dict__)
+    return module
+
+# ______________________________________________________________________
+
+def load_handler_file (filename, module_name = None):
+    """Load a handler module written by main() into a new module object."""
+    with open(filename) as fileobj:
+        source = fileobj.read()
+    return load_handler_module(source, module_name, filename)
+
+# ______________________________________________________________________
+
+def check_handler_module (module, grammar_key):
+    """Raise ValueError if a handler module was not generated from the
+    grammar identified by grammar_key."""
+    module_key = getattr(module, 'GRAMMAR_KEY', None)
+    if module_key != grammar_key:
+        raise ValueError("Handler module %r was generated from a different "
+                         "grammar (key %r, expected %r); regenerate it "
+                         "with 'python -m mython.parsergen -o'." %
+                         (getattr(module, '__file__', module.__name__),
+                          module_key, grammar_key))
+
+# ______________________________________________________________________
+
+def pgen_grammar_to_handlers (grammar, handlers, label_tables = None,
+                              dfa_indices = None, module = None):
+    """Extend a trampoline map with generated handlers for a grammar.
+
+    A drop-in replacement for trampoline.pgen_grammar_to_handlers().
+    Generates and compiles handler code unless a module previously
+    built from the same grammar (by load_handler_module(), or by
+    load_handler_file() from a file written by main()) is given.
+    """
+    if module is None:
+        module = load_handler_module(
+            generate_handler_source(grammar, dfa_indices))
+    if label_tables is not None:
+        label_tables.update(grammar[1])
+    handlers.update(module.make_handlers())
+    return handlers
+
+# ______________________________________________________________________
+# Main routine
+
+def main (*args):
+    """Main routine for the mython.parsergen module.
+
+    Writes the generated handler module for the Mython grammar to
+    standard output, or to the file named by the -o flag.
+    """
+    import getopt
+    from mython import myparser
+    opts, args = getopt.getopt(args, "o:")
+    output_file = None
+    for (opt_flag, opt_arg) in opts:
+        if opt_flag == "-o":
+            output_file = opt_arg
+    parser = myparser.MyParser()
+    source = generate_handler_source(parser.my_grammar,
+                                     grammar_key = parser.grammar_key)
+    if output_file:
+        with open(output_file, "w") as fileobj:
+            fileobj.write(source)
+    else:
+        print(source)
+
+# ______________________________________________________________________
+
+if __name__ == "__main__":
+    import sys
+    main(*(sys.argv[1:]))
+
+# ______________________________________________________________________
+# End of parsergen.py
@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+"""
+Defines a table-driven LL(1) parser engine that uses an explicit stack
+instead of generators.
+
+The engine is a drop-in alternative to trampoline.trampoline_parse().
+Each nonterminal is represented in the handler map by a DFATable, and
+the parser runs a single loop over the grammar's compiled transition
+tables (see grammar.TransitionTables), pushing and popping (DFA, state
+number) pairs on a list.  Any handler that is
+not a DFATable (such as the MyParser parse_mysuite() and parse_myexpr()
+overrides, which switch the lexer state) is run using the trampoline
+protocol, so the same handler maps and token streams work with both
+engines and send the same events to the parse sink.
+"""
+# ______________________________________________________________________
+# Module imports
+
+from mython.grammar import TransitionTables
+from mython.trampoline import TreeBuilder
+
+# ______________________________________________________________________
+# Class definitions
+
+class DFATable (object):
+    """Handler map entry for a nonterminal parsed by table_parse()."""
+    __slots__ = ('number', 'name', 'initial', 'tables')
+
+    def __init__ (self, dfa, tables):
+        self.number, self.name = dfa[:2]
+        self.initial = tables.initials[self.number]
+        self.tables = tables
+
+# ______________________________________________________________________
+# Function definitions
+
+def pgen_grammar_to_handlers (grammar, handlers, label_tables = None,
+                              dfa_indices = None):
+    """Extend a handler map with table entries for a pgen grammar tuple.
+
+    Has the same signature as trampoline.pgen_grammar_to_handlers(), but
+    the resulting handler map must be run using table_parse().
+    """
+    dfas, labels, start, accel = grammar
+    if label_tables is not None:
+        label_tables.update(labels)
+    assert accel
+    if dfa_indices is not None:
+        dfas = [dfas[dfa_index] for dfa_index in dfa_indices]
+    tables = TransitionTables(dfas)
+    for dfa in dfas:
+        table = DFATable(dfa, tables)
+        handlers[table.number] = table
+        handlers[table.name] = table
+    return handlers
+
+# ______________________________________________________________________
+
+def _run_handler (handler, handlers, instream, outtree):
+    """Run a trampoline protocol handler, parsing each nonterminal it
+    yields before resuming it."""
+    for symbol in handler(instream, outtree):
+        _parse_symbol(handlers, symbol, instream, outtree)
+
+# ______________________________________________________________________
+
+def _parse_symbol (handlers, symbol, instream, outtree):
+    table = handlers[symbol]
+    if type(table) is not DFATable:
+        _run_handler(table, handlers, instream, outtree)
+        return
+    get_label = instream.get_label
+    get_lookahead = instream.get_lookahead
+    get_token = instream.get_token
+    push = outtree.push
+    pop = outtree.pop
+    pushpop = outtree.pushpop
+    stack = []
+    # DFA's rebuilt by MyParser.extend() are compiled into tables of
+    # their own, so the table arrays are reloaded when they change.
+    tables = table.tables
+    lowers, uppers, offsets = tables.lowers, tables.uppers, tables.offsets
+    accepts, finals = tables.accepts, tables.finals
+    targets, nonterminals = tables.targets, tables.nonterminals
+    push(table.name)
+    state = table.initial
+    while 1:
+        ilabel = get_label()
+        accel_lower = lowers[state]
+        accept = accepts[state]
+        if (accel_lower <= ilabel) and (ilabel < uppers[state]):
+            index = offsets[state] + ilabel - accel_lower
+            target = targets[index]
+            if target != -1:
+                nt = nonterminals[index]
+                if nt:
+                    # PUSH
+                    sub_table = handlers[nt]
+                    if type(sub_table) is DFATable:
+                        stack.append(table)
+                        stack.append(target)
+                        table = sub_table
+                        if table.tables is not tables:
+                            tables = table.tables
+                            lowers, uppers, offsets = (
+                                tables.lowers, tables.uppers, tables.offsets)
+                            accepts, finals = tables.accepts, tables.finals
+                            targets, nonterminals = (tables.targets,
+                                                     tables.nonterminals)
+                        push(table.name)
+                        state = table.initial
+                    else:
+                        _run_handler(sub_table, handlers, instream, outtree)
+                        state = target
+                    continue
+                # SHIFT
+                pushpop(get_token())
+                state = target
+                if not finals[state]:
+                    continue
+                accept = True
+        if not accept:
+            crnt_token = get_lookahead()
+            line_no, column_no = crnt_token[2]
+            raise SyntaxError("Line %d, column %d, unexpected '%s'." %
+                              (line_no, column_no, crnt_token[1]))
+        # POP
+        pop()
+        if not stack:
+            return
+        state = stack.pop()
+        table = stack.pop()
+        if table.tables is not tables:
+            tables = table.tables
+            lowers, uppers, offsets = (tables.lowers, tables.uppers,
+                                       tables.offsets)
+            accepts, finals = tables.accepts, tables.finals
+            targets, nonterminals = tables.targets, tables.nonterminals
+
+# ______________________________________________________________________
+
+def table_parse (handlers, instream, outtree = None):
+    """Parse a lexical stream using a handler map of DFA tables, sending
+    the parse events to a sink (see trampoline.ParseSink), which is
+    returned."""
+    if outtree is None:
+        outtree = TreeBuilder()
+    _run_handler(handlers['start'], handlers, instream, outtree)
+    return outtree
+
+# ______________________________________________________________________
+# End of tableparse.py
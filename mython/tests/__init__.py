@@ -0,0 +1,25 @@
+# ______________________________________________________________________
+"""Unit tests for Mython.
+
+The tests keep their grammar cache (see mython.grammarcache) in a
+temporary directory, rather than in the user's cache directory.
+"""
+# ______________________________________________________________________
+# Module imports
+
+import atexit
+import os
+import shutil
+import tempfile
+
+# ______________________________________________________________________
+# Module data
+
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix='mython-tests-')
+
+os.environ['MYTHON_CACHE_DIR'] = TEST_CACHE_DIR
+
+atexit.register(shutil.rmtree, TEST_CACHE_DIR, True)
+
+# ______________________________________________________________________
+# End of mython/tests/__init__.py
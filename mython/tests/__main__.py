@@ -9,6 +9,14 @@ from .test_myparser import TestMyParser
 from .test_cst import TestCST
 from .test_lang_python import TestLangPython
 from .test_test04 import TestTest04
+from .test_grammarcache import TestGrammarCache
+from .test_nfa import TestNFA
+from .test_parsergen import TestParserGen
+from .test_tableparse import TestTableParse
+from .test_arraytree import TestArrayTree
+from .test_mylexer import TestMyLexer
+from .test_mybuiltins import TestMyBuiltins
+from .test_incremental import TestIncremental
 
 # ______________________________________________________________________
 
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import token
+import unittest
+
+import mython.arraytree
+import mython.myparser
+
+from .test_cst import TEST_SOURCE
+from .test_myparser import MYPATH
+
+# ______________________________________________________________________
+# Class definitions
+
+class VisitPassStmt(mython.arraytree.ArrayTreeVisitor):
+    def __init__(self):
+        self.saw_pass = False
+        self.token_count = 0
+
+    def visit_pass_stmt(self, cursor):
+        self.saw_pass = True
+        self.generic_visit(cursor)
+
+    def visit_token(self, cursor):
+        self.token_count += 1
+
+# ______________________________________________________________________
+
+class TestArrayTree(unittest.TestCase):
+    def setUp(self):
+        self.parser = mython.myparser.MyParser()
+
+    def test_round_trip(self):
+        for tree in (self.parser.parse_string(TEST_SOURCE),
+                     self.parser.parse_file(MYPATH)):
+            array_tree = mython.arraytree.ArrayTree.from_tuple(tree)
+            self.assertEqual(array_tree.to_tuple(), tree)
+
+    def test_builder(self):
+        for engine in sorted(mython.myparser.ENGINES.keys()):
+            parser = mython.myparser.MyParser(engine=engine)
+            array_tree = parser.parse_file(MYPATH, {'array_tree' : True})
+            self.assertIsInstance(array_tree, mython.arraytree.ArrayTree)
+            self.assertEqual(array_tree.to_tuple(),
+                             self.parser.parse_file(MYPATH))
+
+    def test_cursor(self):
+        array_tree = self.parser.parse_string(TEST_SOURCE,
+                                              {'array_tree' : True})
+        cursor = array_tree.cursor()
+        self.assertEqual(cursor.name, 'start')
+        self.assertFalse(cursor.goto_next_sibling())
+        self.assertTrue(cursor.goto_first_child())
+        self.assertEqual(cursor.name, 'file_input')
+        self.assertTrue(cursor.goto_first_child())
+        self.assertEqual(cursor.name, 'stmt')
+        self.assertEqual(array_tree.to_tuple(cursor.node),
+                         self.parser.parse_string(TEST_SOURCE)[1][0][1][0])
+        self.assertTrue(cursor.goto_next_sibling())
+        self.assertTrue(cursor.is_token())
+        self.assertEqual(cursor.token[0], token.ENDMARKER)
+        self.assertFalse(cursor.goto_next_sibling())
+        self.assertTrue(cursor.goto_parent())
+        self.assertTrue(cursor.goto_parent())
+        self.assertFalse(cursor.goto_parent())
+        self.assertEqual(cursor.node, 0)
+        self.assertEqual([child.name for child in cursor.children()],
+                         ['file_input'])
+
+    def test_visitor(self):
+        array_tree = self.parser.parse_string(TEST_SOURCE,
+                                              {'array_tree' : True})
+        visitor = VisitPassStmt()
+        visitor.visit(array_tree.cursor())
+        self.assertTrue(visitor.saw_pass)
+        self.assertEqual(visitor.token_count, len(array_tree.token_strs))
+
+# ______________________________________________________________________
+# Main routine
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_arraytree.py
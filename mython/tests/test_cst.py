@@ -30,6 +30,18 @@ class VisitPassStmt(mython.cst.ConcreteNodeVisitor):
 
 # ______________________________________________________________________
 
+class RecordNodes(mython.cst.ConcreteNodeVisitor):
+    def __init__(self):
+        super(RecordNodes, self).__init__(
+            collapse_unit_chains=mython.cst.UNIT_CHAIN_SYMBOLS)
+        self.node_names = []
+
+    def generic_visit(self, node):
+        self.node_names.append(node[0])
+        super(RecordNodes, self).generic_visit(node)
+
+# ______________________________________________________________________
+
 class TestCST(unittest.TestCase):
     def test_py_cst_visitor(self):
         transformer = mython.cst.PyConcreteToMyConcreteTransformer()
@@ -39,6 +51,8 @@ class TestCST(unittest.TestCase):
                 parser.st2tuple(
                     parser.suite(TEST_SOURCE))))
         self.assertTrue(visitor.saw_pass)
+        self.assertEqual(visitor.node_visitors[symbol.pass_stmt],
+                         ('pass_stmt', VisitPassStmt.visit_pass_stmt))
 
     def test_my_cst_visitor(self):
         parserobj = mython.myparser.MyParser()
@@ -46,6 +60,22 @@ class TestCST(unittest.TestCase):
         visitor.visit(parserobj.parse_string(TEST_SOURCE))
         self.assertTrue(visitor.saw_pass)
 
+    def test_compact_cst_visitor(self):
+        parserobj = mython.myparser.MyParser()
+        full_tree = parserobj.parse_string(TEST_SOURCE)
+        compact_tree = parserobj.parse_string(TEST_SOURCE,
+                                              {'compact_tree' : True})
+        self.assertNotEqual(full_tree, compact_tree)
+        visitor = VisitPassStmt()
+        visitor.visit(compact_tree)
+        self.assertTrue(visitor.saw_pass)
+        full_visitor = RecordNodes()
+        full_visitor.visit(full_tree)
+        compact_visitor = RecordNodes()
+        compact_visitor.visit(compact_tree)
+        self.assertEqual(full_visitor.node_names, compact_visitor.node_names)
+        self.assertNotIn('test', full_visitor.node_names)
+
 # ______________________________________________________________________
 # Main routine
 
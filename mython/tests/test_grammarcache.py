@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mython.grammarcache
+import mython.myparser
+
+# ______________________________________________________________________
+# Class definition
+
+class TestGrammarCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.old_cache_dir = os.environ.get('MYTHON_CACHE_DIR')
+        os.environ['MYTHON_CACHE_DIR'] = self.cache_dir
+
+    def tearDown(self):
+        if self.old_cache_dir is None:
+            del os.environ['MYTHON_CACHE_DIR']
+        else:
+            os.environ['MYTHON_CACHE_DIR'] = self.old_cache_dir
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_key(self):
+        key0 = mython.grammarcache.grammar_cache_key(b'a: b\n', '',
+                                                     'file_input')
+        key1 = mython.grammarcache.grammar_cache_key(b'a: b\n', 'c: d\n',
+                                                     'file_input')
+        self.assertNotEqual(key0, key1)
+        self.assertEqual(key0, mython.grammarcache.grammar_cache_key(
+            b'a: b\n', '', 'file_input'))
+
+    def test_round_trip(self):
+        grammar = ([(256, 'a', 0, [([(1, 1)], (2, 1, [1]), 0)])],
+                   [(0, 'EMPTY'), (1, None)], 256, 1)
+        self.assertTrue(mython.grammarcache.store_grammar('k', grammar))
+        self.assertEqual(mython.grammarcache.load_grammar('k'), grammar)
+        self.assertIsNone(mython.grammarcache.load_grammar('missing'))
+
+    def test_corrupt_entry(self):
+        with open(mython.grammarcache.get_cache_path('bad'), 'wb') as fobj:
+            fobj.write(mython.grammarcache.CACHE_HEADER + b'\xff\x00')
+        self.assertIsNone(mython.grammarcache.load_grammar('bad'))
+
+    def count_compositions(self):
+        compositions = []
+        def counting_pgen_compose(*args):
+            compositions.append(args)
+            return pgen_compose(*args)
+        pgen_compose = mython.myparser.pgen_compose
+        mython.myparser.pgen_compose = counting_pgen_compose
+        self.addCleanup(setattr, mython.myparser, 'pgen_compose',
+                        pgen_compose)
+        return compositions
+
+    def test_myparser_uses_cache(self):
+        compositions = self.count_compositions()
+        parser0 = mython.myparser.MyParser()
+        self.assertEqual(len(compositions), 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        parser1 = mython.myparser.MyParser()
+        self.assertEqual(len(compositions), 1)
+        self.assertEqual(parser0.my_grammar, parser1.my_grammar)
+        self.assertTrue(parser1.parse_string('x = 1\n'))
+
+    def test_myparser_rewrites_bad_entry(self):
+        compositions = self.count_compositions()
+        parser0 = mython.myparser.MyParser()
+        cache_name, = os.listdir(self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, cache_name)
+        with open(cache_path, 'rb') as fobj:
+            entry = fobj.read()
+        stale_header = mython.grammarcache.CACHE_MAGIC + b'0\n'
+        bad_entries = (
+            stale_header + entry[len(mython.grammarcache.CACHE_HEADER):],
+            entry[:len(entry) // 2],
+            mython.grammarcache.CACHE_HEADER + b'\xff\x00',
+        )
+        for bad_entry in bad_entries:
+            with open(cache_path, 'wb') as fobj:
+                fobj.write(bad_entry)
+            composition_count = len(compositions)
+            parser1 = mython.myparser.MyParser()
+            self.assertEqual(len(compositions), composition_count + 1)
+            self.assertEqual(parser0.my_grammar, parser1.my_grammar)
+            with open(cache_path, 'rb') as fobj:
+                self.assertEqual(fobj.read(), entry)
+        self.assertEqual(os.listdir(self.cache_dir), [cache_name])
+
+# ______________________________________________________________________
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_grammarcache.py
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import os
+import random
+import unittest
+
+import mython.incremental
+import mython.mylexer
+import mython.myparser
+
+from .test_mylexer import TEST_SOURCES
+
+# ______________________________________________________________________
+# Module data
+
+EDIT_TEXTS = ('x', '\n', '(', ')', '"""', "'", '#', '    ', '\\\n', ':',
+              'my foo:\n  bar\n', '!{a}', '![b](c)', 'def f():\n', '')
+
+# ______________________________________________________________________
+# Class definition
+
+class TestIncremental(unittest.TestCase):
+    def assertSameScan(self, lexer):
+        fresh = mython.incremental.IncrementalLexer(lexer.source)
+        self.assertEqual(lexer.tokens, fresh.tokens)
+        self.assertEqual(lexer.offsets, fresh.offsets)
+        self.assertEqual(lexer.states, fresh.states)
+        self.assertEqual(lexer.token_counts, fresh.token_counts)
+        self.assertEqual(type(lexer.error), type(fresh.error))
+        self.assertEqual(getattr(lexer.error, 'args', None),
+                         getattr(fresh.error, 'args', None))
+
+    def test_tokens(self):
+        for source in TEST_SOURCES:
+            lexer = mython.incremental.IncrementalLexer(source)
+            self.assertIsNone(lexer.error)
+            self.assertEqual(len(lexer.offsets), len(lexer.states))
+        # Sources without Mython syntax lex as they do without a driver.
+        source = TEST_SOURCES[2]
+        token_stream = mython.mylexer.MythonTokenStream(None, source=source)
+        self.assertEqual(
+            mython.incremental.IncrementalLexer(source).tokens,
+            list(token_stream.tokenizer))
+
+    def test_random_edits(self):
+        test_dir = os.path.dirname(__file__)
+        sources = list(TEST_SOURCES)
+        for filename in ('test_mylexer.py', 'test04.my'):
+            sources.append(mython.mylexer.load_source(
+                os.path.join(test_dir, filename)))
+        rng = random.Random(15)
+        for source in sources:
+            lexer = mython.incremental.IncrementalLexer(source)
+            for _ in range(20):
+                start = rng.randrange(len(lexer.source) + 1)
+                end = min(len(lexer.source),
+                          start + rng.choice((0, 0, 1, 3, 20)))
+                lexer.edit(start, end, rng.choice(EDIT_TEXTS))
+                self.assertSameScan(lexer)
+
+    def test_edit_cost(self):
+        source = ''.join('def f%d(x):\n    return x + %d\n\n' % (i, i)
+                         for i in range(500))
+        lexer = mython.incremental.IncrementalLexer(source)
+        start = lexer.source.index('f250')
+        self.assertLess(lexer.edit(start, start + 4, 'g250'), 4)
+        self.assertSameScan(lexer)
+        start = lexer.source.index('    return x + 100')
+        self.assertLess(lexer.edit(start, start, 's = """\n"""\n'), 4)
+        self.assertSameScan(lexer)
+        # An unterminated string runs to the end of the source.
+        start = lexer.source.index('def f400')
+        lexer.edit(start, start, 's = """\n')
+        self.assertIsInstance(lexer.error, mython.mylexer.tokenize.TokenError)
+        self.assertSameScan(lexer)
+
+    def test_error_lines(self):
+        # Lines added before an error move the error down with them.
+        source = ''.join('x%d = %d\n' % (i, i) for i in range(10))
+        lexer = mython.incremental.IncrementalLexer(source + 'y = (1,\n')
+        self.assertEqual(lexer.error.args[1], (12, 0))
+        lexer.edit(0, 0, '\n')
+        self.assertEqual(lexer.error.args[1], (13, 0))
+        self.assertSameScan(lexer)
+        start = lexer.source.index('x5')
+        lexer.edit(start, start, 'z = (\n')
+        self.assertSameScan(lexer)
+        lexer.edit(start, start + 6, '')
+        self.assertSameScan(lexer)
+
+    def test_parser_edits(self):
+        parser = mython.myparser.MyParser()
+        source = ''.join('def f%d(x):\n    return x + %d\n\n' % (i, i)
+                         for i in range(50))
+        source += 'my[lang] q:\n    text\ny = !{z}\n'
+        incremental_parser = mython.incremental.IncrementalParser(parser,
+                                                                  source)
+        self.assertEqual(incremental_parser.reparsed, 52)
+        edits = (
+            # Edits within a statement.
+            ('return x + 20', 'return x * 20', 2),
+            # Adding lines, and joining a line to the statement before.
+            ('def f30', 'z = 1\n\ndef f30', 3),
+            ('\ndef f40', '    pass\ndef f40', 3),
+            ('def f10(x):\n    return x + 10\n\n', '', 1),
+            # Edits in and around Mython quotations.
+            ('    text\n', '    text\n    more\n', 2),
+            ('y = !{z}', 'y = !{z}\nw = 1', 3),
+        )
+        for old_text, new_text, reparsed in edits:
+            start = incremental_parser.source.index(old_text)
+            self.assertEqual(incremental_parser.edit(
+                start, start + len(old_text), new_text), reparsed)
+            self.assertEqual(incremental_parser.tree,
+                             parser.parse_string(incremental_parser.source))
+        start = incremental_parser.source.index('def f20')
+        with self.assertRaises(SyntaxError):
+            incremental_parser.edit(start, start + 3, 'deff')
+        self.assertIsNone(incremental_parser.tree)
+        incremental_parser.edit(start, start + 4, 'def')
+        self.assertEqual(incremental_parser.tree,
+                         parser.parse_string(incremental_parser.source))
+
+# ______________________________________________________________________
+# Main routine
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_incremental.py
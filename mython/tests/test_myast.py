@@ -2,10 +2,12 @@
 # ______________________________________________________________________
 # Module imports
 
-import unittest, ast
+import unittest, ast, os, sys, token
 
+import mython.cst
 import mython.myast
 import mython.myparser
+import mython.trampoline
 
 # ______________________________________________________________________
 # Module definitions
@@ -27,6 +29,41 @@ bar.explode(42)
 
 TEST_MYSTMT_SRCS.extend(mython.myparser.TEST_STRINGS)
 
+# ______________________________________________________________________
+# Function definitions
+
+def dump_iterative(node):
+    """Return a flat list describing an abstract syntax tree, without
+    recursing (ast.dump() can not handle very deep trees)."""
+    ret_val = []
+    stack = [node]
+    while stack:
+        crnt = stack.pop()
+        if isinstance(crnt, ast.AST):
+            ret_val.append(type(crnt).__name__)
+            fields = [getattr(crnt, field, None) for field in
+                      crnt._fields + crnt._attributes]
+            stack.extend(reversed(fields))
+        elif isinstance(crnt, list):
+            ret_val.append(len(crnt))
+            stack.extend(reversed(crnt))
+        else:
+            ret_val.append(crnt)
+    return ret_val
+
+# ______________________________________________________________________
+# Class definitions
+
+class IterativeTransformer(mython.myast.MyConcreteTransformer):
+    # Handles every nonterminal from the deep node walk.
+    max_depth = 1
+
+class ShallowTransformer(mython.myast.MyConcreteTransformer):
+    max_depth = 3
+
+class RecursiveTransformer(mython.myast.MyConcreteTransformer):
+    max_depth = sys.maxsize
+
 # ______________________________________________________________________
 # Class definition
 
@@ -57,6 +94,173 @@ class TestMyAST(unittest.TestCase):
             self.assertTrue(isinstance(astobj.body[0], mython.myast.MyStmt))
             # TODO: add more checks on result
 
+    def test_compact_tree(self):
+        myparserobj = mython.myparser.MyParser()
+        test_srcs = list(TEST_MYSTMT_SRCS)
+        test_srcs.extend(test_src[0] for test_src in TEST_MYEXPR_SRCS)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test04.my')) as test_file:
+            test_srcs.append(test_file.read())
+        for test_str in test_srcs:
+            full_cst = myparserobj.parse_string(test_str)
+            full_ast = mython.myast.MyConcreteTransformer().handle_node(
+                full_cst)
+            for env in ({'compact_tree' : True}, {'compact_tokens' : True},
+                        {'compact_tree' : True, 'compact_tokens' : True}):
+                compact_cst = myparserobj.parse_string(test_str, env)
+                compact_ast = mython.myast.MyConcreteTransformer().handle_node(
+                    compact_cst)
+                self.assertEqual(ast.dump(full_ast), ast.dump(compact_ast))
+
+    def test_node_handlers(self):
+        class CountPasses(mython.myast.MyConcreteTransformer):
+            passes = 0
+
+            def handle_pass_stmt(self, node):
+                self.passes += 1
+                return super(CountPasses, self).handle_pass_stmt(node)
+
+        transformer_cls = mython.myast.MyConcreteTransformer
+        handlers = transformer_cls.get_node_handlers()
+        self.assertIs(handlers, transformer_cls.get_node_handlers())
+        self.assertIs(handlers['not_test'], transformer_cls.handle_not_test)
+        self.assertIs(handlers['mysuite'], transformer_cls.handle_mysuite)
+        self.assertIs(CountPasses.get_node_handlers()['pass_stmt'],
+                      CountPasses.handle_pass_stmt)
+        self.assertIsNot(handlers['pass_stmt'], CountPasses.handle_pass_stmt)
+        myparserobj = mython.myparser.MyParser()
+        cstobj = myparserobj.parse_string(
+            TEST_MYSTMT_SRCS[0] + 'if x:\n    pass\nelse:\n    pass\n')
+        transformer = CountPasses()
+        self.assertEqual(ast.dump(transformer.handle_node(cstobj)),
+                         ast.dump(transformer_cls().handle_node(cstobj)))
+        self.assertEqual(transformer.passes, 2)
+        for method_name in ('node', 'children', 'default', 'deep_node'):
+            self.assertNotIn(method_name, handlers)
+        with self.assertRaises(NotImplementedError):
+            transformer.handle_node(('no_such_symbol', []))
+        self.assertIs(transformer.node_handlers['no_such_symbol'],
+                      CountPasses.handle_default)
+        self.assertNotIn('no_such_symbol', CountPasses.get_node_handlers())
+        # Trees labelled with nonterminal numbers dispatch through the
+        # handler vector.
+        symbol_names = dict((dfa[0], dfa[1])
+                            for dfa in myparserobj.my_grammar[0])
+        symbol_numbers = dict((name, number)
+                              for number, name in symbol_names.items())
+        def number_tree(node):
+            if isinstance(node[0], mython.trampoline.TOKEN_TYPES):
+                return node
+            return (symbol_numbers.get(node[0], node[0]),
+                    [number_tree(child) for child in node[1]])
+        cstobj = myparserobj.parse_string(
+            'x = a + 1\nif x:\n    pass\nelse:\n    pass\n')
+        transformer = CountPasses(symbol_names)
+        self.assertIs(
+            transformer.handler_vector[symbol_numbers['pass_stmt'] -
+                                       token.NT_OFFSET],
+            CountPasses.handle_pass_stmt)
+        self.assertEqual(
+            ast.dump(transformer.handle_node(number_tree(cstobj))),
+            ast.dump(transformer_cls().handle_node(cstobj)))
+        self.assertEqual(transformer.passes, 2)
+
+    def test_ast_builder(self):
+        myparserobj = mython.myparser.MyParser()
+        test_dir = os.path.dirname(__file__)
+        test_srcs = list(TEST_MYSTMT_SRCS)
+        test_srcs.extend(test_src[0] for test_src in TEST_MYEXPR_SRCS)
+        for filename in sorted(os.listdir(test_dir)):
+            if filename.endswith(('.my', '.py')):
+                with open(os.path.join(test_dir, filename)) as test_file:
+                    test_srcs.append(test_file.read())
+        built_count = 0
+        for test_str in test_srcs:
+            for collapsible in ((), mython.cst.UNIT_CHAIN_SYMBOLS):
+                env = {'compact_tree' : bool(collapsible)}
+                try:
+                    expected = ast.dump(
+                        mython.myast.MyConcreteTransformer().handle_node(
+                            myparserobj.parse_string(test_str, env)),
+                        include_attributes=True)
+                except Exception as exc:
+                    # Report the same error as the transformer, for
+                    # constructs it does not support yet.
+                    with self.assertRaises(type(exc)):
+                        myparserobj.parse_string(test_str, dict(
+                            env, sink=mython.myast.ASTBuilder(collapsible)))
+                    continue
+                built_ast = myparserobj.parse_string(test_str, dict(
+                    env, sink=mython.myast.ASTBuilder(collapsible)))
+                self.assertEqual(ast.dump(built_ast, include_attributes=True),
+                                 expected)
+                built_count += 1
+        self.assertGreater(built_count, len(TEST_MYSTMT_SRCS))
+
+    def test_deep_nesting(self):
+        myparserobj = mython.myparser.MyParser()
+        def make_srcs(depth):
+            return [
+                'x = ' + '[' * depth + ']' * depth + '\n',
+                'x = ' + 'f(' * depth + ')' * depth + '\n',
+                'x = ' + '{1: ' * depth + '-1' + '}' * depth + '\n',
+                'def f():\n    return ' + '(' * depth + 'a.b[c]' +
+                ')' * depth + '\n',
+                '[' * depth + 'a' + ']' * depth + ' = x\n',
+                'a[' + '[' * depth + 'b' + ']' * depth + '] = 1\n',
+            ]
+        for test_str in make_srcs(500):
+            for env in ({}, {'compact_tree' : True}):
+                cstobj = myparserobj.parse_string(test_str, env)
+                self.assertEqual(
+                    dump_iterative(
+                        mython.myast.MyConcreteTransformer().handle_node(
+                            cstobj)),
+                    dump_iterative(
+                        IterativeTransformer().handle_node(cstobj)))
+        # Errors deep in the tree are raised, not hidden by the walk.
+        cstobj = myparserobj.parse_string(
+            'x = ' + '(' * 500 + 'f(x+1=2)' + ')' * 500 + '\n')
+        for transformer_cls in (mython.myast.MyConcreteTransformer,
+                                IterativeTransformer):
+            with self.assertRaises(SyntaxError):
+                transformer_cls().handle_node(cstobj)
+        # Compare with the recursive walk, where Python's stack allows.
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 5000))
+        try:
+            for test_str in make_srcs(60):
+                cstobj = myparserobj.parse_string(test_str,
+                                                  {'compact_tree' : True})
+                self.assertEqual(
+                    ast.dump(mython.myast.MyConcreteTransformer().handle_node(
+                        cstobj), include_attributes=True),
+                    ast.dump(RecursiveTransformer().handle_node(cstobj),
+                             include_attributes=True))
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+    def test_depth_limits(self):
+        myparserobj = mython.myparser.MyParser()
+        test_dir = os.path.dirname(__file__)
+        test_srcs = list(TEST_MYSTMT_SRCS)
+        test_srcs.extend(test_src[0] for test_src in TEST_MYEXPR_SRCS)
+        test_srcs.append('[a, [b, c[d]], e.f] = g = [[h]]\n'
+                         'for (i, [j]) in k: l[m], [n] = o\n')
+        for filename in ('test04.my', 'test_parser_0_0_2.my'):
+            with open(os.path.join(test_dir, filename)) as test_file:
+                test_srcs.append(test_file.read())
+        for test_str in test_srcs:
+            cstobj = myparserobj.parse_string(test_str)
+            expected = ast.dump(
+                mython.myast.MyConcreteTransformer().handle_node(cstobj),
+                include_attributes=True)
+            for transformer_cls in (IterativeTransformer,
+                                    ShallowTransformer):
+                self.assertEqual(
+                    ast.dump(transformer_cls().handle_node(cstobj),
+                             include_attributes=True), expected)
+
 # ______________________________________________________________________
 # Main routine
 
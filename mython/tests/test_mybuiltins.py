@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import ast
+import os
+import tempfile
+import unittest
+
+import mython.myast
+import mython.mybuiltins
+import mython.mylexer
+
+# ______________________________________________________________________
+# Module data
+
+PYTHON_SOURCE = """
+def f(x, y):
+    return x != y, '{0!r}'.format(x)
+
+my_value = f(1, 2)
+"""
+
+MYTHON_SOURCE = """
+my_value = 42
+
+my mycode:
+    pass
+"""
+
+# ______________________________________________________________________
+# Class definition
+
+class TestMyBuiltins(unittest.TestCase):
+    def compile_source(self, source, env):
+        fd, filename = tempfile.mkstemp(suffix='.my')
+        try:
+            with os.fdopen(fd, 'w') as fileobj:
+                fileobj.write(source)
+            return mython.mybuiltins.mycompile_file(filename, env)
+        finally:
+            os.unlink(filename)
+
+    def test_has_mython_syntax(self):
+        self.assertFalse(mython.mylexer.has_mython_syntax("x = a != b\n"))
+        self.assertFalse(mython.mylexer.has_mython_syntax(
+            "my_value = 1\nmyself.my = 2\n"))
+        self.assertTrue(mython.mylexer.has_mython_syntax(MYTHON_SOURCE))
+        self.assertTrue(mython.mylexer.has_mython_syntax("x = !{a}\n"))
+        self.assertTrue(mython.mylexer.has_mython_syntax(
+            "if x:\n    my[lang] foo: bar\n"))
+        self.assertTrue(mython.mylexer.has_mython_syntax(PYTHON_SOURCE))
+
+    def test_bypass_frontend(self):
+        env = mython.mybuiltins.initial_environment()
+        source = PYTHON_SOURCE.replace('!r', '')
+        co, env1 = self.compile_source(source, env)
+        self.assertEqual(env['compile_stats'], {'bypassed' : 1, 'full' : 0})
+        self.assertIs(env1['compile_stats'], env['compile_stats'])
+        full_env = mython.mybuiltins.initial_environment()
+        full_env['bypass_frontend'] = False
+        full_co, _ = self.compile_source(source, full_env)
+        self.assertEqual(full_env['compile_stats'],
+                         {'bypassed' : 0, 'full' : 1})
+        self.assertEqual(co.co_code, full_co.co_code)
+        self.assertEqual(co.co_names, full_co.co_names)
+        _, env = self.compile_source(MYTHON_SOURCE, env)
+        self.assertEqual(env['compile_stats'], {'bypassed' : 1, 'full' : 1})
+
+    def test_hybrid_parse(self):
+        test_path = os.path.join(os.path.dirname(__file__), 'test04.my')
+        sources = [mython.mylexer.load_source(test_path), MYTHON_SOURCE]
+        for source in sources:
+            env = mython.mybuiltins.initial_environment()
+            hybrid_ast, _ = mython.mybuiltins.myparse(source, env)
+            env['hybrid_parse'] = False
+            full_ast, _ = mython.mybuiltins.myparse(source, env)
+            self.assertEqual(
+                [(type(node), getattr(node, 'lineno', None))
+                 for node in hybrid_ast.body],
+                [(type(node), getattr(node, 'lineno', None))
+                 for node in full_ast.body])
+        # Splitting the string after the quotation makes the statements
+        # fail to parse on their own, so the whole module is parsed.
+        source = 'if x:\n    my y: z\n    s = """\nw\n"""\nw = 1\n'
+        env = mython.mybuiltins.initial_environment()
+        module, _ = mython.mybuiltins.myparse(source, env)
+        self.assertEqual([node.lineno for node in module.body], [1, 6])
+        with self.assertRaises(SyntaxError):
+            mython.mybuiltins.myparse('x = = 1\ny = !{z}\n', env)
+        # Python's parser gives up on deep nesting, which MyParser handles.
+        source = 'x = %s%s\nmy y: z\n' % ('[' * 300, ']' * 300)
+        module, _ = mython.mybuiltins.myparse(source, env)
+        self.assertEqual([type(node) for node in module.body],
+                         [ast.Assign, mython.myast.MyStmt])
+
+# ______________________________________________________________________
+# Main routine
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_mybuiltins.py
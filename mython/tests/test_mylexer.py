@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import io
+import os
+import tempfile
+import unittest
+
+import mython.mylexer
+import mython.myparser
+import mython.trampoline
+
+from .test_myparser import MYPATH
+
+# ______________________________________________________________________
+# Module data
+
+TEST_SOURCES = (
+    "x = !(a +\n  b +\n  c\n  + d)\ny = 1\n",
+    "my[foo] bar: baz boz\nz = 1\n",
+    "if x:\n\tif y:\n\t\tpass\n\tz = 'ab\\\ncd'\n",
+    "s = '''abc\\\n'''\nt = \"\"\"x\ny\"\"\" + 'q'\n",
+    "a = (1,\n  2) \\\n  + 3\r\nb = ...\r\n# c\n  # d\n\n",
+    "def f():\n    return ![x]{\n  {a}\n}\n",
+)
+
+# ______________________________________________________________________
+# Class definition
+
+class TestMyLexer(unittest.TestCase):
+    def scan_lines(self, source):
+        token_stream = mython.mylexer.MythonTokenStream(
+            mython.mylexer.MythonReadliner(io.StringIO(source).readline))
+        return list(token_stream.tokenizer)
+
+    def scan_buffer(self, source):
+        token_stream = mython.mylexer.MythonTokenStream(None, source=source)
+        return list(token_stream.tokenizer)
+
+    def test_buffer_tokens(self):
+        test_dir = os.path.dirname(__file__)
+        sources = list(TEST_SOURCES)
+        for filename in sorted(os.listdir(test_dir)):
+            if filename.endswith('.py'):
+                with open(os.path.join(test_dir, filename)) as test_file:
+                    sources.append(test_file.read())
+        for source in sources:
+            self.assertEqual(self.scan_buffer(source),
+                             self.scan_lines(source))
+
+    def test_buffer_parse(self):
+        parser = mython.myparser.MyParser()
+        sources = list(TEST_SOURCES)
+        with open(MYPATH) as test_file:
+            sources.append(test_file.read())
+        sources.extend(mython.myparser.TEST_STRINGS)
+        for source in sources:
+            self.assertEqual(parser.parse_buffer(source),
+                             parser.parse_string(source,
+                                                 {'scanner' : 'lines'}))
+
+    def test_load_source(self):
+        test_sources = (
+            (b'', ''),
+            (b'# -*- coding: latin-1 -*-\r\nx = "\xe9"\r\n',
+             '# -*- coding: latin-1 -*-\nx = "\xe9"\n'),
+            (b'\xef\xbb\xbfx = 1\ry = 2\n', 'x = 1\ny = 2\n'),
+        )
+        for data, text in test_sources:
+            fd, filename = tempfile.mkstemp(suffix='.py')
+            try:
+                with os.fdopen(fd, 'wb') as fileobj:
+                    fileobj.write(data)
+                self.assertEqual(mython.mylexer.load_source(filename), text)
+            finally:
+                os.unlink(filename)
+
+    def test_parse_file(self):
+        parser = mython.myparser.MyParser()
+        self.assertEqual(parser.parse_file(MYPATH),
+                         parser.parse_file(MYPATH, {'scanner' : 'lines'}))
+
+    def test_compact_tokens(self):
+        sources = list(TEST_SOURCES)
+        with open(MYPATH) as test_file:
+            sources.append(test_file.read())
+        for source in sources:
+            for lnum, column_offset in ((0, 0), (4, 2)):
+                token_stream = mython.mylexer.MythonTokenStream(
+                    None, source=source, lnum=lnum,
+                    column_offset=column_offset, compact_tokens=True)
+                tokens = list(token_stream.tokenizer)
+                self.assertTrue(all(isinstance(tok, mython.mylexer.Token)
+                                    for tok in tokens))
+                token_stream = mython.mylexer.MythonTokenStream(
+                    None, source=source, lnum=lnum,
+                    column_offset=column_offset)
+                self.assertEqual([tok.as_tuple() for tok in tokens],
+                                 list(token_stream.tokenizer))
+        with self.assertRaises(ValueError):
+            mython.mylexer.MythonTokenStream(
+                mython.mylexer.MythonReadliner(io.StringIO('').readline),
+                compact_tokens=True)
+
+    def test_compact_token_parse(self):
+        parser = mython.myparser.MyParser()
+        with open(MYPATH) as test_file:
+            sources = list(TEST_SOURCES) + [test_file.read()]
+        for source in sources:
+            for env in ({}, {'compact_tree' : True}):
+                compact_env = dict(env, compact_tokens=True)
+                self.assertEqual(parser.parse_buffer(source, compact_env),
+                                 parser.parse_buffer(source, env))
+        for source in ("def f(:\n  pass\n", "x = 1\n  y = 2\n"):
+            errors = []
+            for env in ({}, {'compact_tokens' : True}):
+                with self.assertRaises(SyntaxError) as context:
+                    parser.parse_buffer(source, env)
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1])
+
+    def test_chunked_tokens(self):
+        parser = mython.myparser.MyParser()
+        with open(MYPATH) as test_file:
+            sources = list(TEST_SOURCES) + [test_file.read()]
+        sources.extend(mython.myparser.TEST_STRINGS)
+        for source in sources:
+            for scanner in ('lines', 'buffer'):
+                tree = parser.parse_string(source, {'scanner' : scanner,
+                                                    'chunk_size' : 0})
+                for chunk_size in (1, 3, mython.mylexer.CHUNK_SIZE):
+                    self.assertEqual(
+                        parser.parse_string(source,
+                                            {'scanner' : scanner,
+                                             'chunk_size' : chunk_size}),
+                        tree)
+        # Lexical errors after a syntax error are not raised early.
+        with self.assertRaises(SyntaxError):
+            parser.parse_string("x = = 1\ns = '''abc\n")
+        with self.assertRaises(mython.mylexer.tokenize.TokenError):
+            parser.parse_string("x = 1\ns = '''abc\n")
+
+    def test_label_tables(self):
+        labels = mython.myparser.MyParser().my_grammar[1]
+        classify = mython.trampoline.make_classifier(labels)
+        label_tables = mython.trampoline.LabelTables(labels)
+        with open(__file__) as test_file:
+            sources = list(TEST_SOURCES[2:5]) + [test_file.read()]
+        for source in sources:
+            for chunk_size in (0, 3, mython.mylexer.CHUNK_SIZE):
+                token_stream = mython.mylexer.MythonTokenStream(
+                    None, source=source, chunk_size=chunk_size,
+                    label_tables=label_tables)
+                while True:
+                    ilabel = token_stream.get_label()
+                    crnt_token = token_stream.get_token()
+                    self.assertEqual(ilabel, classify(crnt_token))
+                    if crnt_token[0] == mython.mylexer.tokenize.ENDMARKER:
+                        break
+
+    def test_split_mython_statements(self):
+        source = ("import os\n\n@dec\ndef f():\n    return !{ ' }\n"
+                  "x = {'!' : 1,\n'a' : 2}\n\nif x:\n    my y:\n"
+                  "        don't\nelse:\n    pass\n"
+                  "s = '''\nmy text\n'''  # !\nt = 1 != 2\n")
+        segments = mython.mylexer.split_mython_statements(source)
+        self.assertEqual([(source[start:end], lineno, has_mython)
+                          for start, end, lineno, has_mython in segments],
+                         [("import os\n\n", 1, False),
+                          ("@dec\ndef f():\n    return !{ ' }\n", 3, True),
+                          ("x = {'!' : 1,\n'a' : 2}\n\n", 6, False),
+                          ("if x:\n    my y:\n        don't\nelse:\n"
+                           "    pass\n", 9, True),
+                          ("s = '''\nmy text\n'''  # !\nt = 1 != 2\n", 14,
+                           False)])
+        self.assertIsNone(
+            mython.mylexer.split_mython_statements("x = '''abc\n"))
+
+    def test_buffer_errors(self):
+        with self.assertRaises(mython.mylexer.tokenize.TokenError):
+            self.scan_buffer("s = '''abc\n")
+        with self.assertRaises(mython.mylexer.tokenize.TokenError):
+            self.scan_buffer("x = (1,\n")
+
+# ______________________________________________________________________
+# Main routine
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_mylexer.py
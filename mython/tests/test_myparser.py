@@ -2,13 +2,38 @@
 # ______________________________________________________________________
 # Module imports
 
+import concurrent.futures
+import contextlib
+import io
+import json
+import tokenize
 import unittest
 import os
+import pgen2.parser
+import pgen2.pgen
+
 import mython.myparser
+import mython.trampoline
 
 # ______________________________________________________________________
 # Module data
 
+PLAIN_GRAMMAR = '''file_input: stmt* ENDMARKER
+stmt: 'let' NAME NUMBER NEWLINE
+'''
+
+TEST_EXTENSION = '''
+small_stmt: unless_stmt
+unless_stmt: 'unless' test
+atom: 'quote' '(' test ')'
+'''
+
+TEST_EXTENSION_SRC = '''unless quote(1) + y
+x = quote(3)
+my foo:
+    bar
+'''
+
 MYPATH = os.path.join(os.path.split(mython.myparser.__file__)[0],
                       'tests', 'test_parser_0_0_2.my')
 
@@ -22,6 +47,175 @@ class TestMyParser(unittest.TestCase):
     def test_myparser_file(self):
         self.assertTrue(mython.myparser.main(MYPATH))
 
+    def test_parser_cache(self):
+        cache = mython.myparser.MyParserCache()
+        parser0 = cache.get_parser()
+        parser1 = cache.get_parser('file_input')
+        self.assertIs(parser0, parser1)
+        parser2 = cache.get_parser('eval_input')
+        self.assertIsNot(parser0, parser2)
+        self.assertEqual(parser2.start_symbol, 'eval_input')
+        self.assertEqual(cache.stats(),
+                         {'hits' : 1, 'misses' : 2, 'parsers' : 2})
+        cache.clear()
+        self.assertIsNot(cache.get_parser(), parser0)
+
+    def test_extend(self):
+        parser = mython.myparser.MyParser()
+        rebuilt = parser.extend(TEST_EXTENSION)
+        self.assertIn('unless_stmt', rebuilt)
+        self.assertNotIn('mysuite', rebuilt)
+        full_parser = mython.myparser.MyParser(
+            grammar_ext = mython.myparser.MY_GRAMMAR_EXT + TEST_EXTENSION)
+        self.assertEqual(parser.parse_string(TEST_EXTENSION_SRC),
+                         full_parser.parse_string(TEST_EXTENSION_SRC))
+        self.assertRaises(SyntaxError, mython.myparser.MyParser().parse_string,
+                          TEST_EXTENSION_SRC)
+
+    def test_parse_sinks(self):
+        parser = mython.myparser.MyParser()
+        with open(MYPATH) as test_file:
+            source = test_file.read()
+        tree = parser.parse_string(source)
+        counts = {}
+        tokens = []
+        def count_nodes(node):
+            if isinstance(node[0], tuple):
+                tokens.append(node[0])
+            else:
+                counts[node[0]] = counts.get(node[0], 0) + 1
+                for child in node[1]:
+                    count_nodes(child)
+        for child in tree[1]:
+            count_nodes(child)
+        for engine in ('trampoline', 'generated', 'table'):
+            engine_parser = mython.myparser.MyParser(engine=engine)
+            sink = mython.trampoline.CountingSink()
+            self.assertIsNone(engine_parser.parse_string(source,
+                                                         {'sink' : sink}))
+            self.assertEqual(sink.counts, counts)
+            self.assertEqual(sink.tokens, len(tokens))
+            self.assertEqual(sink.nodes(), sum(counts.values()))
+            self.assertEqual(sink.depth, 0)
+            sink = mython.trampoline.ValidatingSink()
+            engine_parser.parse_string(source, {'sink' : sink})
+            self.assertEqual(sink.stack, [])
+            with self.assertRaises(SyntaxError):
+                engine_parser.parse_string('def f(:\n  pass\n',
+                                           {'sink' : sink})
+            self.assertEqual(sink.stack[:3],
+                             ['file_input', 'stmt', 'compound_stmt'])
+        sink = mython.trampoline.ValidatingSink()
+        with self.assertRaises(ValueError):
+            sink.pop()
+        with self.assertRaises(ValueError):
+            sink.pushpop(tokens[0])
+
+    def test_parser_stats(self):
+        stats = mython.trampoline.ParserStats()
+        parser = mython.myparser.MyParser(stats=stats)
+        with open(MYPATH) as test_file:
+            source = test_file.read()
+        tree = parser.parse_string(source)
+        self.assertEqual(tree, mython.myparser.MyParser().parse_string(source))
+        sink = mython.trampoline.CountingSink()
+        parser.parse_string(source, {'sink' : sink})
+        self.assertEqual(stats.parses, 2)
+        self.assertEqual(stats.depth, 0)
+        # The mysuite and myexpr overrides are not instrumented.
+        self.assertEqual(
+            stats.entries,
+            dict((name, count * 2) for name, count in sink.counts.items()
+                 if name not in ('mysuite', 'myexpr')))
+        self.assertEqual(sum(stats.push_depths.values()),
+                         sum(stats.entries.values()))
+        self.assertEqual(max(stats.push_depths), sink.max_depth)
+        report = json.loads(stats.to_json())
+        self.assertEqual(report['parses'], 2)
+        self.assertEqual(report['nonterminals']['file_input']['entries'], 2)
+        for counters in report['nonterminals'].values():
+            self.assertLessEqual(counters['self_time'],
+                                 counters['time'] + 1e-6)
+        with self.assertRaises(SyntaxError):
+            parser.parse_string('def f(:\n  pass\n')
+        parser.parse_string('x = 1\n')
+        self.assertEqual(stats.depth, 0)
+        self.assertRaises(ValueError, mython.myparser.MyParser,
+                          engine='table', stats=stats)
+
+    def test_plain_token_stream(self):
+        pgen = pgen2.pgen.PyPgen()
+        grammar = mython.myparser.pgen_compose(
+            pgen, pgen2.parser.parse_string(PLAIN_GRAMMAR),
+            pgen2.parser.parse_string(''), 'file_input')
+        source = 'let x 1\nlet y 2\n'
+        # The handlers made by dfa_to_handler(), as older callers use it.
+        classify = mython.trampoline.make_classifier(grammar[1])
+        dfa_handlers = {}
+        for dfa in grammar[0]:
+            handler = mython.trampoline.dfa_to_handler(classify, dfa,
+                                                       grammar[1])
+            dfa_handlers[dfa[0]] = dfa_handlers[dfa[1]] = handler
+        for handlers in (
+                mython.trampoline.pgen_grammar_to_handlers(grammar, {}),
+                mython.trampoline.pgen_grammar_to_handlers(grammar, {}, {}),
+                dfa_handlers):
+            handlers['start'] = lambda instream, outtree: iter(['file_input'])
+            tree = mython.trampoline.trampoline_parse(
+                handlers, mython.trampoline.TokenStream(
+                    tokenize.generate_tokens(io.StringIO(source).readline)))
+            self.assertEqual([child[0] for child in tree.tree[1][0][1]],
+                             ['stmt', 'stmt',
+                              (tokenize.ENDMARKER, '', (3, 0), (3, 0), '')])
+
+    def test_debug_trace(self):
+        mython.trampoline.__DEBUG__ = True
+        try:
+            parser = mython.myparser.MyParser()
+        finally:
+            mython.trampoline.__DEBUG__ = False
+        trace = io.StringIO()
+        with contextlib.redirect_stdout(trace):
+            tree = parser.parse_string('x = 1\n')
+            with self.assertRaises(SyntaxError):
+                parser.parse_string('x = (1 +)\n')
+        self.assertEqual(tree,
+                         mython.myparser.MyParser().parse_string('x = 1\n'))
+        trace_lines = trace.getvalue().splitlines()
+        self.assertEqual(trace_lines[0], 'Parse:file_input')
+        self.assertIn('POP file_input', trace_lines)
+        self.assertIn("SHIFT (2, '1', (1, 4), (1, 5), 'x = 1\\n')",
+                      trace_lines)
+        # The failed parse ends by listing the labels it expected.
+        self.assertIn(' => ', trace_lines[-1])
+
+    def test_parse_parallel(self):
+        parser = mython.myparser.MyParser()
+        with open(MYPATH) as test_file:
+            sources = [test_file.read()]
+        sources.append(''.join(
+            '# %d\ndef f%d(x):\n    if x:\n        return !{x}\n\n'
+            'my[quote] q%d:\n    text\ny = [%d,\n  1]\n' % (i, i, i, i)
+            for i in range(40)))
+        env = {'parallel' : 2, 'parallel_threshold' : 0}
+        for source in sources:
+            self.assertEqual(parser.parse_string(source, env),
+                             parser.parse_string(source))
+        errors = []
+        for source_env in ({}, env):
+            with self.assertRaises(SyntaxError) as context:
+                parser.parse_string(sources[1] + 'x = = 1\n', source_env)
+            errors.append(str(context.exception))
+        self.assertEqual(errors[0], errors[1])
+        pool = mython.myparser.get_process_pool(2)
+        self.assertIs(pool, mython.myparser.get_process_pool(2))
+        mython.myparser.shutdown_process_pools()
+        self.assertIsNot(pool, mython.myparser.get_process_pool(2))
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            tree = parser.parse_parallel(sources[1],
+                                         dict(env, executor=executor))
+        self.assertEqual(tree, parser.parse_string(sources[1]))
+
 # ______________________________________________________________________
 
 if __name__ == "__main__":
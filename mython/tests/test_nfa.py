@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import functools
+import unittest
+
+import pgen2.parser
+import pgen2.pgen
+
+import mython.lang.python
+import mython.myparser
+import mython.nfa
+from mython.benchmarks import bench_compose
+
+# ______________________________________________________________________
+# Module data
+
+TEST_GRAMMARS = (
+    "start: item+ ENDMARKER\nitem: NAME | '(' item ')'\n",
+    "item: NUMBER\nother: '+' item\n",
+    "item: '[' other ']'\nother: '-' item\n",
+)
+
+# ______________________________________________________________________
+# Class definition
+
+class TestNFA(unittest.TestCase):
+    def setUp(self):
+        self.pgen = pgen2.pgen.PyPgen()
+        self.nfa_sets = [self.pgen.handleStart(pgen2.parser.parse_string(src))
+                         for src in TEST_GRAMMARS]
+
+    def test_compose_nfa_sets(self):
+        nfas, labels = mython.nfa.compose_nfa_sets(self.nfa_sets)
+        self.assertEqual(len(labels), len(set(labels)))
+        self.assertEqual([nfa[1] for nfa in nfas],
+                         ['item', 'other', 'start'])
+        self.assertEqual([nfa[0] for nfa in nfas], [256, 257, 258])
+        for nfa in nfas:
+            for arcs in nfa[2]:
+                for label, tostate in arcs:
+                    self.assertTrue(0 <= label < len(labels))
+                    self.assertTrue(0 <= tostate < len(nfa[2]))
+
+    def test_matches_pairwise_composition(self):
+        pairwise = functools.reduce(bench_compose.pairwise_compose_nfas,
+                                    self.nfa_sets)
+        one_pass = mython.nfa.compose_nfa_sets(self.nfa_sets)
+        self.assertEqual(pairwise[1], one_pass[1])
+        self.assertEqual(self.pgen.generateDfaGrammar(pairwise),
+                         self.pgen.generateDfaGrammar(one_pass))
+        # With two sets there is no nesting of unions to flatten, so the
+        # NFA's are the same as well.
+        self.assertEqual(mython.nfa.compose_nfas(*self.nfa_sets[:2]),
+                         bench_compose.pairwise_compose_nfas(
+                             *self.nfa_sets[:2]))
+        # Check the composition MyParser uses, too.
+        nfa_sets = [
+            self.pgen.handleStart(pgen2.parser.parse_file(
+                mython.lang.python.get_grammar_path())),
+            self.pgen.handleStart(pgen2.parser.parse_string(
+                mython.myparser.MY_GRAMMAR_EXT))]
+        self.assertEqual(mython.nfa.compose_nfas(*nfa_sets),
+                         bench_compose.pairwise_compose_nfas(*nfa_sets))
+
+# ______________________________________________________________________
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_nfa.py
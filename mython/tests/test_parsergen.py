@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import os
+import tempfile
+import unittest
+
+import mython.myparser
+import mython.parsergen
+
+from .test_myparser import MYPATH, TEST_EXTENSION, TEST_EXTENSION_SRC
+
+# ______________________________________________________________________
+# Module data
+
+TEST_SOURCE = '''
+def foo(a, *b):
+    x = [i ** 2 for i in range(a) if i % 2]
+    return x[1:], {b: None}
+my[bar] baz:
+    anything
+y = !(goes)
+'''
+
+# ______________________________________________________________________
+# Class definition
+
+class TestParserGen(unittest.TestCase):
+    def setUp(self):
+        self.interpreted = mython.myparser.MyParser()
+        self.generated = mython.myparser.MyParser(engine='generated')
+
+    def test_same_trees(self):
+        self.assertEqual(self.generated.parse_string(TEST_SOURCE),
+                         self.interpreted.parse_string(TEST_SOURCE))
+        self.assertEqual(self.generated.parse_file(MYPATH),
+                         self.interpreted.parse_file(MYPATH))
+
+    def test_syntax_error(self):
+        with self.assertRaises(SyntaxError) as generated_error:
+            self.generated.parse_string('x = (1 +)\n')
+        with self.assertRaises(SyntaxError) as interpreted_error:
+            self.interpreted.parse_string('x = (1 +)\n')
+        self.assertEqual(str(generated_error.exception),
+                         str(interpreted_error.exception))
+
+    def test_generated_module(self):
+        source = mython.parsergen.generate_handler_source(
+            self.interpreted.my_grammar)
+        module = mython.parsergen.load_handler_module(source)
+        handlers = mython.parsergen.pgen_grammar_to_handlers(
+            self.interpreted.my_grammar, {}, module = module)
+        for dfa in self.interpreted.my_grammar[0]:
+            self.assertIs(handlers[dfa[0]], handlers[dfa[1]])
+
+    def test_saved_module(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            module_path = os.path.join(temp_dir, 'handlers.py')
+            mython.parsergen.main('-o', module_path)
+            generate_handler_source = (
+                mython.parsergen.generate_handler_source)
+            def fail_generate(*args, **kws):
+                self.fail('Generated handlers instead of loading them.')
+            mython.parsergen.generate_handler_source = fail_generate
+            try:
+                saved = mython.myparser.MyParser(handler_module=module_path)
+            finally:
+                mython.parsergen.generate_handler_source = (
+                    generate_handler_source)
+        self.assertEqual(saved.engine, 'generated')
+        self.assertEqual(saved.handler_module.__file__, module_path)
+        self.assertEqual(saved.parse_string(TEST_SOURCE),
+                         self.interpreted.parse_string(TEST_SOURCE))
+        saved.extend(TEST_EXTENSION)
+        self.interpreted.extend(TEST_EXTENSION)
+        self.assertEqual(saved.parse_string(TEST_EXTENSION_SRC),
+                         self.interpreted.parse_string(TEST_EXTENSION_SRC))
+        with self.assertRaises(ValueError):
+            mython.myparser.MyParser(engine='table',
+                                     handler_module=saved.handler_module)
+
+    def test_stale_module(self):
+        source = mython.parsergen.generate_handler_source(
+            self.interpreted.my_grammar,
+            grammar_key=self.interpreted.grammar_key[::-1])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            module_path = os.path.join(temp_dir, 'handlers.py')
+            with open(module_path, 'w') as module_file:
+                module_file.write(source)
+            with self.assertRaises(ValueError):
+                mython.myparser.MyParser(handler_module=module_path)
+        module = mython.parsergen.load_handler_module(
+            mython.parsergen.generate_handler_source(
+                self.interpreted.my_grammar))
+        with self.assertRaises(ValueError):
+            mython.myparser.MyParser(handler_module=module)
+
+    def test_extend(self):
+        self.generated.extend(TEST_EXTENSION)
+        self.interpreted.extend(TEST_EXTENSION)
+        self.assertEqual(self.generated.parse_string(TEST_EXTENSION_SRC),
+                         self.interpreted.parse_string(TEST_EXTENSION_SRC))
+
+# ______________________________________________________________________
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_parsergen.py
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# ______________________________________________________________________
+# Module imports
+
+import unittest
+
+import mython.grammar
+import mython.myparser
+import mython.tableparse
+
+from .test_myparser import MYPATH, TEST_EXTENSION, TEST_EXTENSION_SRC
+from .test_parsergen import TEST_SOURCE
+
+# ______________________________________________________________________
+# Class definition
+
+class TestTableParse(unittest.TestCase):
+    def setUp(self):
+        self.trampoline = mython.myparser.MyParser()
+        self.table = mython.myparser.MyParser(engine='table')
+
+    def test_same_trees(self):
+        self.assertEqual(self.table.parse_string(TEST_SOURCE),
+                         self.trampoline.parse_string(TEST_SOURCE))
+        self.assertEqual(self.table.parse_file(MYPATH),
+                         self.trampoline.parse_file(MYPATH))
+
+    def test_eval_input(self):
+        parser = mython.myparser.MyParser('eval_input', engine='table')
+        self.assertEqual(parser.parse_string('a and !(b)\n')[1][0][0],
+                         'eval_input')
+
+    def test_handlers(self):
+        for dfa in self.table.my_grammar[0]:
+            handler = self.table.handlers[dfa[1]]
+            if dfa[1] in ('mysuite', 'myexpr', 'myexpr1'):
+                self.assertNotIsInstance(handler,
+                                         mython.tableparse.DFATable)
+            else:
+                self.assertIsInstance(handler, mython.tableparse.DFATable)
+
+    def test_transition_tables(self):
+        dfas = self.table.my_grammar[0]
+        tables = mython.grammar.TransitionTables(dfas)
+        for dfa_number, dfa_name, dfa_initial, states in dfas:
+            base = tables.initials[dfa_number] - dfa_initial
+            for state_index, state in enumerate(states):
+                arcs, (accel_upper, accel_lower, accel_table), accept = state
+                state_number = base + state_index
+                self.assertEqual(tables.lowers[state_number], accel_lower)
+                self.assertEqual(tables.uppers[state_number], accel_upper)
+                self.assertEqual(tables.accepts[state_number], accept)
+                offset = tables.offsets[state_number]
+                for accel_index, accel_result in enumerate(accel_table):
+                    target = tables.targets[offset + accel_index]
+                    nonterminal = tables.nonterminals[offset + accel_index]
+                    if accel_result == -1:
+                        self.assertEqual(target, -1)
+                    elif accel_result & (1 << 7):
+                        self.assertEqual(target - base, accel_result & 127)
+                        self.assertEqual(nonterminal,
+                                         (accel_result >> 8) + 256)
+                    else:
+                        self.assertEqual((target - base, nonterminal),
+                                         (accel_result, 0))
+
+    def test_syntax_error(self):
+        with self.assertRaises(SyntaxError) as table_error:
+            self.table.parse_string('def f(:\n    pass\n')
+        with self.assertRaises(SyntaxError) as trampoline_error:
+            self.trampoline.parse_string('def f(:\n    pass\n')
+        self.assertEqual(str(table_error.exception),
+                         str(trampoline_error.exception))
+
+    def test_extend(self):
+        self.table.extend(TEST_EXTENSION)
+        self.trampoline.extend(TEST_EXTENSION)
+        self.assertEqual(self.table.parse_string(TEST_EXTENSION_SRC),
+                         self.trampoline.parse_string(TEST_EXTENSION_SRC))
+
+# ______________________________________________________________________
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ______________________________________________________________________
+# End of test_tableparse.py
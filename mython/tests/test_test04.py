@@ -1,6 +1,7 @@
 import io
 import os
 import sys
+import tempfile
 import unittest
 from mython.__main__ import main
 
@@ -22,6 +23,33 @@ class TestTest04(unittest.TestCase):
         sys.stdout = stdout
         self.assertEqual(test_stdout.getvalue(), EXPECTED)
 
+    def test_check(self):
+        test_dir = os.path.dirname(__file__)
+        self.assertEqual(main(['--check', test_dir]), 0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.mkdir(os.path.join(temp_dir, 'sub'))
+            sources = (('a.my', 'x = 1\n  y = 2\n'),
+                       ('b.py', 'x = (\n'),
+                       (os.path.join('sub', 'c.my'), 'if x:\n  a\n b\n'))
+            for filename, source in sources:
+                with open(os.path.join(temp_dir, filename), 'w') as fileobj:
+                    fileobj.write(source)
+            stderr = sys.stderr
+            test_stderr = io.StringIO()
+            sys.stderr = test_stderr
+            try:
+                status = main(['--check', temp_dir,
+                               os.path.join(temp_dir, 'b.py')])
+            finally:
+                sys.stderr = stderr
+        self.assertEqual(status, 1)
+        self.assertEqual(
+            [line.split("', ", 1)[1]
+             for line in test_stderr.getvalue().splitlines()],
+            ["line 2, column 0, unexpected '  '.",
+             "line 3, unindent does not match any outer indentation level",
+             "line 2, column 0, EOF in multi-line statement."])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -10,8 +10,12 @@ Python call stack.
 # ______________________________________________________________________
 # Module imports
 
+import json
+import time
 import token
 
+from mython.grammar import TransitionTables
+
 # ______________________________________________________________________
 # Module data
 
@@ -21,9 +25,10 @@ __DEBUG__ = False
 # Function definitions
 
 class TokenStream (object):
-    def __init__ (self, tokenizer):
+    def __init__ (self, tokenizer, classify = None):
         self.tokenizer = tokenizer
         self.next_token = None
+        self.classify = classify
 
     def tokenize (self):
         return next(self.tokenizer)
@@ -46,6 +51,11 @@ class TokenStream (object):
             ret_val = self.next_token
         return ret_val
 
+    def get_label (self):
+        """Return the grammar label index of the lookahead token, using
+        the stream's classify function (see LabelTables.classify())."""
+        return self.classify(self.get_lookahead())
+
     def test_lookahead (self, *tokens):
         ret_val = False
         lookahead = self.get_lookahead()
@@ -77,7 +87,115 @@ class ExclusiveTokenStream (TokenStream):
 
 # ______________________________________________________________________
 
-class TreeBuilder (object):
+class Token (object):
+    """Compact token record.
+
+    Behaves like the (type, string, start, end, line) tuples made by
+    token streams, but keeps row and column numbers in slots instead of
+    position tuples.  Instead of the text of its source line, a token
+    refers to a shared line table (such as mylexer.SourceLines) that
+    is only asked for the line when it is used.
+    """
+    __slots__ = ('type', 'string', 'start_row', 'start_col', 'end_row',
+                 'end_col', 'lines')
+
+    def __init__ (self, tok_type, tok_str, start_row, start_col, end_row,
+                  end_col, lines):
+        self.type = tok_type
+        self.string = tok_str
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
+        self.lines = lines
+
+    @property
+    def start (self):
+        return (self.start_row, self.start_col)
+
+    @property
+    def end (self):
+        return (self.end_row, self.end_col)
+
+    @property
+    def line (self):
+        return self.lines.get_text(self.start_row, self.end_row,
+                                   self.end_col)
+
+    def as_tuple (self):
+        return (self.type, self.string, (self.start_row, self.start_col),
+                (self.end_row, self.end_col), self.line)
+
+    def __getitem__ (self, index):
+        if index == 0:
+            return self.type
+        elif index == 1:
+            return self.string
+        elif index == 2:
+            return (self.start_row, self.start_col)
+        elif index == 3:
+            return (self.end_row, self.end_col)
+        return self.as_tuple()[index]
+
+    def __len__ (self):
+        return 5
+
+    def __iter__ (self):
+        return iter(self.as_tuple())
+
+    def __eq__ (self, other):
+        if isinstance(other, Token):
+            return self.as_tuple() == other.as_tuple()
+        elif isinstance(other, tuple):
+            return self.as_tuple() == other
+        return NotImplemented
+
+    def __ne__ (self, other):
+        ret_val = self.__eq__(other)
+        if ret_val is NotImplemented:
+            return ret_val
+        return not ret_val
+
+    def __hash__ (self):
+        return hash(self.as_tuple())
+
+    def __repr__ (self):
+        return 'Token%r' % (self.as_tuple(),)
+
+# Types of the token values found in parse trees.
+TOKEN_TYPES = (tuple, Token)
+
+# ______________________________________________________________________
+
+class ParseSink (object):
+    """Receives the events of a parse (see trampoline_parse()).
+
+    A parse calls push() with the name of each nonterminal it enters,
+    pushpop() with each token it shifts, and pop() when it leaves the
+    innermost nonterminal, so the events nest like the concrete syntax
+    tree.  The start symbol is entered by the 'start' handler, and the
+    parser returns the sink's tree attribute, which is None for sinks
+    that build nothing.
+
+    This base class ignores all events, so a parse using it only checks
+    the syntax of its input.
+    """
+    tree = None
+
+    def push (self, elem):
+        pass
+
+    def pop (self):
+        pass
+
+    def pushpop (self, elem):
+        pass
+
+# ______________________________________________________________________
+
+class TreeBuilder (ParseSink):
+    """Parse sink that builds nested (name, children) tuples, with the
+    tokens as leaves."""
     def __init__ (self):
         self.tree = ('start', [])
         self.stack = [self.tree]
@@ -98,8 +216,93 @@ class TreeBuilder (object):
 
 # ______________________________________________________________________
 
+class CompactTreeBuilder (TreeBuilder):
+    """Tree builder that collapses unit chains as it builds.
+
+    When a nonterminal node is popped with exactly one child, and that
+    child is itself a nonterminal, the child replaces the node in its
+    parent's child list.  If a collection of nonterminal names is given,
+    only nodes with those names are collapsed.
+    """
+    def __init__ (self, collapsible = None):
+        super(CompactTreeBuilder, self).__init__()
+        self.collapsible = collapsible
+
+    def pop (self):
+        stack = self.stack
+        node = stack.pop()
+        children = node[1]
+        if ((len(children) == 1) and
+            (not isinstance(children[0][0], TOKEN_TYPES)) and
+            ((self.collapsible is None) or (node[0] in self.collapsible))):
+            stack[-1][1][-1] = children[0]
+        return node
+
+# ______________________________________________________________________
+
+class CountingSink (ParseSink):
+    """Parse sink that counts nodes instead of building a tree.
+
+    The counts map each nonterminal name to the number of nodes with
+    that name, and the tokens, depth and max_depth attributes hold the
+    number of tokens and the current and deepest nesting.  Counts add
+    up over all the parses the sink is used for.
+    """
+    def __init__ (self):
+        self.counts = {}
+        self.tokens = 0
+        self.depth = 0
+        self.max_depth = 0
+
+    def push (self, elem):
+        counts = self.counts
+        counts[elem] = counts.get(elem, 0) + 1
+        self.depth += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def pop (self):
+        self.depth -= 1
+
+    def pushpop (self, elem):
+        self.tokens += 1
+
+    def nodes (self):
+        """Return the number of nonterminal nodes counted."""
+        return sum(self.counts.values())
+
+# ______________________________________________________________________
+
+class ValidatingSink (ParseSink):
+    """Parse sink that only keeps the names of the nonterminals being
+    parsed, checking the events nest properly.
+
+    Shifting a token or leaving a nonterminal outside all nonterminals
+    raises a ValueError.  After a parse, the stack is empty, and the
+    names on it show where a failed parse stopped.
+    """
+    def __init__ (self):
+        self.stack = []
+
+    def push (self, elem):
+        self.stack.append(elem)
+
+    def pop (self):
+        if not self.stack:
+            raise ValueError("Parse sink popped more nonterminals than "
+                             "were pushed.")
+        return self.stack.pop()
+
+    def pushpop (self, elem):
+        if not self.stack:
+            raise ValueError("Parse sink given token %r outside any "
+                             "nonterminal." % (elem,))
+
+# ______________________________________________________________________
+
 def trampoline_parse (handlers, instream, outtree = None):
-    """Parse a lexical stream using a set of handler generators."""
+    """Parse a lexical stream using a set of handler generators, sending
+    the parse events to a sink (see ParseSink), which is returned."""
     if outtree is None:
         outtree = TreeBuilder()
     generator_stack = [handlers['start'](instream, outtree)]
@@ -113,10 +316,15 @@ def trampoline_parse (handlers, instream, outtree = None):
 
 # ______________________________________________________________________
 
-def pgen_grammar_to_handlers (grammar, handlers):
-    """Extend a trampoline map with handlers for a pgen grammar tuple."""
-    dfas, labels, start, accel = grammar
-    label_map = {}
+def make_classifier (labels, label_map = None):
+    """Return a function mapping a token to its label index in a grammar.
+
+    The optional label_map dictionary is updated in place from the
+    label list and is the one the returned function consults, so a
+    classifier shared by several handlers sees labels added to it later.
+    """
+    if label_map is None:
+        label_map = {}
     i = 0
     for label in labels:
         label_map[label] = i
@@ -126,20 +334,165 @@ def pgen_grammar_to_handlers (grammar, handlers):
     # linear search through the grammar labels.  Using a dictionary
     # should be faster.
     def classify (intoken):
-        tok_type, tok_name, tok_start, tok_stop, tok_line = intoken
+        tok_type = intoken[0]
+        tok_name = intoken[1]
         if (tok_type == token.NAME) and ((tok_type, tok_name) in label_map):
             return label_map[(tok_type, tok_name)]
         return label_map.get((tok_type, None), -1)
+    return classify
+
+# ______________________________________________________________________
+
+class LabelTables (object):
+    """Precomputed arrays mapping tokens to label indices in a grammar.
+
+    The type_labels list maps a token type to the index of its label
+    (or -1), and the keyword_labels dictionary maps the string of a
+    NAME token to the index of a keyword label.  Token streams given a
+    LabelTables instance classify each token once, as it is read from
+    the lexer, and parser handlers read the label index from the stream
+    using get_label() instead of classifying the lookahead token in
+    every DFA state.
+    """
+    __slots__ = ('type_labels', 'keyword_labels')
+
+    def __init__ (self, labels = None):
+        self.type_labels = [-1] * token.NT_OFFSET
+        self.keyword_labels = {}
+        if labels is not None:
+            self.update(labels)
+
+    def update (self, labels):
+        """Update the tables in place from a grammar's label list, so
+        streams sharing the tables see labels added to a grammar."""
+        type_labels = self.type_labels
+        keyword_labels = self.keyword_labels
+        i = 0
+        for tok_type, tok_name in labels:
+            if tok_type < token.NT_OFFSET:
+                if tok_name is None:
+                    type_labels[tok_type] = i
+                elif tok_type == token.NAME:
+                    keyword_labels[tok_name] = i
+            i += 1
+
+    def classify (self, intoken):
+        """Return the label index of a token; matches the classify()
+        functions built by make_classifier()."""
+        tok_type = intoken[0]
+        if tok_type == token.NAME:
+            return self.keyword_labels.get(intoken[1],
+                                           self.type_labels[tok_type])
+        return self.type_labels[tok_type]
+
+    def classify_tokens (self, tokens):
+        """Return a list of the label indices of a list of tokens."""
+        type_labels = self.type_labels
+        name_label = type_labels[token.NAME]
+        keyword_labels = self.keyword_labels
+        NAME = token.NAME
+        return [keyword_labels.get(intoken[1], name_label)
+                if intoken[0] == NAME else type_labels[intoken[0]]
+                for intoken in tokens]
+
+# ______________________________________________________________________
+
+def pgen_grammar_to_handlers (grammar, handlers, label_tables = None,
+                              dfa_indices = None, stats = None):
+    """Extend a trampoline map with handlers for a pgen grammar tuple.
+
+    The handlers read label indices from their token stream's
+    get_label() method.  The optional label_tables (a LabelTables
+    instance) is updated in place from the grammar's labels, so token
+    streams sharing it classify labels added to a grammar later.  If
+    dfa_indices is given, only handlers for those DFA's are (re)built.
+    If stats (a ParserStats instance) is given, the handlers record
+    their activity in it (see make_dfa_handler()).
+
+    Without label_tables (or given the label_map dictionary taken by
+    older versions, see make_classifier()), the handlers give token
+    streams that have no classify function, such as a plain
+    TokenStream, one for the grammar's labels.
+    """
+    dfas, labels, start, accel = grammar
+    classify = None
+    if label_tables is None:
+        classify = LabelTables(labels).classify
+    elif isinstance(label_tables, dict):
+        classify = make_classifier(labels, label_tables)
+    else:
+        label_tables.update(labels)
     # TODO: Check for and add accelerators...
     assert accel
+    if dfa_indices is not None:
+        dfas = [dfas[dfa_index] for dfa_index in dfa_indices]
+    tables = TransitionTables(dfas)
     for dfa in dfas:
-        handler = dfa_to_handler(classify, dfa, labels)
+        handler = make_dfa_handler(dfa, labels, tables, stats)
+        if classify is not None:
+            handler = _with_classifier(handler, classify)
         handlers[dfa[0]] = handler
         handlers[dfa[1]] = handler
     return handlers
 
 # ______________________________________________________________________
 
+def _with_classifier (handler, classify):
+    """Wrap a handler so it sets the classify function of token streams
+    that have none before parsing (see pgen_grammar_to_handlers())."""
+    def _parse_dfa (instream, outtree):
+        if instream.classify is None:
+            instream.classify = classify
+        return handler(instream, outtree)
+    return _parse_dfa
+
+# ______________________________________________________________________
+
+class ParserStats (object):
+    """Per-nonterminal counters gathered by instrumented handlers (see
+    make_dfa_handler()).
+
+    For each nonterminal name, entries counts the times it was parsed,
+    tokens the tokens it shifted itself, and times and self_times the
+    seconds spent parsing it with and without its children.  (Times of
+    recursive nonterminals count the nested entries more than once.)
+    push_depths counts the nonterminals entered at each nesting depth.
+    Call start_parse() before each parse, so a parse that stopped on an
+    error does not throw off the depths of the next.
+    """
+    def __init__ (self):
+        self.parses = 0
+        self.depth = 0
+        self.entries = {}
+        self.tokens = {}
+        self.times = {}
+        self.self_times = {}
+        self.push_depths = {}
+
+    def start_parse (self):
+        self.parses += 1
+        self.depth = 0
+
+    def report (self):
+        """Return the counters as a dictionary of plain values."""
+        return {
+            'parses' : self.parses,
+            'nonterminals' : dict(
+                (name, {'entries' : self.entries[name],
+                        'tokens' : self.tokens.get(name, 0),
+                        'time' : self.times.get(name, 0.),
+                        'self_time' : self.self_times.get(name, 0.)})
+                for name in self.entries),
+            'push_depths' : dict((str(depth), count) for depth, count in
+                                 sorted(self.push_depths.items())),
+        }
+
+    def to_json (self, indent = 2):
+        """Return the report as a JSON string."""
+        return json.dumps(self.report(), indent = indent, sort_keys = True)
+
+# ______________________________________________________________________
+
 def dfa_to_handler (classify, dfa, symbol_tab = None):
     """Convert a DFA to a generator compatible with trampoline_parse.
 
@@ -148,71 +501,189 @@ def dfa_to_handler (classify, dfa, symbol_tab = None):
     transitions/accelerators), a deterministic state automaton tuple,
     and an optional symbol table.  Returns a generator function that
     conforms to the trampoline parser protocol.
+
+    Kept for existing callers; the handler is made by
+    make_dfa_handler(), and sets classify as the classify function of
+    token streams that have none.
+    """
+    return _with_classifier(make_dfa_handler(dfa, symbol_tab), classify)
+
+# ______________________________________________________________________
+
+def make_dfa_handler (dfa, symbol_tab = None, tables = None, stats = None):
+    """Convert a DFA to a generator compatible with trampoline_parse.
+
+    Accepts a deterministic state automaton tuple, an optional symbol
+    table, and optional transition tables the DFA was compiled into
+    (see mython.grammar.TransitionTables; by default the DFA is compiled on
+    its own).  Returns a generator function that conforms to the
+    trampoline parser protocol.  The generator reads the label index
+    of each lookahead token (the index used for state transitions)
+    from the token stream's get_label() method.
+
+    The kind of handler is chosen here, so the parse loop (see
+    _make_handler()) tests no flags: if the module's __DEBUG__ flag is
+    set, the handler prints a trace of the parse; otherwise, if a
+    ParserStats instance is given as stats, the handler records its
+    activity there; otherwise the handler only parses.
     """
-    dfa_num, dfa_name, dfa_initial, states = (dfa[0], dfa[1], dfa[2], dfa[3])
+    dfa_num = dfa[0]
+    if tables is None:
+        tables = TransitionTables([dfa])
+    handler = _make_handler(dfa[1], tables.initials[dfa_num], tables)
+    if __DEBUG__:
+        return _make_tracing_handler(dfa[1], handler, tables, symbol_tab)
+    elif stats is not None:
+        return _make_instrumented_handler(dfa[1], handler, stats)
+    return handler
+
+# ______________________________________________________________________
+
+def _unexpected_token (instream, state):
+    """Return the syntax error for the lookahead token of a stream, in
+    the given DFA state."""
+    # TODO: Make the error string more instructive, like the older
+    # DFAParser stuff did.
+    crnt_token = instream.get_lookahead()
+    line_no, column_no = crnt_token[2]
+    token_str = crnt_token[1]
+    fmt_tup = (line_no, column_no, token_str)
+    ret_val = SyntaxError("Line %d, column %d, unexpected '%s'." % fmt_tup)
+    # Read by tracing handlers, to list the labels the state expected.
+    ret_val.parse_state = state
+    return ret_val
+
+# ______________________________________________________________________
+
+def _make_handler (dfa_name, initial, tables):
+    lowers = tables.lowers
+    uppers = tables.uppers
+    offsets = tables.offsets
+    accepts = tables.accepts
+    finals = tables.finals
+    targets = tables.targets
+    nonterminals = tables.nonterminals
     def _parse_dfa (instream, outtree):
-        if __DEBUG__:
-            print("Parse:%s" % dfa_name)
+        get_label = instream.get_label
         outtree.push(dfa_name)
-        state = states[dfa_initial]
+        state = initial
         while 1:
-            arcs, (accel_upper, accel_lower, accel_table), accept = state
-            crnt_token = instream.get_lookahead()
-            ilabel = classify(crnt_token)
-            if __DEBUG__:
-                symbol_str = ""
-                if symbol_tab:
-                    symbol_str = " %r" % (symbol_tab[ilabel],)
-                print("%r %r%s %r" % (crnt_token, ilabel, symbol_str,
-                                      ilabel-accel_lower))
-            if (accel_lower <= ilabel) and (ilabel < accel_upper):
-                accel_result = accel_table[ilabel - accel_lower]
-                if -1 != accel_result:
-                    if (accel_result & (1<<7)):
+            ilabel = get_label()
+            accel_lower = lowers[state]
+            if (accel_lower <= ilabel) and (ilabel < uppers[state]):
+                index = offsets[state] + ilabel - accel_lower
+                target = targets[index]
+                if target != -1:
+                    nt = nonterminals[index]
+                    if nt:
                         # PUSH
-                        nt = (accel_result >> 8) + token.NT_OFFSET
-                        if __DEBUG__:
-                            print("PUSH %d" % nt)
                         yield nt
-                        state = states[accel_result & ((1<<7) - 1)]
+                        state = target
                     else:
                         # SHIFT
-                        if __DEBUG__:
-                            print("SHIFT %r" % (crnt_token,))
                         outtree.pushpop(instream.get_token())
-                        state = states[accel_result]
-                        if state[2] and len(state[0]) == 1:
+                        state = target
+                        if finals[state]:
                             break
                     continue
-            if accept:
+            if accepts[state]:
                 break
-            else:
-                # TODO: Make the error string more instructive, like
-                # the older DFAParser stuff did.
-                candidates = [symbol_tab[accel_lower + accel_index]
-                              for accel_result, accel_index in
-                              zip(accel_table, range(len(accel_table)))
-                              if accel_result != -1]
-                if __DEBUG__:
-                    label_index = accel_lower
-                    for accel_result in accel_table:
-                        if accel_result != -1:
-                            symbol_str = ""
-                            if symbol_tab:
-                                symbol_str = " %r" % (symbol_tab[label_index],)
-                            print("%r%s => %d" % (label_index, symbol_str,
-                                                  accel_result))
-                        label_index += 1
-                    print("len(%r) = %d" % (accel_table, len(accel_table)))
-                line_no, column_no = crnt_token[2]
-                token_str = crnt_token[1]
-                fmt_tup = (line_no, column_no, token_str)
-                raise SyntaxError("Line %d, column %d, unexpected '%s'." %
-                                  fmt_tup)
-        if __DEBUG__:
-            print("POP %s" % dfa_name)
+            raise _unexpected_token(instream, state)
         outtree.pop()
-        return
+    return _parse_dfa
+
+# ______________________________________________________________________
+
+class _CountingStream (object):
+    """Token stream given to the parse loop by an instrumented handler,
+    counting the tokens it shifts."""
+    __slots__ = ('get_label', 'get_lookahead', 'instream', 'shifted')
+
+    def __init__ (self, instream):
+        self.get_label = instream.get_label
+        self.get_lookahead = instream.get_lookahead
+        self.instream = instream
+        self.shifted = 0
+
+    def get_token (self):
+        self.shifted += 1
+        return self.instream.get_token()
+
+# ______________________________________________________________________
+
+def _make_instrumented_handler (dfa_name, handler, stats):
+    entries = stats.entries
+    tokens = stats.tokens
+    times = stats.times
+    self_times = stats.self_times
+    push_depths = stats.push_depths
+    clock = time.perf_counter
+    def _parse_dfa (instream, outtree):
+        start_time = clock()
+        child_time = 0.
+        depth = stats.depth + 1
+        stats.depth = depth
+        entries[dfa_name] = entries.get(dfa_name, 0) + 1
+        push_depths[depth] = push_depths.get(depth, 0) + 1
+        counting_stream = _CountingStream(instream)
+        for nt in handler(counting_stream, outtree):
+            child_start = clock()
+            yield nt
+            child_time += clock() - child_start
+        stats.depth = depth - 1
+        elapsed = clock() - start_time
+        tokens[dfa_name] = tokens.get(dfa_name, 0) + counting_stream.shifted
+        times[dfa_name] = times.get(dfa_name, 0.) + elapsed
+        self_times[dfa_name] = (self_times.get(dfa_name, 0.) + elapsed -
+                                child_time)
+    return _parse_dfa
+
+# ______________________________________________________________________
+
+class _TracingStream (object):
+    """Token stream given to the parse loop by a tracing handler,
+    printing each lookahead label it reads and each token it shifts."""
+    def __init__ (self, instream, symbol_str):
+        self.instream = instream
+        self.symbol_str = symbol_str
+        self.get_lookahead = instream.get_lookahead
+
+    def get_label (self):
+        ilabel = self.instream.get_label()
+        print("%r %r%s" % (self.instream.get_lookahead(), ilabel,
+                           self.symbol_str(ilabel)))
+        return ilabel
+
+    def get_token (self):
+        crnt_token = self.instream.get_token()
+        print("SHIFT %r" % (crnt_token,))
+        return crnt_token
+
+# ______________________________________________________________________
+
+def _make_tracing_handler (dfa_name, handler, tables, symbol_tab):
+    def symbol_str (label_index):
+        if symbol_tab:
+            return " %r" % (symbol_tab[label_index],)
+        return ""
+    def _parse_dfa (instream, outtree):
+        print("Parse:%s" % dfa_name)
+        try:
+            for nt in handler(_TracingStream(instream, symbol_str), outtree):
+                print("PUSH %d" % nt)
+                yield nt
+        except SyntaxError as syntax_error:
+            state = getattr(syntax_error, 'parse_state', None)
+            if state is not None:
+                for label_index in tables.expected_labels(state):
+                    index = (tables.offsets[state] + label_index -
+                             tables.lowers[state])
+                    print("%r%s => %d, %d" % (label_index,
+                                              symbol_str(label_index),
+                                              tables.targets[index],
+                                              tables.nonterminals[index]))
+            raise
+        print("POP %s" % dfa_name)
     return _parse_dfa
 
 # ______________________________________________________________________